@@ -0,0 +1,72 @@
+"""Замер пакетного поиска офисов (лучшие офисы для многих начальных точек) в одном процессе и в пуле процессов
+
+Пул (RankingPool) переиспользуется между запросами: первый запрос включает запуск процессов, повторный - нет
+
+Запуск из корня проекта (БД строится из data/*.json, если ее снапшота еще нет):
+
+    python -m benchmarks.batch_ranking
+"""
+from functools import partial
+import os
+import random
+from time import perf_counter
+
+from sqlalchemy.orm import Session
+
+from src.app.lifespan.startup import StartupEvent
+from src.cache.locations import OFFICE_RANKING_ENGINE, ROAD_GRAPH_OPTIONS, TRAVEL_TIMES, TRAVEL_TIMES_OPTIONS
+from src.database.base import engine
+from src.database.crud import locations as locations_crud
+from src.models.batch_ranking import OriginRanker, RankingPool, rank_in_worker
+
+_ORIGINS = 20_000
+_CHUNK_SIZE = 500
+_RADIUS = 3.0
+_LIMIT = 3
+_FILTER = {"avg_rating": None, "avg_service_time": None, "count_clients_now": None, "with_ramp": None,
+           "prime": None, "vip": None, "rko": None, "suo": None, "kep": None, "travel_mode": None}
+
+
+def main() -> None:
+    if not OFFICE_RANKING_ENGINE.is_available():
+        raise SystemExit("Для пакетного поиска нужен установленный numpy")
+
+    with Session(engine) as session:
+        StartupEvent(session).run()
+        session.commit()
+        OFFICE_RANKING_ENGINE.build(locations_crud.get_offices_ranking_data(session))
+
+    rng = random.Random(1)
+    origins = sorted(
+        ((index, 55.755864 + rng.uniform(-0.2, 0.2), 37.617698 + rng.uniform(-0.3, 0.3)) for index in range(_ORIGINS)),
+        key=lambda origin: (origin[1] // 0.01, origin[2] // 0.01)
+    )
+    chunks = [origins[start:start + _CHUNK_SIZE] for start in range(0, len(origins), _CHUNK_SIZE)]
+    snapshot = OFFICE_RANKING_ENGINE.snapshot()
+
+    started = perf_counter()
+    ranker = OriginRanker.from_snapshot(snapshot, TRAVEL_TIMES)
+    expected = sorted(line for chunk in chunks
+                      for line in ranker.rank(chunk, _FILTER, _RADIUS, _LIMIT).splitlines())
+    elapsed = perf_counter() - started
+    print(f"1 процесс: {elapsed:.2f} с, {_ORIGINS / elapsed:.0f} точек/с")
+
+    workers = os.cpu_count() or 1
+    ranking_pool = RankingPool(workers, "", ROAD_GRAPH_OPTIONS, TRAVEL_TIMES_OPTIONS)
+    live_arrays = {name: snapshot["arrays"][name] for name in OFFICE_RANKING_ENGINE.LIVE_ARRAYS}
+    rank = partial(rank_in_worker, filter_data=_FILTER, radius=_RADIUS, limit=_LIMIT, live_arrays=live_arrays)
+    try:
+        for run in ("с запуском процессов", "повторный запрос"):
+            started = perf_counter()
+            with ranking_pool.acquire(snapshot) as pool:
+                lines = sorted(line for result in pool.map(rank, chunks) for line in result.splitlines())
+            elapsed = perf_counter() - started
+            print(f"Пул из {workers} процессов ({run}): {elapsed:.2f} с, {_ORIGINS / elapsed:.0f} точек/с")
+            if lines != expected:
+                raise SystemExit("Результаты пула процессов не совпадают с расчетом в одном процессе")
+    finally:
+        ranking_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
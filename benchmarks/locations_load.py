@@ -0,0 +1,127 @@
+"""Нагрузочный тест поиска локаций: синхронные соединения в threadpool против асинхронных (aiosqlite в event loop)
+
+Сервер (uvicorn) запускается отдельным процессом дважды: с ASYNC_READS_ENABLED=0 (режим по умолчанию -
+запрос целиком выполняется в threadpool на соединениях только для чтения) и с ASYNC_READS_ENABLED=1.
+Кеш результатов поиска выключается, координаты запросов случайные, чтобы каждый запрос шел в БД.
+Во время нагрузки отдельный клиент последовательно опрашивает /service/readiness (синхронный обработчик
+в threadpool) - задержка показывает, насколько поиск занимает потоки, нужные остальным синхронным маршрутам.
+
+Запуск из корня проекта (нужен httpx):
+
+    python -m benchmarks.locations_load
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+from collections import Counter
+from time import perf_counter, sleep
+from typing import Any
+
+import httpx
+
+_HOST, _PORT = "127.0.0.1", 8765
+_CONCURRENCY = 500
+_REQUESTS = 2000
+_PATHS = ("/locations/find_atms", "/locations/find_offices", "/history/office")
+_PROBE_PATH = "/service/readiness"
+_MODES = (("sync", "0"), ("async", "1"))
+
+
+def _params(path: str) -> dict[str, Any]:
+    """Случайные параметры запроса (центр Москвы, радиус поиска 0.5 км)"""
+    if path.endswith("/history/office"):
+        return {"id": random.randint(1, 278)}
+    latitude, longitude = random.uniform(55.70, 55.80), random.uniform(37.50, 37.70)
+    return {"latitude": latitude, "longitude": longitude, "initialLatitude": latitude,
+            "initialLongitude": longitude, "zoom": 16.5}
+
+
+async def _load(client: httpx.AsyncClient, path: str) -> tuple[float, list[float], Counter[str], list[float]]:
+    """_REQUESTS запросов, не больше _CONCURRENCY одновременно:
+    (общее время, задержки, ошибки по типам, задержки опроса _PROBE_PATH)
+    """
+    latencies, errors, probes = [], Counter(), []
+    queue = iter(range(_REQUESTS))
+    done = asyncio.Event()
+
+    async def probe() -> None:
+        async with httpx.AsyncClient(base_url=client.base_url, timeout=120) as probe_client:
+            while not done.is_set():
+                started = perf_counter()
+                await probe_client.get(_PROBE_PATH)
+                probes.append(perf_counter() - started)
+
+    async def worker() -> None:
+        for _ in queue:
+            started = perf_counter()
+            try:
+                response = await client.get(path, params=_params(path))
+                response.raise_for_status()
+            except httpx.HTTPError as error:
+                errors[type(error).__name__] += 1
+            latencies.append(perf_counter() - started)
+
+    started = perf_counter()
+    probe_task = asyncio.create_task(probe())
+    await asyncio.gather(*(worker() for _ in range(_CONCURRENCY)))
+    elapsed = perf_counter() - started
+    done.set()
+    await probe_task
+    return elapsed, sorted(latencies), errors, sorted(probes)
+
+
+async def _run() -> dict[str, tuple[float, list[float], Counter[str], list[float]]]:
+    """Замер всех _PATHS на запущенном сервере"""
+    results = {}
+    limits = httpx.Limits(max_connections=_CONCURRENCY, max_keepalive_connections=_CONCURRENCY)
+    async with httpx.AsyncClient(base_url=f"http://{_HOST}:{_PORT}", limits=limits, timeout=120) as client:
+        for path in _PATHS:
+            await _load(client, path)  # прогрев (соединения, пулы, фрагменты JSON)
+            results[path] = await _load(client, path)
+    return results
+
+
+def _serve(async_reads: str) -> subprocess.Popen:
+    """Сервер API без кеша результатов поиска, с заданным ASYNC_READS_ENABLED"""
+    env = {**os.environ, "LOCATIONS_CACHE_ENABLED": "0", "ASYNC_READS_ENABLED": async_reads}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:api_app", "--host", _HOST, "--port", str(_PORT),
+         "--log-level", "warning", "--backlog", "4096", "--timeout-keep-alive", "600"],
+        env=env
+    )
+    for _ in range(600):
+        try:
+            httpx.get(f"http://{_HOST}:{_PORT}/service/healthcheck").raise_for_status()
+            return server
+        except httpx.HTTPError:
+            if server.poll() is not None:
+                raise SystemExit("Сервер не запустился")
+            sleep(0.1)
+    server.terminate()
+    raise SystemExit("Сервер не запустился")
+
+
+def main() -> None:
+    results = {}
+    for mode, async_reads in _MODES:
+        server = _serve(async_reads)
+        try:
+            results[mode] = asyncio.run(_run())
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'path':<28}{'mode':<7}{'rps':>9}{'p50, ms':>10}{'p99, ms':>10}{'probe p50, ms':>15}  errors")
+    for path in _PATHS:
+        for mode, _ in _MODES:
+            elapsed, latencies, errors, probes = results[mode][path]
+            p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+            probe_p50 = probes[len(probes) // 2] if probes else float("nan")
+            print(f"{path:<28}{mode:<7}{_REQUESTS / elapsed:>9.0f}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}"
+                  f"{probe_p50 * 1000:>15.1f}  {dict(errors) or 0}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Сравнение ранжирования локаций в SQL и в NumPy (RankingEngine)
+
+Запуск из корня проекта (БД строится из data/*.json, если ее снапшота еще нет):
+
+    python -m benchmarks.locations_ranking
+"""
+from time import perf_counter
+
+from sqlalchemy.orm import Session
+
+from src.app.lifespan.startup import StartupEvent
+from src.cache.locations import ATM_RANKING_ENGINE, OFFICE_RANKING_ENGINE
+from src.database.base import engine
+from src.database.crud import locations as locations_crud
+
+_REPEATS = 20
+_ZOOMS = (9.0, 10.2, 12.5, 14.5, 16.5)
+_BASE_FILTER = {
+    "latitude": 55.755864,
+    "longitude": 37.617698,
+    "initial_latitude": 55.755864,
+    "initial_longitude": 37.617698,
+    "avg_rating": None,
+    "withdraw_currencies": None,
+    "deposit_currencies": None,
+}
+_ATM_FILTER = {**_BASE_FILTER, "all_day": None, "wheelchair": None, "blind": None, "nfc_support": None,
+               "qr_support": None}
+_OFFICE_FILTER = {**_BASE_FILTER, "avg_service_time": None, "count_clients_now": None, "with_ramp": None,
+                  "prime": None, "vip": None, "rko": None, "suo": None, "kep": None}
+
+
+def _measure(func) -> tuple[float, int]:
+    """Среднее время выполнения (мс) и размер результата"""
+    result = func()
+    started = perf_counter()
+    for _ in range(_REPEATS):
+        func()
+    return (perf_counter() - started) / _REPEATS * 1000, len(result)
+
+
+def main() -> None:
+    if not ATM_RANKING_ENGINE.is_available():
+        raise SystemExit("Для сравнения нужен установленный numpy")
+
+    with Session(engine) as session:
+        StartupEvent(session).run()
+        session.commit()
+
+        ATM_RANKING_ENGINE.build(locations_crud.get_atms_ranking_data(session))
+        OFFICE_RANKING_ENGINE.build(locations_crud.get_offices_ranking_data(session))
+
+        cases = (
+            ("atm", _ATM_FILTER, locations_crud.get_atms_filtered, locations_crud.get_atms_by_ids,
+             ATM_RANKING_ENGINE),
+            ("office", _OFFICE_FILTER, locations_crud.get_offices_filtered, locations_crud.get_offices_by_ids,
+             OFFICE_RANKING_ENGINE),
+        )
+        print(f"{'type':<8}{'zoom':>6}{'rows':>8}{'sql, ms':>12}{'numpy, ms':>12}{'numpy+orm, ms':>16}")
+        for location_type, base_filter, get_filtered, get_by_ids, ranking_engine in cases:
+            for zoom in _ZOOMS:
+                filter_data = {**base_filter, "zoom": zoom}
+                radius = locations_crud._zoom_mapper(zoom)
+                sql_time, sql_rows = _measure(lambda: get_filtered(session, filter_data))
+                numpy_time, numpy_rows = _measure(lambda: ranking_engine.rank(filter_data, radius)[0])
+                full_time, _ = _measure(lambda: get_by_ids(session, ranking_engine.rank(filter_data, radius)[0]))
+                assert sql_rows == numpy_rows, (location_type, zoom, sql_rows, numpy_rows)
+                print(f"{location_type:<8}{zoom:>6}{sql_rows:>8}{sql_time:>12.3f}{numpy_time:>12.3f}{full_time:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Проверка и замер маршрутизации по графу дорог (RoadGraph) на синтетическом графе
+
+Синтетический граф - сетка улиц вокруг центра Москвы (tests/road_grid.py, на нем же тесты маршрутизации).
+Время маршрутов двунаправленного A* сверяется с обычным алгоритмом Дейкстры, граф проходит
+через save/load. Время от одной точки до _CANDIDATES офисов одним проходом (TravelTimes) сравнивается
+с отдельными маршрутами до каждого офиса. Запуск из корня проекта:
+
+    python -m benchmarks.road_routing
+"""
+from io import BytesIO
+import random
+from time import perf_counter
+
+from src.models.road_graph import RoadGraph
+from src.models.travel_times import TravelTimes
+from tests.road_grid import dijkstra_minutes, synthetic_grid_graph
+
+_ROUTES = 200
+_ORIGINS = 20
+_CANDIDATES = 50
+
+
+def main() -> None:
+    started = perf_counter()
+    graph = synthetic_grid_graph()
+    print(f"Граф построен за {perf_counter() - started:.2f} с: {graph.stats()}")
+
+    file = BytesIO()
+    graph.save(file)
+    file.seek(0)
+    loaded = RoadGraph()
+    started = perf_counter()
+    loaded.load(file)
+    print(f"Файл графа {len(file.getvalue()) / 1024:.0f} КБ, загрузка {perf_counter() - started:.2f} с")
+
+    rng = random.Random(1)
+    node_count = loaded.stats()["nodes"]
+    pairs = [(rng.randrange(node_count), rng.randrange(node_count)) for _ in range(_ROUTES)]
+    for mode in ("walk", "drive"):
+        loaded._stats["settled"] = 0
+        started = perf_counter()
+        routes = [loaded.route_minutes(source, target, mode) for source, target in pairs]
+        bidirectional_ms = (perf_counter() - started) / _ROUTES * 1000
+        settled = loaded._stats["settled"] / _ROUTES
+
+        started = perf_counter()
+        expected, dijkstra_settled = zip(*(dijkstra_minutes(loaded, source, target, mode) for source, target in pairs))
+        dijkstra_ms = (perf_counter() - started) / _ROUTES * 1000
+
+        mismatches = sum(
+            1 for route, reference in zip(routes, expected)
+            if (route is None) != (reference is None) or route is not None and abs(route - reference) > 1e-3
+        )
+        print(f"{mode:>5}: двунаправленный A* {bidirectional_ms:6.2f} мс ({settled:.0f} узлов), "
+              f"Дейкстра {dijkstra_ms:6.2f} мс ({sum(dijkstra_settled) / _ROUTES:.0f} узлов), "
+              f"расхождений {mismatches}")
+        if mismatches:
+            raise SystemExit("Время маршрутов не совпадает с эталоном")
+
+    _one_to_many(loaded, rng)
+
+
+def _one_to_many(graph: RoadGraph, rng: random.Random) -> None:
+    """Время от точки до кандидатов: отдельные маршруты, один проход, повторный запрос из той же ячейки"""
+    node_count = graph.stats()["nodes"]
+    for mode in ("walk", "drive"):
+        travel_times = TravelTimes(graph)
+        per_route_ms = sweep_ms = cached_ms = 0.0
+        mismatches = 0
+        for _ in range(_ORIGINS):
+            origin = graph.node_coordinates(rng.randrange(node_count))
+            targets = [graph.node_coordinates(rng.randrange(node_count)) for _ in range(_CANDIDATES)]
+            latitudes, longitudes = [lat for lat, _ in targets], [lon for _, lon in targets]
+
+            started = perf_counter()
+            source = graph.nearest_node(*origin)[0]
+            routes = [graph.route_minutes(source, graph.nearest_node(*target)[0], mode) for target in targets]
+            per_route_ms += perf_counter() - started
+
+            started = perf_counter()
+            minutes = travel_times.minutes_many(*origin, latitudes, longitudes, mode)
+            sweep_ms += perf_counter() - started
+
+            started = perf_counter()
+            travel_times.minutes_many(*origin, latitudes, longitudes, mode)
+            cached_ms += perf_counter() - started
+
+            # проход идет из узла ячейки начальной точки, а не из ближайшего к ней узла - сверяется только
+            # время до офисов, если эти узлы совпали
+            sweep_source = travel_times._sweeps[next(reversed(travel_times._sweeps))].source
+            if sweep_source == source:
+                mismatches += sum(1 for route, minute in zip(routes, minutes)
+                                  if route is not None and abs(route - minute) > 1e-3)
+        stats = travel_times.stats()
+        print(f"{mode:>5}: {_CANDIDATES} офисов - маршруты {per_route_ms / _ORIGINS * 1000:6.2f} мс, "
+              f"один проход {sweep_ms / _ORIGINS * 1000:6.2f} мс ({stats['settled'] / _ORIGINS:.0f} узлов), "
+              f"из кеша {cached_ms / _ORIGINS * 1000:5.2f} мс, расхождений {mismatches}")
+        if mismatches:
+            raise SystemExit("Время прохода не совпадает с маршрутами")
+
+    estimate = TravelTimes(RoadGraph()).minutes(55.75, 37.60, 55.76, 37.64, "drive")
+    print(f"На автомобиле 55.75,37.60 -> 55.76,37.64 без графа: {estimate:.1f} мин")
+
+
+if __name__ == "__main__":
+    main()
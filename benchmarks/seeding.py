@@ -0,0 +1,60 @@
+"""Скорость и память заполнения БД при старте (StartupEvent.seed) на данных из data/*.json, размноженных в N раз
+
+Входные файлы для каждого масштаба записываются во временную папку и читаются потоково, как при старте.
+Пиковая память процесса (RSS) не убывает, поэтому масштабы идут по возрастанию: если память
+не зависит от объема данных, пик почти не растет.
+
+Запуск из корня проекта (используется временная БД, database.db не затрагивается):
+
+    python -m benchmarks.seeding
+"""
+import json
+import os
+import resource
+import tempfile
+from time import perf_counter
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.app.lifespan.startup import StartupEvent
+from src.database.base import Base
+from src.models.json_stream import iter_json_array
+
+_SCALES = (1, 10, 100)
+
+
+def _write_scaled(source: str, target: str, scale: int) -> None:
+    """Записать JSON массив из source, повторенный scale раз (поэлементно, без сборки в памяти)"""
+    with open(target, "w", encoding="utf-8") as file:
+        file.write("[")
+        for repeat in range(scale):
+            for number, item in enumerate(iter_json_array(source)):
+                file.write("," if repeat or number else "")
+                file.write(json.dumps(item, ensure_ascii=False))
+        file.write("]")
+
+
+def main() -> None:
+    print(f"{'scale':>6}{'rows':>12}{'seconds':>10}{'rows/s':>12}{'peak rss, MB':>14}")
+    for scale in _SCALES:
+        with tempfile.TemporaryDirectory() as directory:
+            atms_path, offices_path = os.path.join(directory, "atms.json"), os.path.join(directory, "offices.json")
+            _write_scaled("data/atms.json", atms_path, scale)
+            _write_scaled("data/offices.json", offices_path, scale)
+
+            engine = create_engine(f"sqlite:///{os.path.join(directory, 'seeding.db')}")
+            Base.metadata.create_all(engine)
+            with Session(engine) as session:
+                started = perf_counter()
+                inserted = StartupEvent(session).seed(iter_json_array(atms_path), iter_json_array(offices_path))
+                elapsed = perf_counter() - started
+            engine.dispose()
+
+        rows = sum(inserted.values())
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{scale:>6}{rows:>12}{elapsed:>10.3f}{rows / elapsed:>12.0f}{peak_rss:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,31 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 from sqlalchemy.orm import Session
 
+from .periodic import run_periodically
 from .startup import StartupEvent
-from src.database.base import engine
+from src.cache.locations import OFFICE_BATCH_POOL
+from src.cache.security import SIGNED_TOKENS, TOKEN_STORE
+from src.cache.sms import SMS_STORE
+from src.database.base import SessionLocal, async_engine, engine, read_engine
+from src.database.events import build_load_forecast
+from src.logic.locations import LocationsLogic
+from src.settings import (
+    LOAD_FORECAST_REFRESH_INTERVAL, OCCUPANCY_FLUSH_INTERVAL, SMS_SWEEP_INTERVAL, TOKEN_PURGE_INTERVAL
+)
+
+
+def _refresh_load_forecast() -> None:
+    """Перестроить прогноз загруженности офисов по накопившейся истории"""
+    with Session(read_engine) as session:
+        build_load_forecast(session)
+
+
+def _flush_office_occupancy() -> None:
+    """Записать накопленные события загруженности офисов в БД"""
+    with SessionLocal() as session:
+        LocationsLogic(session).flush_office_occupancy()
 
 
 @asynccontextmanager
@@ -12,8 +34,24 @@ async def lifespan(__app):
 
     :param __app: экземпляр приложения FastAPI
     """
-    with Session(engine) as session:
+    with Session(read_engine) as session:  # старт только читает БД (снапшот строится отдельным engine)
         startup_event = StartupEvent(session)
         startup_event.run()
         session.commit()
+    token_store = TOKEN_STORE if SIGNED_TOKENS is None else SIGNED_TOKENS
+    background_tasks = [
+        asyncio.create_task(run_periodically(TOKEN_PURGE_INTERVAL, token_store.purge_expired)),
+        asyncio.create_task(run_periodically(SMS_SWEEP_INTERVAL, SMS_STORE.purge_expired)),
+        asyncio.create_task(run_periodically(LOAD_FORECAST_REFRESH_INTERVAL, _refresh_load_forecast)),
+        asyncio.create_task(run_periodically(OCCUPANCY_FLUSH_INTERVAL, _flush_office_occupancy)),
+    ]
     yield
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await asyncio.to_thread(_flush_office_occupancy)  # не терять принятые события при остановке
+    OFFICE_BATCH_POOL.shutdown()
+    await async_engine.dispose()  # закрыть соединения пула (и потоки aiosqlite)
+    read_engine.dispose()
+    engine.dispose()
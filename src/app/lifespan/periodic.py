@@ -0,0 +1,21 @@
+import asyncio
+import logging
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(interval: float, func: Callable[[], object]) -> None:
+    """Вызывать func каждые interval секунд, пока задача не будет отменена (ошибки вызова пишутся в лог)
+
+    func выполняется в отдельном потоке, чтобы обслуживание (например, запросы к БД) не блокировало event loop
+
+    :param interval: период в секундах
+    :param func: синхронная потокобезопасная функция обслуживания (очистка, сброс буферов и т.п.)
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(func)
+        except Exception:
+            logger.exception("Ошибка периодической задачи %s", getattr(func, "__qualname__", func))
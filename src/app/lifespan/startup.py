@@ -1,19 +1,38 @@
 from __future__ import annotations
 
+from collections import Counter
 from datetime import datetime
-import json
+from itertools import islice
+import logging
 import random
-from statistics import mean
-from typing import TYPE_CHECKING, Any
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Iterable
+
+try:
+    import resource
+except ImportError:  # модуль есть только на Unix, без него пиковая память не выводится
+    resource = None
 
 from src.database.models import (
     ATM, ATMReviews, ATMServices, Currency, Office, OfficeHistory, OfficeReviews, OfficeServices, Week
 )
-from src.database.base import Base, engine
+from sqlalchemy.orm import Session
+
+from src.cache.locations import ROAD_GRAPH, TRAVEL_TIMES
+from src.database import snapshot
+from src.database.base import engine, read_engine
+from src.database.bulk import BulkLoader
+from src.database.events import build_load_forecast, build_location_indexes
+from src.models.json_stream import iter_json_array
+from src.settings import ROUTING_GRAPH_PATH, SEED_BATCH_SIZE
 
 if TYPE_CHECKING:
-    from sqlalchemy.orm import Session
+    from sqlalchemy import Engine
 
+logger = logging.getLogger(__name__)
+
+_ATMS_PATH = "data/atms.json"
+_OFFICES_PATH = "data/offices.json"
 
 # # # TODO: нужно лишь для Хакатона, чтобы заполнить БД данными # # #
 _demo_reviews = [
@@ -48,116 +67,191 @@ _office_history_date = [
     "2023-10-01", "2023-10-02", "2023-10-03", "2023-10-04", "2023-10-05", "2023-10-06", "2023-10-07", "2023-10-08",
     "2023-10-09", "2023-10-10", "2023-10-11", "2023-10-12", "2023-10-13", "2023-10-14"
 ]
+_office_history_dt = [
+    datetime.fromisoformat(f"{date} {time}") for date in _office_history_date for time in _office_history_time
+]
+_week_days = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+_office_week_days = {
+    "пн": "monday", "вт": "tuesday", "ср": "wednesday", "чт": "thursday", "пт": "friday", "сб": "saturday"
+}
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 
+def _peak_memory_mb() -> str:
+    """Пиковое потребление памяти (RSS) процесса в МБ"""
+    if resource is None:
+        return "?"
+    return f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}"
+
+
+def _week(all_time: bool = False, **days: str | None) -> dict[str, Any]:
+    """Строка таблицы week (все колонки, дни без расписания - None)"""
+    return {"all_time": all_time, **dict.fromkeys(_week_days), **days}
+
+
 class StartupEvent:
     """startup события для приложения FastAPI"""
     def __init__(self, session: Session):
         self._session = session
 
     def run(self):
-        """Запуск startup события"""
-        Base.metadata.drop_all(engine)  # drop all tables
-        Base.metadata.create_all(engine)  # create all tables
+        """Запуск startup события
+
+        БД заполняется заново, только если изменились входные файлы или схема БД,
+        иначе используется уже построенный файл БД (снапшот).
+        При запуске нескольких воркеров снапшот строит только первый из них (межпроцессная блокировка),
+        остальные ждут его и подключаются к готовой БД только на чтение
+        """
+        input_fingerprint = snapshot.fingerprint(engine, _ATMS_PATH, _OFFICES_PATH)
+        with snapshot.build_lock(engine):
+            if snapshot.get_fingerprint(read_engine) == input_fingerprint:
+                logger.info("Используется существующий снапшот БД %s", engine.url.database)
+            else:
+                snapshot.build_snapshot(engine, input_fingerprint, self.__fill_snapshot, attached=(read_engine,))
+                logger.info("Построен снапшот БД %s", engine.url.database)
+
+        build_location_indexes(self._session)
+        build_load_forecast(self._session)
+        if ROUTING_GRAPH_PATH:
+            self.__load_road_graph(ROUTING_GRAPH_PATH)
+        snapshot.attach(input_fingerprint)
+
+    @staticmethod
+    def __load_road_graph(path: str) -> None:
+        """Загрузка графа дорог для расчета времени в пути"""
+        started = perf_counter()
+        with open(path, "rb") as file:
+            ROAD_GRAPH.load(file)
+        TRAVEL_TIMES.clear()
+        stats = ROAD_GRAPH.stats()
+        logger.info("Загружен граф дорог %s: %d узлов, %d ребер за %.2f с",
+                    path, stats["nodes"], stats["edges"], perf_counter() - started)
 
+    def __fill_snapshot(self, snapshot_engine: Engine) -> None:
+        """Заполнение нового снапшота БД данными из входных файлов"""
         atms_json, offices_json = self.__read_input_json()
+        with Session(snapshot_engine) as session:
+            StartupEvent(session).seed(atms_json, offices_json)
 
-        self._insert_atms(atms_json)
-        self._insert_offices(offices_json)
+    def seed(self,
+             atms_json: Iterable[dict[str, Any]],
+             offices_json: Iterable[dict[str, Any]],
+             batch_size: int = SEED_BATCH_SIZE) -> dict[str, int]:
+        """Заполнение пустых таблиц данными о банкоматах и офисах (массовой вставкой по пачкам)
 
-    def _insert_atms(self, atms_json: list[dict[str, Any]]):
+        Записи берутся из итераторов, каждая пачка из batch_size записей вставляется и коммитится отдельно,
+        поэтому в памяти находится не больше одной пачки, независимо от размера входных данных
+
+        :param atms_json: записи о банкоматах
+        :param offices_json: записи об офисах
+        :param batch_size: количество записей в пачке
+        :return: количество вставленных строк по таблицам
+        """
+        started = perf_counter()
+        loader = BulkLoader()
+        inserted: Counter[str] = Counter()
+        records = 0
+        for insert_records, records_json in ((self._insert_atms, atms_json), (self._insert_offices, offices_json)):
+            records_json = iter(records_json)
+            while batch := list(islice(records_json, batch_size)):
+                insert_records(loader, batch)
+                inserted.update(loader.flush(self._session))
+                self._session.commit()
+                records += len(batch)
+
+        elapsed = perf_counter() - started
+        rows = inserted.total()
+        logger.info(
+            "Заполнение БД: %d записей, %d строк за %.3f с (%.0f записей/с, %.0f строк/с), "
+            "пиковая память процесса %s МБ, %s",
+            records, rows, elapsed, records / elapsed, rows / elapsed, _peak_memory_mb(), dict(inserted)
+        )
+        return dict(inserted)
+
+    def _insert_atms(self, loader: BulkLoader, atms_json: Iterable[dict[str, Any]]):
         """Создает записи про банкоматы в БД (atms)"""
         for atm_json in atms_json:
             reviews = self.__generate_reviews_for_atms()
             review_count = len(reviews)
-            avg_rating = int(mean(review.rating for review in reviews)) if reviews else None
+            avg_rating = sum(review["rating"] for review in reviews) // review_count if reviews else None
             if atm_json["allDay"]:
-                week_info = Week(all_time=True)
+                week_info = _week(all_time=True)
             else:
-                week_info = Week(
-                    monday=self.__generate_week_info_for_atms(),
-                    tuesday=self.__generate_week_info_for_atms(),
-                    wednesday=self.__generate_week_info_for_atms(),
-                    thursday=self.__generate_week_info_for_atms(),
-                    friday=self.__generate_week_info_for_atms(),
-                    saturday=self.__generate_week_info_for_atms(),
-                    sunday=self.__generate_week_info_for_atms()
-                )
-            atm = ATM(
+                week_info = _week(**{day: self.__generate_week_info_for_atms() for day in _week_days})
+            services = atm_json["services"]
+            atm_id = loader.add(
+                ATM,
                 address=atm_json["address"],
                 latitude=atm_json["latitude"],
                 longitude=atm_json["longitude"],
                 avg_rating=avg_rating,
-                reviews=reviews,
                 review_count=review_count,
-                service_info=ATMServices(
-                    wheelchair=_atm_services_mapper[atm_json["services"]["wheelchair"]["serviceActivity"]],
-                    blind=_atm_services_mapper[atm_json["services"]["blind"]["serviceActivity"]],
-                    nfc=_atm_services_mapper[atm_json["services"]["nfcForBankCards"]["serviceActivity"]],
-                    qr_code=_atm_services_mapper[atm_json["services"]["qrRead"]["serviceActivity"]],
-                    currency_input=Currency(
-                        rub=_atm_services_mapper[atm_json["services"]["supportsRub"]["serviceActivity"]],
-                        usd=_atm_services_mapper[atm_json["services"]["supportsUsd"]["serviceActivity"]],
-                        eur=_atm_services_mapper[atm_json["services"]["supportsEur"]["serviceActivity"]]
+                service_info_id=loader.add(
+                    ATMServices,
+                    wheelchair=_atm_services_mapper[services["wheelchair"]["serviceActivity"]],
+                    blind=_atm_services_mapper[services["blind"]["serviceActivity"]],
+                    nfc=_atm_services_mapper[services["nfcForBankCards"]["serviceActivity"]],
+                    qr_code=_atm_services_mapper[services["qrRead"]["serviceActivity"]],
+                    currency_input_id=loader.add_unique(
+                        Currency,
+                        rub=_atm_services_mapper[services["supportsRub"]["serviceActivity"]],
+                        usd=_atm_services_mapper[services["supportsUsd"]["serviceActivity"]],
+                        eur=_atm_services_mapper[services["supportsEur"]["serviceActivity"]]
                     ),
-                    currency_output=Currency(
-                        rub=_atm_services_mapper[atm_json["services"]["supportsChargeRub"]["serviceActivity"]],
+                    currency_output_id=loader.add_unique(
+                        Currency,
+                        rub=_atm_services_mapper[services["supportsChargeRub"]["serviceActivity"]],
                         usd=False,
                         eur=False
                     )
                 ),
-                week_info=week_info
+                week_info_id=loader.add_unique(Week, **week_info)
             )
-            self._session.add(atm)
+            for review in reviews:
+                loader.add(ATMReviews, atm_id=atm_id, **review)
 
-    def _insert_offices(self, offices_json: list[dict[str, Any]]):
+    def _insert_offices(self, loader: BulkLoader, offices_json: Iterable[dict[str, Any]]):
         """Создает записи про офисы в БД (offices)"""
         for office_json in offices_json:
             reviews = self.__generate_reviews_for_offices()
             review_count = len(reviews)
-            avg_rating = int(mean(review.rating for review in reviews)) if reviews else None
+            avg_rating = sum(review["rating"] for review in reviews) // review_count if reviews else None
             week_info_fiz = self.__parse_working_days_office(office_json["openHoursIndividual"])
             week_info_yur = self.__parse_working_days_office(
                 office_json["openHours"],
                 # проверка, чтобы не было ситуации, когда офис не работает ни для физ. лиц, ни для юр. лиц
                 need_random=week_info_fiz is not None
             )
-            office = Office(
+            office_id = loader.add(
+                Office,
                 address=office_json["address"],
                 latitude=office_json["latitude"],
                 longitude=office_json["longitude"],
                 avg_rating=avg_rating,
-                reviews=reviews,
                 review_count=review_count,
                 avg_service_time=random.randint(3, 15),
                 count_clients_now=random.randint(0, 10),
-                week_info_fiz=week_info_fiz,
-                week_info_yur=week_info_yur,
-                service_info=OfficeServices(
+                week_info_fiz_id=loader.add_unique(Week, **week_info_fiz) if week_info_fiz is not None else None,
+                week_info_yur_id=loader.add_unique(Week, **week_info_yur) if week_info_yur is not None else None,
+                service_info_id=loader.add(
+                    OfficeServices,
                     with_ramp=office_json["hasRamp"] == "Y" if office_json["hasRamp"] else False,
                     prime=random.choice([True, True, True, False]),
                     vip=random.choice([True, False, False, False]),
                     rko=office_json["rko"] == "есть РКО" if office_json["rko"] else False,
                     suo=office_json["suoAvailability"] == "Y",
                     kep=office_json["kep"] or False,
-                    currency_input=Currency(
-                        rub=True,
-                        usd=True,
-                        eur=True
-                    ),
-                    currency_output=Currency(
-                        rub=True,
-                        usd=True,
-                        eur=True
-                    )
-                ),
-                history=self.__generate_history_for_office()
+                    currency_input_id=loader.add_unique(Currency, rub=True, usd=True, eur=True),
+                    currency_output_id=loader.add_unique(Currency, rub=True, usd=True, eur=True)
+                )
             )
-            self._session.add(office)
+            for review in reviews:
+                loader.add(OfficeReviews, office_id=office_id, **review)
+            for history in self.__generate_history_for_office():
+                loader.add(OfficeHistory, office_id=office_id, **history)
 
     @staticmethod
-    def __parse_working_days_office(days: list[dict[str, str]], *, need_random: bool = True) -> Week | None:
+    def __parse_working_days_office(days: list[dict[str, str]], *, need_random: bool = True) -> dict | None:
         """Парсятся рабочие дни в конкретном офисе для записи в БД (week)
 
         :param days: информация о днях недели из json
@@ -167,28 +261,16 @@ class StartupEvent:
         if not choice and need_random:
             return None
 
-        week = Week()
+        week = _week()
         for day_info in days:
-            if day_info["days"] == "пн":
-                week.monday = day_info["hours"] if day_info["hours"] != "выходной" else None
-            elif day_info["days"] == "вт":
-                week.tuesday = day_info["hours"] if day_info["hours"] != "выходной" else None
-            elif day_info["days"] == "ср":
-                week.wednesday = day_info["hours"] if day_info["hours"] != "выходной" else None
-            elif day_info["days"] == "чт":
-                week.thursday = day_info["hours"] if day_info["hours"] != "выходной" else None
-            elif day_info["days"] == "пт":
-                week.friday = day_info["hours"] if day_info["hours"] != "выходной" else None
-            elif day_info["days"] == "сб":
-                week.saturday = day_info["hours"] if day_info["hours"] != "выходной" else None
-            else:
-                week.sunday = day_info["hours"] if day_info["hours"] != "выходной" else None
+            day = _office_week_days.get(day_info["days"], "sunday")
+            week[day] = day_info["hours"] if day_info["hours"] != "выходной" else None
         return week
 
     @staticmethod
-    def __generate_reviews_for_atms() -> list[ATMReviews]:
+    def __generate_reviews_for_atms() -> list[dict[str, Any]]:
         """Генерирует отзывы для банкоматов (atm_reviews)"""
-        return [ATMReviews(rating=random.randint(10, 50), content=random.choice(_demo_reviews))
+        return [{"rating": random.randint(10, 50), "content": random.choice(_demo_reviews)}
                 for _ in range(random.randint(0, 10))]
 
     @staticmethod
@@ -198,31 +280,20 @@ class StartupEvent:
         return random.choice([work_time, work_time, work_time, None])
 
     @staticmethod
-    def __generate_reviews_for_offices():
+    def __generate_reviews_for_offices() -> list[dict[str, Any]]:
         """Генерирует отзывы для банкоматов (office_reviews)"""
-        return [OfficeReviews(rating=random.randint(10, 50), content=random.choice(_demo_reviews))
+        return [{"rating": random.randint(10, 50), "content": random.choice(_demo_reviews)}
                 for _ in range(random.randint(0, 10))]
 
     @staticmethod
-    def __generate_history_for_office():
+    def __generate_history_for_office() -> list[dict[str, Any]]:
         """Генерирует историю посещения (событий) офиса"""
         return [
-            OfficeHistory(
-                dt=datetime.fromisoformat(
-                    f"{random.choice(_office_history_date)} {random.choice(_office_history_time)}"
-                ),
-                count_clients=random.randint(0, 12)
-            )
+            {"dt": random.choice(_office_history_dt), "count_clients": random.randint(0, 12)}
             for _ in range(100)
         ]
 
     @staticmethod
     def __read_input_json():
-        """Чтение входных данных (актуально только для Хакатона)"""
-        with open("data/atms.json", encoding="utf-8") as atms_file:
-            atms_json = json.loads(atms_file.read())
-
-        with open("data/offices.json", encoding="utf-8") as offices_file:
-            offices_json = json.loads(offices_file.read())
-
-        return atms_json, offices_json
+        """Потоковое чтение входных данных (актуально только для Хакатона)"""
+        return iter_json_array(_ATMS_PATH), iter_json_array(_OFFICES_PATH)
@@ -0,0 +1,12 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+
+class RawJSONResponse(JSONResponse):
+    """Ответ с уже сериализованным JSON (bytes), без повторной валидации и сериализации
+
+    Наследуется от JSONResponse, чтобы в OpenAPI осталась схема response_model
+    """
+    def render(self, content: Any) -> bytes:
+        return content
@@ -0,0 +1,84 @@
+from math import ceil
+from threading import BoundedSemaphore
+
+from ..database.base import register_sql_function
+from ..models.capabilities import ATM_CAPABILITIES, OFFICE_CAPABILITIES
+from ..models.batch_ranking import RankingPool
+from ..models.clustering import ClusterGrid
+from ..models.fragments import JsonFragments
+from ..models.load_forecast import LoadForecast
+from ..models.occupancy_buffer import OccupancyBuffer
+from ..models.occupancy_hub import OccupancyHub
+from ..models.ranking import RankingEngine
+from ..models.road_graph import RoadGraph
+from ..models.result_cache import ResultCache
+from ..models.spatial_index import SpatialIndex
+from ..models.travel_times import TravelTimes
+from ..settings import (
+    BATCH_RANKING_MAX_REQUESTS, BATCH_RANKING_WORKERS, CLUSTERING_MAX_ZOOM, LOAD_FORECAST_LIVE_HORIZON,
+    LOAD_FORECAST_SLOT_MINUTES, LOAD_FORECAST_TRAVEL_SPEED, LOCATIONS_CACHE_SIZE, LOCATIONS_CACHE_TTL,
+    OCCUPANCY_MAX_PENDING, OCCUPANCY_MAX_SUBSCRIBERS, ROUTING_CACHE_MAX_NODES, ROUTING_CACHE_SIZE,
+    ROUTING_DETOUR_FACTOR, ROUTING_DRIVE_SPEED, ROUTING_GRAPH_PATH, ROUTING_MAX_DETOUR, ROUTING_ORIGIN_QUANTUM,
+    ROUTING_SNAP_DISTANCE, ROUTING_WALK_SPEED
+)
+
+
+# Пространственные индексы локаций (строятся при старте приложения). Значение - id банкомата/офиса
+ATM_SPATIAL_INDEX = SpatialIndex()
+OFFICE_SPATIAL_INDEX = SpatialIndex()
+
+# Массивы для векторизованного ранжирования локаций (строятся при первом запросе, если включено)
+ATM_RANKING_ENGINE = RankingEngine(flags=ATM_CAPABILITIES)
+OFFICE_RANKING_ENGINE = RankingEngine(flags=OFFICE_CAPABILITIES, with_queue=True)
+
+# Иерархические сетки кластеров локаций для отдаленных масштабов карты (строятся при старте приложения)
+ATM_CLUSTER_GRID = ClusterGrid(levels=ceil(CLUSTERING_MAX_ZOOM))
+OFFICE_CLUSTER_GRID = ClusterGrid(levels=ceil(CLUSTERING_MAX_ZOOM))
+
+# Кеш результатов поиска локаций. Теги записей - ("atm", id) / ("office", id) найденных локаций
+LOCATIONS_RESULT_CACHE = ResultCache(max_size=LOCATIONS_CACHE_SIZE, ttl=LOCATIONS_CACHE_TTL)
+
+# Сериализованные статические данные локаций (без distance, timeWait, countClientsNow). Ключ - id локации
+ATM_JSON_FRAGMENTS = JsonFragments()
+OFFICE_JSON_FRAGMENTS = JsonFragments()
+
+# Прогноз загруженности офисов по дням недели и слотам времени (строится при старте приложения по истории).
+# В SQL доступен как expected_clients(office_id, count_clients_now, distance, week_minute)
+OFFICE_LOAD_FORECAST = LoadForecast(
+    slot_minutes=LOAD_FORECAST_SLOT_MINUTES,
+    travel_speed=LOAD_FORECAST_TRAVEL_SPEED,
+    live_horizon=LOAD_FORECAST_LIVE_HORIZON,
+)
+register_sql_function("expected_clients", OFFICE_LOAD_FORECAST.expected_clients, 4)
+
+# Еще не записанные в БД события загруженности офисов (сбрасываются периодически).
+# В SQL доступен как live_clients(office_id, count_clients_now) - количество клиентов с учетом буфера
+OFFICE_OCCUPANCY_BUFFER = OccupancyBuffer(max_pending=OCCUPANCY_MAX_PENDING)
+register_sql_function("live_clients", OFFICE_OCCUPANCY_BUFFER.current, 2)
+
+# Рассылка изменений загруженности офисов подписчикам (SSE) по ячейкам карты (строится при старте приложения)
+OFFICE_OCCUPANCY_HUB = OccupancyHub(max_subscribers=OCCUPANCY_MAX_SUBSCRIBERS)
+
+# Граф дорог для расчета времени в пути (загружается при старте приложения, если задан ROUTING_GRAPH_PATH).
+# Параметры нужны и процессам пакетного поиска офисов, которые загружают граф сами
+ROAD_GRAPH_OPTIONS = {"walk_speed": ROUTING_WALK_SPEED, "snap_distance": ROUTING_SNAP_DISTANCE}
+ROAD_GRAPH = RoadGraph(**ROAD_GRAPH_OPTIONS)
+
+# Время в пути от начальной точки до офисов: проходы по графу дорог с кешем по ячейкам начальных точек.
+# В SQL доступен как travel_minutes(широта, долгота, широта, долгота, 'walk' | 'drive')
+TRAVEL_TIMES_OPTIONS = {
+    "walk_speed": ROUTING_WALK_SPEED,
+    "drive_speed": ROUTING_DRIVE_SPEED,
+    "detour_factor": ROUTING_DETOUR_FACTOR,
+    "max_detour": ROUTING_MAX_DETOUR,
+    "origin_quantum": ROUTING_ORIGIN_QUANTUM,
+    "max_sweeps": ROUTING_CACHE_SIZE,
+    "max_nodes": ROUTING_CACHE_MAX_NODES,
+}
+TRAVEL_TIMES = TravelTimes(ROAD_GRAPH, **TRAVEL_TIMES_OPTIONS)
+register_sql_function("travel_minutes", TRAVEL_TIMES.minutes, 5)
+
+# Пул процессов пакетного поиска офисов (создается при первом пакетном запросе, пересоздается
+# при перестроении массивов движка ранжирования) и места для одновременных пакетных запросов
+OFFICE_BATCH_POOL = RankingPool(BATCH_RANKING_WORKERS, ROUTING_GRAPH_PATH, ROAD_GRAPH_OPTIONS, TRAVEL_TIMES_OPTIONS)
+OFFICE_BATCH_SLOTS = BoundedSemaphore(BATCH_RANKING_MAX_REQUESTS)
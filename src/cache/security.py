@@ -1,2 +1,24 @@
-# Мок реализация вместо Redis. Ключ - токен, значение - номер телефона
-TOKEN_CACHE: dict[str, str] = {}
+import secrets
+
+from ..models.signed_token import ReplayFilter, SignedTokens
+from ..models.token_store import MemoryTokenStore, RedisTokenStore, TokenStore
+from ..settings import (REDIS_URL, TOKEN_MODE, TOKEN_REPLAY_FILTER_SIZE, TOKEN_SECRET, TOKEN_STORE_BACKEND,
+                        TOKEN_TTL)
+
+
+def _token_store() -> TokenStore:
+    if TOKEN_STORE_BACKEND == "redis":
+        import redis
+        return RedisTokenStore(redis.Redis.from_url(REDIS_URL, decode_responses=True), ttl=TOKEN_TTL)
+    return MemoryTokenStore(ttl=TOKEN_TTL)
+
+
+# Токены доступа пользователей: токен -> номер телефона
+TOKEN_STORE = _token_store()
+
+# Подписанные токены (режим TOKEN_MODE="signed", иначе None)
+SIGNED_TOKENS = SignedTokens(
+    secret=TOKEN_SECRET.encode() or secrets.token_bytes(32),
+    ttl=TOKEN_TTL,
+    replay_filter=ReplayFilter(max_size=TOKEN_REPLAY_FILTER_SIZE),
+) if TOKEN_MODE == "signed" else None
@@ -1,5 +1,6 @@
-from typing import Any
+from ..models.sms_store import SmsStore
+from ..settings import SMS_RATE_LIMIT, SMS_RATE_WINDOW, SMS_STORE_MAX_SIZE
 
 
-# Мок реализация вместо Redis. Ключ - код, значение - SentSmsInfo
-SMS_CACHE: dict[str, Any] = {}
+# Отправленные коды подтверждения. Ключ - (телефон, код), значение - SentSmsInfo
+SMS_STORE = SmsStore(max_size=SMS_STORE_MAX_SIZE, rate_limit=SMS_RATE_LIMIT, rate_window=SMS_RATE_WINDOW)
@@ -1,11 +1,140 @@
-from sqlalchemy import create_engine
+import os
+from typing import Any, Callable
+
+from sqlalchemy import AsyncAdaptedQueuePool, Engine, QueuePool, create_engine, event
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
 
+from ..settings import (ASYNC_DB_MAX_OVERFLOW, ASYNC_DB_POOL_SIZE, SQLITE_BUSY_TIMEOUT, SQLITE_CACHE_SIZE_KB,
+                        SQLITE_JOURNAL_MODE, SQLITE_MMAP_SIZE, SQLITE_READ_MAX_OVERFLOW, SQLITE_READ_POOL_SIZE,
+                        SQLITE_SYNCHRONOUS, SQLITE_WRITE_TIMEOUT)
+
+DATABASE_URL = "sqlite:///database.db"
+
+# Python функции, доступные в SQL на каждом соединении: имя -> (количество аргументов, функция)
+_sql_functions: dict[str, tuple[int, Callable]] = {}
+
+
+def register_sql_function(name: str, func: Callable, args_count: int) -> None:
+    """Сделать функцию доступной в SQL (на соединениях, открытых после регистрации)
+
+    Функция вызывается из потока драйвера БД, поэтому должна быть потокобезопасной
+    """
+    _sql_functions[name] = (args_count, func)
+
+
+def _configure_connection(dbapi_connection: Any, read_only: bool) -> None:
+    """Настройка нового соединения SQLite (PRAGMA действуют на соединение, кроме journal_mode - он хранится в файле)
+
+    :param dbapi_connection: соединение драйвера (sqlite3 или адаптер aiosqlite)
+    :param read_only: соединение только для чтения (попытка записи - ошибка SQLite)
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT * 1000)}")
+    if not read_only:
+        cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_SIZE_KB}")  # отрицательное значение - размер в КиБ
+    if read_only:
+        cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+    for name, (args_count, func) in _sql_functions.items():
+        dbapi_connection.create_function(name, args_count, func)
+
+
+def _file_id(path: str) -> tuple[int, int] | None:
+    """Устройство и inode файла (по символической ссылке - файла, на который она указывает)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def _opened_file_id(dbapi_connection: Any) -> tuple[int, int] | None:
+    """Файл, который открыло соединение SQLite (None - БД в памяти)"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA database_list")
+    path = next((row[2] for row in cursor.fetchall() if row[1] == "main"), "")
+    cursor.close()
+    return _file_id(path) if path else None
+
 
-engine = create_engine("sqlite:///database.db", connect_args={"check_same_thread": False})
+def _check_database_file(path: str, connection_record: Any) -> None:
+    """Соединение открыто на файле, который сейчас лежит по пути БД, иначе оно переоткрывается
+
+    Путь БД переключается на новый снапшот другим процессом (см. snapshot.build_snapshot): соединения,
+    открытые на старом файле, не должны продолжать работу с ним
+    """
+    opened = connection_record.info.get("file_id")
+    if opened is not None and _file_id(path) not in (None, opened):
+        raise DisconnectionError(f"Файл БД {path} заменен, соединение открывается заново")
+
+
+def configure_connections(target: Engine, read_only: bool) -> None:
+    """Настраивать каждое новое соединение engine (PRAGMA из настроек SQLITE_*)
+    и при выдаче из пула проверять, что файл БД не заменен
+    """
+    path = os.path.abspath(target.url.database or "")  # как при открытии соединения драйвером
+
+    def on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        _configure_connection(dbapi_connection, read_only)
+        connection_record.info["file_id"] = _opened_file_id(dbapi_connection)
+
+    event.listen(target, "connect", on_connect)
+    event.listen(target, "checkout", lambda _, connection_record, __: _check_database_file(path, connection_record))
+
+
+# Единственное соединение для записи: писатели ждут его в пуле, а не получают SQLITE_BUSY от конкурирующих соединений
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=1,
+    max_overflow=0,
+    pool_timeout=SQLITE_WRITE_TIMEOUT,
+)
+configure_connections(engine, read_only=False)
+
+# Соединения только для чтения: в режиме WAL читают последнее зафиксированное состояние, не дожидаясь писателя
+read_engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=SQLITE_READ_POOL_SIZE,
+    max_overflow=SQLITE_READ_MAX_OVERFLOW,
+)
+configure_connections(read_engine, read_only=True)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Асинхронный доступ к той же БД (aiosqlite) для обработчиков чтения, работающих в event loop.
+# По умолчанию для файла SQLite aiosqlite открывает соединение (и поток) на каждую сессию - используется пул
+async_engine = create_async_engine(
+    engine.url.set(drivername="sqlite+aiosqlite"),
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+)
+configure_connections(async_engine.sync_engine, read_only=True)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def pool_stats(target: Engine | AsyncEngine) -> dict[str, int]:
+    """Состояние пула соединений engine: размер, выданные/свободные соединения, соединения сверх размера"""
+    pool = target.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
 
 class Base(DeclarativeBase):
     """Базовый класс ORM моделей
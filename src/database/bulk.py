@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any
+
+from sqlalchemy import Connection, Table, insert
+from sqlalchemy.orm import Session
+
+from .base import Base
+
+
+class BulkLoader:
+    """Массовая загрузка строк в БД в обход unit of work ORM
+
+    Строки копятся по таблицам, id назначаются заранее (таблицы должны быть пустыми), поэтому связи
+    между строками задаются сразу через внешние ключи. При flush каждая таблица вставляется
+    одним executemany драйвера БД в порядке зависимостей (Base.metadata.sorted_tables),
+    без обработки параметров на каждую строку в SQLAlchemy (конвертируются только колонки,
+    типам которых это нужно, например DateTime в SQLite).
+    Все строки одной таблицы должны содержать одинаковый набор колонок.
+    flush можно вызывать по частям (пачками): нумерация id и дедупликация продолжаются между вызовами.
+
+    :param max_unique: сколько последних уникальных строк на таблицу помнить для дедупликации
+        (ограничивает память при большом количестве разных значений)
+    """
+    def __init__(self, max_unique: int = 4096):
+        self._rows: dict[Table, list[dict[str, Any]]] = {}
+        self._last_ids: dict[Table, int] = {}
+        self._unique: dict[Table, OrderedDict[tuple, int]] = {}
+        self._max_unique = max_unique
+
+    def add(self, model: type[Base], **values) -> int:
+        """Добавить строку в таблицу модели
+
+        :param model: ORM модель
+        :param values: значения колонок (без id)
+        :return: id добавленной строки
+        """
+        table = model.__table__
+        row_id = self._last_ids[table] = self._last_ids.get(table, 0) + 1
+        self._rows.setdefault(table, []).append({"id": row_id, **values})
+        return row_id
+
+    def add_unique(self, model: type[Base], **values) -> int:
+        """Добавить строку, если такой же строки (по значениям колонок) еще нет (для Currency, Week)
+
+        :return: id новой или уже добавленной строки с такими же значениями
+        """
+        ids = self._unique.setdefault(model.__table__, OrderedDict())
+        key = tuple(sorted(values.items()))
+        row_id = ids.get(key)
+        if row_id is not None:
+            ids.move_to_end(key)
+            return row_id
+        row_id = ids[key] = self.add(model, **values)
+        if len(ids) > self._max_unique:
+            ids.popitem(last=False)
+        return row_id
+
+    def flush(self, session: Session) -> dict[str, int]:
+        """Вставить накопленные строки в БД
+
+        :return: количество вставленных строк по таблицам
+        """
+        connection = session.connection()
+        inserted = {}
+        for table in Base.metadata.sorted_tables:
+            rows = self._rows.pop(table, None)
+            if rows:
+                self._insert(connection, table, rows)
+                inserted[table.name] = len(rows)
+        return inserted
+
+    @staticmethod
+    def _insert(connection: Connection, table: Table, rows: list[dict[str, Any]]) -> None:
+        dialect = connection.dialect
+        compiled = insert(table).compile(dialect=dialect, column_keys=list(rows[0]))
+        for key in rows[0]:
+            processor = table.c[key].type.dialect_impl(dialect).bind_processor(dialect)
+            if processor is not None:
+                process = lru_cache(maxsize=4096)(processor)  # значения колонок часто повторяются
+                for row in rows:
+                    row[key] = process(row[key])
+        if compiled.positional:
+            rows = list(map(itemgetter(*compiled.positiontup), rows))
+        connection.exec_driver_sql(str(compiled), rows)
@@ -1,9 +1,61 @@
-from sqlalchemy import select
+from typing import Literal
+
+from sqlalchemy import Select, func, null, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..models import OfficeHistory
+from ..models import OfficeHistory, OfficeLoadHourly, OfficeLoadSlots, OfficeLoadWeekly
+
+LoadGranularity = Literal["hour", "weekday_hour"]
+
+
+def _office_history_stmt(office_id: int) -> Select:
+    return select(OfficeHistory).where(OfficeHistory.office_id == office_id).order_by(OfficeHistory.dt)
+
+
+def _office_load_profile_stmt(office_id: int, granularity: LoadGranularity) -> Select:
+    """Средняя загруженность офиса по часам суток или по дням недели и часам (из агрегатов истории)"""
+    rollup = OfficeLoadHourly if granularity == "hour" else OfficeLoadWeekly
+    weekday = null() if rollup is OfficeLoadHourly else rollup.weekday
+    stmt = select(
+        weekday.label("weekday"),
+        rollup.hour,
+        (rollup.clients_sum * 1.0 / rollup.samples).label("avg_count_clients"),
+        rollup.samples,
+    ).where(rollup.office_id == office_id, rollup.samples > 0)
+    if rollup is OfficeLoadWeekly:
+        stmt = stmt.order_by(rollup.weekday)
+    return stmt.order_by(rollup.hour)
 
 
 def get_office_history(db: Session, office_id: int):
-    stmt = select(OfficeHistory).where(OfficeHistory.office_id == office_id)
-    return db.execute(stmt).scalars()
+    return db.execute(_office_history_stmt(office_id)).scalars().all()
+
+
+async def get_office_history_async(db: AsyncSession, office_id: int):
+    return (await db.execute(_office_history_stmt(office_id))).scalars().all()
+
+
+def get_office_load_profile(db: Session, office_id: int, granularity: LoadGranularity):
+    return [dict(row) for row in db.execute(_office_load_profile_stmt(office_id, granularity)).mappings()]
+
+
+async def get_office_load_profile_async(db: AsyncSession, office_id: int, granularity: LoadGranularity):
+    return [dict(row) for row in (await db.execute(_office_load_profile_stmt(office_id, granularity))).mappings()]
+
+
+def get_office_load_slots(db: Session, slot_minutes: int):
+    """Средняя загруженность офисов по дням недели (0 - понедельник) и слотам суток по slot_minutes минут
+
+    Строится по агрегату office_load_slots (по минутам суток): минуты слота суммируются
+
+    :return: строки (office_id, weekday, slot, avg_count_clients)
+    """
+    slot = (OfficeLoadSlots.minute // slot_minutes).label("slot")
+    stmt = select(
+        OfficeLoadSlots.office_id,
+        OfficeLoadSlots.weekday,
+        slot,
+        func.sum(OfficeLoadSlots.clients_sum) * 1.0 / func.sum(OfficeLoadSlots.samples),
+    ).group_by(OfficeLoadSlots.office_id, OfficeLoadSlots.weekday, slot).having(func.sum(OfficeLoadSlots.samples) > 0)
+    return db.execute(stmt).tuples()
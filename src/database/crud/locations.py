@@ -1,10 +1,17 @@
+from datetime import datetime
+import json
+from math import pi
 from typing import TypedDict
-from sqlalchemy import Integer, select, func, asc
-from sqlalchemy.orm import Session
+from sqlalchemy import ColumnElement, Integer, Select, TableClause, and_, or_, select, func, asc, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 
 from .. import models
+from ...models.capabilities import ATM_CAPABILITIES, OFFICE_CAPABILITIES, capabilities_mask
+from ...models.spatial_index import EARTH_RADIUS as _EARTH_RADIUS, bounding_box
 
-_EARTH_RADIUS = 6371  # примерный радиус Земли в км
+# Максимум id кандидатов, передаваемых в IN отдельными параметрами (старый лимит SQLITE_MAX_VARIABLE_NUMBER)
+_MAX_BOUND_IDS = 999
 
 
 def _zoom_mapper(zoom: float) -> float:
@@ -40,6 +47,8 @@ class BaseFilter(TypedDict):
     initial_longitude: float | None
     zoom: float
     avg_rating: int | None
+    limit: int | None
+    cursor: str | None
 
 
 class FindATMFilter(BaseFilter):
@@ -61,47 +70,156 @@ class FindOfficesFilter(BaseFilter):
     rko: bool | None
     suo: bool | None
     kep: bool | None
+    travel_mode: str | None
     withdraw_currencies: list[str] | None
     deposit_currencies: list[str] | None
 
 
-def get_atms_filtered(db: Session, filter_data: FindATMFilter):
-    # TODO Добавить filter withdraw_currencies, deposit_currencies
+def _atm_loader_options() -> tuple:
+    """Загрузка всех связей банкомата, нужных для ATMModel, в том же запросе (без ленивых SELECT на каждую строку)
+
+    Обязательные связи присоединяются через INNER JOIN - SQLite может сначала отфильтровать банкоматы
+    """
+    service_info = joinedload(models.ATM.service_info, innerjoin=True)
+    return (
+        joinedload(models.ATM.week_info, innerjoin=True),
+        service_info.joinedload(models.ATMServices.currency_input, innerjoin=True),
+        service_info.joinedload(models.ATMServices.currency_output, innerjoin=True),
+    )
+
+
+def _office_loader_options() -> tuple:
+    """Загрузка всех связей офиса, нужных для OfficeModel, в том же запросе (без ленивых SELECT на каждую строку)
+
+    Обязательные связи присоединяются через INNER JOIN - SQLite может сначала отфильтровать офисы
+    """
+    service_info = joinedload(models.Office.service_info, innerjoin=True)
+    return (
+        joinedload(models.Office.week_info_fiz),
+        joinedload(models.Office.week_info_yur),
+        service_info.joinedload(models.OfficeServices.currency_input, innerjoin=True),
+        service_info.joinedload(models.OfficeServices.currency_output, innerjoin=True),
+    )
+
+
+def _filter_by_capabilities(model: type[models.ATM] | type[models.Office],
+                            capabilities: tuple[str, ...],
+                            filter_data: BaseFilter) -> ColumnElement[bool] | bool:
+    """Фильтр по услугам и валютам - одна проверка маски возможностей локации (колонка capabilities)
+
+    :param model: ORM модель локации (банкомат или офис)
+    :param capabilities: возможности локаций в порядке битов маски
+    :param filter_data: фильтры поиска
+    """
+    mask = capabilities_mask(capabilities, filter_data)
+    return model.capabilities.op("&")(mask) == mask if mask else True
+
+
+def _paginate(stmt: Select,
+              model: type[models.ATM] | type[models.Office],
+              sort_key: ColumnElement,
+              filter_data: BaseFilter,
+              after: tuple[float, int] | None) -> Select:
+    """Keyset пагинация: сортировка по (sort_key, id), выдача после курсора и не больше limit локаций
+
+    :param stmt: запрос на выборку локаций
+    :param model: ORM модель локации (банкомат или офис)
+    :param sort_key: ключ сортировки из выбираемых колонок (distance или time_wait)
+    :param filter_data: фильтры поиска (limit)
+    :param after: (значение ключа сортировки, id) последней локации предыдущей страницы
+    """
+    stmt = stmt.order_by(asc(sort_key), asc(model.id))
+    if after is not None:
+        after_value, after_id = after
+        stmt = stmt.where(or_(sort_key > after_value, and_(sort_key == after_value, model.id > after_id)))
+    if filter_data.get("limit"):
+        stmt = stmt.limit(filter_data["limit"])
+    return stmt
+
+
+def _filter_by_radius(stmt: Select,
+                      model: type[models.ATM] | type[models.Office],
+                      rtree: TableClause,
+                      filter_data: BaseFilter,
+                      location_ids: list[int] | None) -> Select:
+    """Ограничение выборки локаций радиусом поиска
+
+    Если есть кандидаты из пространственного индекса - фильтрация по id, иначе
+    сначала отбор по bounding box через R*Tree, а точное расстояние считается только для попавших в него
+
+    :param stmt: запрос на выборку локаций
+    :param model: ORM модель локации (банкомат или офис)
+    :param rtree: R*Tree зеркало таблицы локаций
+    :param filter_data: фильтры поиска
+    :param location_ids: id локаций-кандидатов из пространственного индекса. Длинный список передается
+        одним параметром - JSON массивом (json_each), а не параметром на каждый id (лимит переменных SQLite)
+    """
+    if location_ids is not None:
+        if len(location_ids) <= _MAX_BOUND_IDS:
+            return stmt.where(model.id.in_(location_ids))
+        candidates = func.json_each(json.dumps(location_ids)).table_valued("value")
+        return stmt.where(model.id.in_(select(candidates.c.value)))
+
     radius_search = _zoom_mapper(filter_data["zoom"])
-    stmt = select(
-        models.ATM,
+    if radius_search >= pi * _EARTH_RADIUS:
+        return stmt
+
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(
+        filter_data["latitude"], filter_data["longitude"], radius_search
+    )
+    return stmt.join(
+        rtree, rtree.c.id == model.id
+    ).where(
+        rtree.c.max_latitude >= min_latitude,
+        rtree.c.min_latitude <= max_latitude,
+        rtree.c.max_longitude >= min_longitude,
+        rtree.c.min_longitude <= max_longitude,
         (func.acos(
+            func.sin(func.radians(model.latitude)) * func.sin(func.radians(filter_data["latitude"])) +
+            func.cos(func.radians(model.latitude)) * func.cos(func.radians(filter_data["latitude"])) *
+            func.cos(func.radians(model.longitude) - func.radians(filter_data["longitude"]))
+        ) * _EARTH_RADIUS) <= radius_search,
+    )
+
+
+def _atms_filtered_stmt(filter_data: FindATMFilter,
+                        location_ids: list[int] | None = None,
+                        after: tuple[float, int] | None = None) -> Select:
+    distance = (
+        func.acos(
             func.sin(func.radians(models.ATM.latitude)) * func.sin(func.radians(filter_data["initial_latitude"])) +
             func.cos(func.radians(models.ATM.latitude)) * func.cos(func.radians(filter_data["initial_latitude"])) *
             func.cos(func.radians(models.ATM.longitude) - func.radians(filter_data["initial_longitude"]))
-        ) * _EARTH_RADIUS).label("distance"),
-    ).where(
-        (func.acos(
-            func.sin(func.radians(models.ATM.latitude)) * func.sin(func.radians(filter_data["latitude"])) +
-            func.cos(func.radians(models.ATM.latitude)) * func.cos(func.radians(filter_data["latitude"])) *
-            func.cos(func.radians(models.ATM.longitude) - func.radians(filter_data["longitude"]))
-        ) * _EARTH_RADIUS) <= radius_search,
+        ) * _EARTH_RADIUS
+    ).label("distance")
 
+    stmt = select(
+        models.ATM,
+        distance,
+    ).where(
         models.ATM.avg_rating.is_not(None) if filter_data["avg_rating"] else True,
         models.ATM.avg_rating >= filter_data["avg_rating"] if filter_data["avg_rating"] else True,
-        models.Week.all_time == filter_data["all_day"] if filter_data["all_day"] else True,
-        models.ATMServices.wheelchair == filter_data["wheelchair"] if filter_data["wheelchair"] else True,
-        models.ATMServices.blind == filter_data["blind"] if filter_data["blind"] else True,
-        models.ATMServices.nfc == filter_data["nfc_support"] if filter_data["nfc_support"] else True,
-        models.ATMServices.qr_code == filter_data["qr_support"] if filter_data["qr_support"] else True,
-    ).join(
-        models.Week, models.ATM.week_info_id == models.Week.id
-    ).join(
-        models.ATMServices, models.ATM.service_info_id == models.ATMServices.id
-    ).order_by(
-        asc("distance")
+        _filter_by_capabilities(models.ATM, ATM_CAPABILITIES, filter_data),
+    ).options(
+        *_atm_loader_options()
     )
-    return db.execute(stmt).all()
+    stmt = _filter_by_radius(stmt, models.ATM, models.atm_rtree, filter_data, location_ids)
+    return _paginate(stmt, models.ATM, distance, filter_data, after)
 
 
-def get_offices_filtered(db: Session, filter_data: FindOfficesFilter):
-    # TODO Добавить filter withdraw_currencies, deposit_currencies
-    radius_search = _zoom_mapper(filter_data["zoom"])
+def _offices_filtered_stmt(filter_data: FindOfficesFilter,
+                           location_ids: list[int] | None = None,
+                           after: tuple[float, int] | None = None,
+                           week_minute: int | None = None) -> Select:
+    """Офисы, отсортированные по time_wait
+
+    Если задан travel_mode - вместо расстояния в time_wait входит время в пути по дорогам
+    (SQL функция travel_minutes), оно считается только для офисов, прошедших остальные фильтры.
+    Все строки запроса продолжают один проход по графу из ячейки начальной точки (TravelTimes)
+
+    :param week_minute: текущее время в минутах от понедельника 00:00 - time_wait считается по прогнозу
+        загруженности на время прибытия (SQL функция expected_clients), None - по текущей загруженности
+    """
     distance = (
         func.acos(
             func.sin(func.radians(models.Office.latitude)) * func.sin(func.radians(filter_data["initial_latitude"])) +
@@ -109,42 +227,163 @@ def get_offices_filtered(db: Session, filter_data: FindOfficesFilter):
             func.cos(func.radians(models.Office.longitude) - func.radians(filter_data["initial_longitude"]))
         ) * _EARTH_RADIUS
     ).label("distance")
+    # количество клиентов с учетом еще не записанных в БД событий загруженности (SQL функция live_clients)
+    count_clients_now = func.live_clients(models.Office.id, models.Office.count_clients_now)
+    clients = count_clients_now
+    if week_minute is not None:
+        clients = func.expected_clients(models.Office.id, count_clients_now, distance, week_minute)
+    travel = distance
+    if filter_data.get("travel_mode"):
+        travel = func.travel_minutes(filter_data["initial_latitude"], filter_data["initial_longitude"],
+                                     models.Office.latitude, models.Office.longitude, filter_data["travel_mode"])
+    time_wait = (
+        func.cast(travel + models.Office.avg_service_time * clients, Integer)
+    ).label("time_wait")
 
     stmt = select(
         models.Office,
         distance,
-        (
-            func.cast(distance + models.Office.avg_service_time * models.Office.count_clients_now, Integer)
-        ).label("time_wait")
+        time_wait
     ).where(
-        (func.acos(
-            func.sin(func.radians(models.Office.latitude)) * func.sin(func.radians(filter_data["latitude"])) +
-            func.cos(func.radians(models.Office.latitude)) * func.cos(func.radians(filter_data["latitude"])) *
-            func.cos(func.radians(models.Office.longitude) - func.radians(filter_data["longitude"]))
-        ) * _EARTH_RADIUS) <= radius_search,
         models.Office.avg_rating.is_not(None) if filter_data["avg_rating"] else True,
         models.Office.avg_rating >= filter_data["avg_rating"] if filter_data["avg_rating"] else True,
         models.Office.avg_service_time <= filter_data["avg_service_time"] if filter_data["avg_service_time"] else True,
-        models.Office.count_clients_now <= filter_data["count_clients_now"] if filter_data["count_clients_now"] else True,
-        models.OfficeServices.with_ramp == filter_data["with_ramp"] if filter_data["with_ramp"] else True,
-        models.OfficeServices.prime == filter_data["prime"] if filter_data["prime"] else True,
-        models.OfficeServices.vip == filter_data["vip"] if filter_data["vip"] else True,
-        models.OfficeServices.rko == filter_data["rko"] if filter_data["rko"] else True,
-        models.OfficeServices.suo == filter_data["suo"] if filter_data["suo"] else True,
-        models.OfficeServices.suo == filter_data["kep"] if filter_data["kep"] else True,
-    ).join(
-        models.OfficeServices, models.OfficeServices.id == models.Office.service_info_id
-    ).order_by(
-        asc("time_wait")
+        count_clients_now <= filter_data["count_clients_now"] if filter_data["count_clients_now"] else True,
+        _filter_by_capabilities(models.Office, OFFICE_CAPABILITIES, filter_data),
+    ).options(
+        *_office_loader_options()
+    )
+    stmt = _filter_by_radius(stmt, models.Office, models.office_rtree, filter_data, location_ids)
+    return _paginate(stmt, models.Office, time_wait, filter_data, after)
+
+
+def get_atms_filtered(db: Session,
+                      filter_data: FindATMFilter,
+                      location_ids: list[int] | None = None,
+                      after: tuple[float, int] | None = None):
+    return db.execute(_atms_filtered_stmt(filter_data, location_ids, after)).all()
+
+
+async def get_atms_filtered_async(db: AsyncSession,
+                                  filter_data: FindATMFilter,
+                                  location_ids: list[int] | None = None,
+                                  after: tuple[float, int] | None = None):
+    return (await db.execute(_atms_filtered_stmt(filter_data, location_ids, after))).all()
+
+
+def get_offices_filtered(db: Session,
+                         filter_data: FindOfficesFilter,
+                         location_ids: list[int] | None = None,
+                         after: tuple[float, int] | None = None,
+                         week_minute: int | None = None):
+    return db.execute(_offices_filtered_stmt(filter_data, location_ids, after, week_minute)).all()
+
+
+async def get_offices_filtered_async(db: AsyncSession,
+                                     filter_data: FindOfficesFilter,
+                                     location_ids: list[int] | None = None,
+                                     after: tuple[float, int] | None = None,
+                                     week_minute: int | None = None):
+    return (await db.execute(_offices_filtered_stmt(filter_data, location_ids, after, week_minute))).all()
+
+
+def _atms_ranking_data_stmt() -> Select:
+    """Данные всех банкоматов, необходимые для векторизованного ранжирования"""
+    return select(
+        models.ATM.id,
+        models.ATM.latitude,
+        models.ATM.longitude,
+        models.ATM.avg_rating,
+        models.ATM.capabilities,
     )
-    return db.execute(stmt).all()
+
+
+def _offices_ranking_data_stmt() -> Select:
+    """Данные всех офисов, необходимые для векторизованного ранжирования"""
+    return select(
+        models.Office.id,
+        models.Office.latitude,
+        models.Office.longitude,
+        models.Office.avg_rating,
+        models.Office.avg_service_time,
+        models.Office.count_clients_now,
+        models.Office.capabilities,
+    )
+
+
+def get_atms_ranking_data(db: Session):
+    return db.execute(_atms_ranking_data_stmt()).mappings().all()
+
+
+async def get_atms_ranking_data_async(db: AsyncSession):
+    return (await db.execute(_atms_ranking_data_stmt())).mappings().all()
+
+
+def get_offices_ranking_data(db: Session):
+    return db.execute(_offices_ranking_data_stmt()).mappings().all()
+
+
+async def get_offices_ranking_data_async(db: AsyncSession):
+    return (await db.execute(_offices_ranking_data_stmt())).mappings().all()
+
+
+def _atms_by_ids_stmt(atm_ids: list[int]) -> Select:
+    return select(models.ATM).where(models.ATM.id.in_(atm_ids)).options(*_atm_loader_options())
+
+
+def _offices_by_ids_stmt(office_ids: list[int]) -> Select:
+    return select(models.Office).where(models.Office.id.in_(office_ids)).options(*_office_loader_options())
+
+
+def get_atms_by_ids(db: Session, atm_ids: list[int]) -> dict[int, models.ATM]:
+    return {atm.id: atm for atm in db.execute(_atms_by_ids_stmt(atm_ids)).scalars()}
+
+
+async def get_atms_by_ids_async(db: AsyncSession, atm_ids: list[int]) -> dict[int, models.ATM]:
+    return {atm.id: atm for atm in (await db.execute(_atms_by_ids_stmt(atm_ids))).scalars()}
+
+
+def get_offices_by_ids(db: Session, office_ids: list[int]) -> dict[int, models.Office]:
+    return {office.id: office for office in db.execute(_offices_by_ids_stmt(office_ids)).scalars()}
+
+
+async def get_offices_by_ids_async(db: AsyncSession, office_ids: list[int]) -> dict[int, models.Office]:
+    return {office.id: office for office in (await db.execute(_offices_by_ids_stmt(office_ids))).scalars()}
+
+
+def save_offices_occupancy(db: Session, occupancy: dict[int, tuple[int, datetime]]) -> None:
+    """Записать загруженность офисов и историю загруженности (без commit)
+
+    Обновление и вставка выполняются пачками (executemany) в обход unit of work ORM,
+    поэтому события ORM (синхронизация индексов локаций) не вызываются
+
+    :param occupancy: {id офиса: (количество клиентов, время события)}
+    """
+    db.execute(update(models.Office), [
+        {"id": office_id, "count_clients_now": count_clients}
+        for office_id, (count_clients, _) in occupancy.items()
+    ])
+    db.execute(insert(models.OfficeHistory), [
+        {"office_id": office_id, "dt": dt, "count_clients": count_clients}
+        for office_id, (count_clients, dt) in occupancy.items()
+    ])
 
 
 def get_atm_reviews(db: Session, atm_id: int):
     stmt = select(models.ATMReviews).filter(models.ATMReviews.atm_id == atm_id)
-    return db.execute(stmt).scalars()
+    return db.execute(stmt).scalars().all()
+
+
+async def get_atm_reviews_async(db: AsyncSession, atm_id: int):
+    stmt = select(models.ATMReviews).filter(models.ATMReviews.atm_id == atm_id)
+    return (await db.execute(stmt)).scalars().all()
 
 
 def get_office_reviews(db: Session, office_id: int):
     stmt = select(models.OfficeReviews).filter(models.OfficeReviews.office_id == office_id)
-    return db.execute(stmt).scalars()
+    return db.execute(stmt).scalars().all()
+
+
+async def get_office_reviews_async(db: AsyncSession, office_id: int):
+    stmt = select(models.OfficeReviews).filter(models.OfficeReviews.office_id == office_id)
+    return (await db.execute(stmt)).scalars().all()
@@ -0,0 +1,200 @@
+from sqlalchemy import Select, event, inspect, null, or_, select
+from sqlalchemy.orm import Session, object_session
+
+from .crud.history import get_office_load_slots
+from .models import ATM, ATMServices, Currency, Office, OfficeServices, Week
+from ..cache.locations import (
+    ATM_CLUSTER_GRID, ATM_JSON_FRAGMENTS, ATM_RANKING_ENGINE, ATM_SPATIAL_INDEX, LOCATIONS_RESULT_CACHE,
+    OFFICE_CLUSTER_GRID, OFFICE_JSON_FRAGMENTS, OFFICE_LOAD_FORECAST, OFFICE_OCCUPANCY_HUB, OFFICE_RANKING_ENGINE,
+    OFFICE_SPATIAL_INDEX
+)
+from ..models.clustering import ClusterGrid
+from ..models.fragments import JsonFragments
+from ..models.ranking import RankingEngine
+from ..models.spatial_index import SpatialIndex
+from ..settings import LOAD_FORECAST_SLOT_MINUTES
+
+_spatial_indexes: dict[type, SpatialIndex] = {
+    ATM: ATM_SPATIAL_INDEX,
+    Office: OFFICE_SPATIAL_INDEX,
+}
+_cluster_grids: dict[type, ClusterGrid] = {
+    ATM: ATM_CLUSTER_GRID,
+    Office: OFFICE_CLUSTER_GRID,
+}
+_ranking_engines: dict[type, RankingEngine] = {
+    ATM: ATM_RANKING_ENGINE,
+    Office: OFFICE_RANKING_ENGINE,
+}
+_json_fragments: dict[type, JsonFragments] = {
+    ATM: ATM_JSON_FRAGMENTS,
+    Office: OFFICE_JSON_FRAGMENTS,
+}
+# Ключ Session.info: фрагменты, удаленные при flush, которые удаляются еще раз после фиксации транзакции
+_DISCARDED_FRAGMENTS = "discarded_json_fragments"
+# Колонки, которые не входят в сериализованные фрагменты (подставляются в ответ при каждом запросе)
+_dynamic_columns = {"count_clients_now"}
+# Тип локации в тегах кеша результатов поиска
+_cache_tags: dict[type, str] = {
+    ATM: "atm",
+    Office: "office",
+}
+# Колонки локаций, которые обновляются в массивах ранжирования без их перестроения
+_ranking_columns: dict[type, tuple[str, ...]] = {
+    ATM: ("latitude", "longitude", "avg_rating"),
+    Office: ("latitude", "longitude", "avg_rating", "avg_service_time", "count_clients_now"),
+}
+# Колонки локаций, от которых зависит маска возможностей (capabilities)
+_capabilities_links: dict[type, tuple[str, ...]] = {
+    ATM: ("service_info_id", "week_info_id"),
+    Office: ("service_info_id",),
+}
+
+
+def _queue(model: type[ATM] | type[Office]):
+    """Очередь в локации (avg_service_time * count_clients_now), у банкоматов очереди нет"""
+    return model.avg_service_time * model.count_clients_now if model is Office else null()
+
+
+def build_location_indexes(db: Session) -> None:
+    """Построить пространственные индексы и сетки кластеров банкоматов и офисов по данным из БД
+    и загрузить офисы в рассылку изменений загруженности
+    """
+    for model, spatial_index in _spatial_indexes.items():
+        spatial_index.build(db.execute(select(model.id, model.latitude, model.longitude)).tuples())
+        _cluster_grids[model].build(db.execute(
+            select(model.id, model.latitude, model.longitude, model.avg_rating, _queue(model))
+        ).tuples())
+    OFFICE_OCCUPANCY_HUB.build(db.execute(
+        select(Office.id, Office.latitude, Office.longitude, Office.avg_service_time, Office.count_clients_now)
+    ).tuples())
+
+
+def sync_office_queues(db: Session, office_ids: list[int]) -> None:
+    """Обновить очереди офисов в сетке кластеров после записи загруженности в обход ORM"""
+    for office_id, latitude, longitude, avg_rating, queue in db.execute(
+        select(Office.id, Office.latitude, Office.longitude, Office.avg_rating, _queue(Office))
+        .where(Office.id.in_(office_ids))
+    ).tuples():
+        OFFICE_CLUSTER_GRID.upsert(office_id, latitude, longitude, avg_rating, queue)
+
+
+def build_load_forecast(db: Session) -> None:
+    """Построить (перестроить) прогноз загруженности офисов по истории из БД"""
+    OFFICE_LOAD_FORECAST.build(get_office_load_slots(db, LOAD_FORECAST_SLOT_MINUTES))
+
+
+def _sync_cluster_grid(target: ATM | Office) -> None:
+    queue = target.avg_service_time * target.count_clients_now if isinstance(target, Office) else None
+    _cluster_grids[type(target)].upsert(target.id, target.latitude, target.longitude, target.avg_rating, queue)
+
+
+def _sync_occupancy_hub(target: ATM | Office) -> None:
+    if isinstance(target, Office):
+        OFFICE_OCCUPANCY_HUB.upsert(target.id, target.latitude, target.longitude,
+                                    target.avg_service_time, target.count_clients_now)
+
+
+def _discard_fragment(target: object, model: type[ATM] | type[Office], location_id: int) -> None:
+    """Удалить фрагмент JSON локации сейчас и еще раз после фиксации транзакции
+
+    Запрос, прочитавший строку между flush и commit, получает старые данные: повторное удаление после commit
+    не дает сохранить их фрагмент (JsonFragments.get сравнивает поколения)
+
+    :param target: строка, изменение которой затрагивает локацию (по ней находится сессия)
+    """
+    _json_fragments[model].discard(location_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_DISCARDED_FRAGMENTS, set()).add((model, location_id))
+
+
+def _discard_committed_fragments(session: Session) -> None:
+    for model, location_id in session.info.pop(_DISCARDED_FRAGMENTS, ()):
+        _json_fragments[model].discard(location_id)
+
+
+def _insert_location(_mapper, _connection, target: ATM | Office) -> None:
+    """Синхронизация индексов при добавлении локации"""
+    _spatial_indexes[type(target)].upsert(target.id, target.latitude, target.longitude)
+    _sync_cluster_grid(target)
+    _sync_occupancy_hub(target)
+    _ranking_engines[type(target)].invalidate()
+    LOCATIONS_RESULT_CACHE.clear()
+
+
+def _update_location(_mapper, _connection, target: ATM | Office) -> None:
+    """Синхронизация индексов при изменении локации"""
+    model = type(target)
+    _spatial_indexes[model].upsert(target.id, target.latitude, target.longitude)
+    _sync_cluster_grid(target)
+    _sync_occupancy_hub(target)
+    _ranking_engines[model].update(target.id, {column: getattr(target, column) for column in _ranking_columns[model]})
+    LOCATIONS_RESULT_CACHE.invalidate((_cache_tags[model], target.id))
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in _capabilities_links[model]):
+        _ranking_engines[model].invalidate()  # маску возможностей пересчитал триггер в БД
+    if any(state.attrs[attr.key].history.has_changes()
+           for attr in state.mapper.column_attrs if attr.key not in _dynamic_columns):
+        _discard_fragment(target, model, target.id)
+
+
+def _remove_location(_mapper, _connection, target: ATM | Office) -> None:
+    """Синхронизация индексов при удалении локации"""
+    _spatial_indexes[type(target)].remove(target.id)
+    _cluster_grids[type(target)].remove(target.id)
+    if isinstance(target, Office):
+        OFFICE_OCCUPANCY_HUB.remove(target.id)
+    _ranking_engines[type(target)].invalidate()
+    _discard_fragment(target, type(target), target.id)
+    LOCATIONS_RESULT_CACHE.clear()
+
+
+def _related_locations(target: ATMServices | OfficeServices | Currency | Week) -> dict[type, Select]:
+    """Запросы id локаций, в данные которых входит строка услуг, валюты или рабочей недели"""
+    if isinstance(target, ATMServices):
+        return {ATM: select(ATM.id).where(ATM.service_info_id == target.id)}
+    if isinstance(target, OfficeServices):
+        return {Office: select(Office.id).where(Office.service_info_id == target.id)}
+    if isinstance(target, Week):
+        return {
+            ATM: select(ATM.id).where(ATM.week_info_id == target.id),
+            Office: select(Office.id).where(or_(Office.week_info_fiz_id == target.id,
+                                                Office.week_info_yur_id == target.id)),
+        }
+    services = {
+        model: select(model.id).where(or_(model.currency_input_id == target.id, model.currency_output_id == target.id))
+        for model in (ATMServices, OfficeServices)
+    }
+    return {
+        ATM: select(ATM.id).where(ATM.service_info_id.in_(services[ATMServices])),
+        Office: select(Office.id).where(Office.service_info_id.in_(services[OfficeServices])),
+    }
+
+
+def _change_related(_mapper, connection, target: ATMServices | OfficeServices | Currency | Week) -> None:
+    """Синхронизация при изменении услуг, валют или рабочих недель локаций
+
+    Маску возможностей (capabilities) связанных локаций пересчитывает триггер в БД, поэтому массивы ранжирования
+    перестраиваются, а кеш результатов поиска сбрасывается целиком (локация могла начать подходить под фильтры)
+    """
+    for model, query in _related_locations(target).items():
+        location_ids = connection.execute(query).scalars().all()
+        for location_id in location_ids:
+            _discard_fragment(target, model, location_id)
+        if location_ids:
+            _ranking_engines[model].invalidate()
+            LOCATIONS_RESULT_CACHE.clear()
+
+
+for _model in _spatial_indexes:
+    event.listen(_model, "after_insert", _insert_location)
+    event.listen(_model, "after_update", _update_location)
+    event.listen(_model, "after_delete", _remove_location)
+
+for _model in (ATMServices, OfficeServices, Currency, Week):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _change_related)
+
+for _event in ("after_commit", "after_rollback"):
+    event.listen(Session, _event, _discard_committed_fragments)
@@ -1,9 +1,13 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Integer, String, false
+from sqlalchemy import (
+    DDL, Boolean, DateTime, FetchedValue, Float, ForeignKey, Index, Integer, String, UniqueConstraint, column, event,
+    false, table, text
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
+from ..models.capabilities import ATM_CAPABILITIES, CURRENCIES, OFFICE_CAPABILITIES
 
 
 class ATM(Base):
@@ -16,8 +20,11 @@ class ATM(Base):
     :param review_count: количество отзывов
     :param service_info_id: внешний ключ на ATMService (информация о возможностях (услугах) в банкомате
     :param week_info_id: информация о времени работы банкомата по дням недели
+    :param capabilities: маска возможностей банкомата (биты ATM_CAPABILITIES), поддерживается триггерами
     """
     __tablename__ = "atm"
+    # capabilities пересчитывается триггером после INSERT - RETURNING вернул бы значение до него
+    __mapper_args__ = {"eager_defaults": False}
 
     address: Mapped[str] = mapped_column(String(250), nullable=False)
     latitude: Mapped[float] = mapped_column(Float, nullable=False)
@@ -26,6 +33,9 @@ class ATM(Base):
     review_count: Mapped[int] = mapped_column(Integer)
     service_info_id: Mapped[int] = mapped_column(ForeignKey("atm_service.id"), nullable=False)
     week_info_id: Mapped[int] = mapped_column(ForeignKey("week.id"), nullable=False)
+    capabilities: Mapped[int] = mapped_column(
+        Integer, nullable=False, server_default=text("0"), server_onupdate=FetchedValue()
+    )
 
     reviews: Mapped[list["ATMReviews"]] = relationship(back_populates="atm")
     service_info: Mapped["ATMServices"] = relationship()
@@ -84,8 +94,11 @@ class Office(Base):
     :param week_info_fiz_id: информация о времени работы отделения для физ. лиц (если None - физ. лица не обслуживаются)
     :param week_info_yur_id: информация о времени работы отделения для юр. лиц (если None - юр. лица не обслуживаются)
     :param service_info_id: информация о предоставляемых услугах в конкретном офисе
+    :param capabilities: маска возможностей офиса (биты OFFICE_CAPABILITIES), поддерживается триггерами
     """
     __tablename__ = "office"
+    # capabilities пересчитывается триггером после INSERT - RETURNING вернул бы значение до него
+    __mapper_args__ = {"eager_defaults": False}
 
     address: Mapped[str] = mapped_column(String(250), nullable=False)
     latitude: Mapped[float] = mapped_column(Float, nullable=False)
@@ -97,6 +110,9 @@ class Office(Base):
     week_info_fiz_id: Mapped[int | None] = mapped_column(ForeignKey("week.id"))
     week_info_yur_id: Mapped[int | None] = mapped_column(ForeignKey("week.id"))
     service_info_id: Mapped[int] = mapped_column(ForeignKey("office_service.id"), nullable=False)
+    capabilities: Mapped[int] = mapped_column(
+        Integer, nullable=False, server_default=text("0"), server_onupdate=FetchedValue()
+    )
 
     reviews: Mapped[list["OfficeReviews"]] = relationship(back_populates="office")
     week_info_fiz: Mapped["Week | None"] = relationship(foreign_keys=[week_info_fiz_id])
@@ -156,6 +172,7 @@ class OfficeHistory(Base):
     :param count_clients: количество клиентов, которое находится в отделении в указанное время (dt)
     """
     __tablename__ = "office_history"
+    __table_args__ = (Index("ix_office_history_office_id_dt", "office_id", "dt"),)
 
     office_id: Mapped[int] = mapped_column(ForeignKey(Office.id), nullable=False)
     dt: Mapped[datetime] = mapped_column(DateTime, nullable=False)
@@ -164,6 +181,62 @@ class OfficeHistory(Base):
     office: Mapped["Office"] = relationship(back_populates="history")
 
 
+class OfficeLoadHourly(Base):
+    """ORM модель профиля загруженности офиса по часам суток (агрегат office_history, поддерживается триггерами)
+
+    :param office_id: офис
+    :param hour: час суток (0-23)
+    :param clients_sum: сумма count_clients записей истории за этот час
+    :param samples: количество записей истории за этот час
+    """
+    __tablename__ = "office_load_hourly"
+    __table_args__ = (UniqueConstraint("office_id", "hour"),)
+
+    office_id: Mapped[int] = mapped_column(ForeignKey(Office.id), nullable=False)
+    hour: Mapped[int] = mapped_column(Integer, nullable=False)
+    clients_sum: Mapped[int] = mapped_column(Integer, nullable=False)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class OfficeLoadWeekly(Base):
+    """ORM модель профиля загруженности офиса по дням недели и часам (агрегат office_history, поддерживается триггерами)
+
+    :param office_id: офис
+    :param weekday: день недели (0 - понедельник, 6 - воскресенье)
+    :param hour: час суток (0-23)
+    :param clients_sum: сумма count_clients записей истории за этот день недели и час
+    :param samples: количество записей истории за этот день недели и час
+    """
+    __tablename__ = "office_load_weekly"
+    __table_args__ = (UniqueConstraint("office_id", "weekday", "hour"),)
+
+    office_id: Mapped[int] = mapped_column(ForeignKey(Office.id), nullable=False)
+    weekday: Mapped[int] = mapped_column(Integer, nullable=False)
+    hour: Mapped[int] = mapped_column(Integer, nullable=False)
+    clients_sum: Mapped[int] = mapped_column(Integer, nullable=False)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class OfficeLoadSlots(Base):
+    """ORM модель загруженности офиса по дням недели и минутам суток (агрегат office_history, поддерживается
+    триггерами). Слоты прогноза любой длины собираются из минут (crud.history.get_office_load_slots)
+
+    :param office_id: офис
+    :param weekday: день недели (0 - понедельник, 6 - воскресенье)
+    :param minute: минута суток (0-1439)
+    :param clients_sum: сумма count_clients записей истории за этот день недели и минуту
+    :param samples: количество записей истории за этот день недели и минуту
+    """
+    __tablename__ = "office_load_slots"
+    __table_args__ = (UniqueConstraint("office_id", "weekday", "minute"),)
+
+    office_id: Mapped[int] = mapped_column(ForeignKey(Office.id), nullable=False)
+    weekday: Mapped[int] = mapped_column(Integer, nullable=False)
+    minute: Mapped[int] = mapped_column(Integer, nullable=False)
+    clients_sum: Mapped[int] = mapped_column(Integer, nullable=False)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
 class Week(Base):
     """ORM модель для информации о рабочей неделе
 
@@ -280,3 +353,173 @@ class OfficeQueue(Base):
 
     office: Mapped[Office] = relationship()
     user: Mapped["Users"] = relationship(back_populates="queue_list")
+
+
+def _rtree_table(name: str):
+    """Виртуальная таблица SQLite R*Tree с bounding box координат локаций (id совпадает с id локации)"""
+    return table(name, column("id"), column("min_latitude"), column("max_latitude"),
+                 column("min_longitude"), column("max_longitude"))
+
+
+atm_rtree = _rtree_table("atm_rtree")
+office_rtree = _rtree_table("office_rtree")
+
+
+def _mirror_into_rtree(location_table: str, rtree_table: str) -> None:
+    """Создание R*Tree зеркала для таблицы локаций (поддерживается триггерами на любую запись в таблицу)
+
+    :param location_table: таблица с локациями (atm, office)
+    :param rtree_table: имя виртуальной R*Tree таблицы
+    """
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {rtree_table} "
+        f"USING rtree(id, min_latitude, max_latitude, min_longitude, max_longitude)",
+        f"INSERT INTO {rtree_table} SELECT id, latitude, latitude, longitude, longitude FROM {location_table}",
+        f"CREATE TRIGGER IF NOT EXISTS {rtree_table}_insert AFTER INSERT ON {location_table} BEGIN "
+        f"INSERT INTO {rtree_table} VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude); "
+        f"END",
+        f"CREATE TRIGGER IF NOT EXISTS {rtree_table}_update AFTER UPDATE OF latitude, longitude "
+        f"ON {location_table} BEGIN "
+        f"UPDATE {rtree_table} SET min_latitude = NEW.latitude, max_latitude = NEW.latitude, "
+        f"min_longitude = NEW.longitude, max_longitude = NEW.longitude WHERE id = NEW.id; "
+        f"END",
+        f"CREATE TRIGGER IF NOT EXISTS {rtree_table}_delete AFTER DELETE ON {location_table} BEGIN "
+        f"DELETE FROM {rtree_table} WHERE id = OLD.id; "
+        f"END",
+    ]
+    location_orm_table = Base.metadata.tables[location_table]
+    for statement in statements:
+        event.listen(location_orm_table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    event.listen(
+        location_orm_table, "before_drop", DDL(f"DROP TABLE IF EXISTS {rtree_table}").execute_if(dialect="sqlite")
+    )
+
+
+_mirror_into_rtree(ATM.__tablename__, atm_rtree.name)
+_mirror_into_rtree(Office.__tablename__, office_rtree.name)
+
+
+def _rollup_office_history(rollup_table: str, keys: dict[str, str]) -> None:
+    """Триггеры, поддерживающие агрегат office_history при любой записи в историю
+
+    :param rollup_table: таблица агрегата (office_id, <ключи>, clients_sum, samples)
+    :param keys: колонки ключа агрегата и выражения для их вычисления из строки истории ({row} - NEW/OLD)
+    """
+    def values(row: str) -> str:
+        return ", ".join(expression.format(row=row) for expression in keys.values())
+
+    def matches(row: str) -> str:
+        return " AND ".join(
+            [f"office_id = {row}.office_id"]
+            + [f"{key} = {expression.format(row=row)}" for key, expression in keys.items()]
+        )
+
+    columns = ", ".join(keys)
+    add = (
+        f"INSERT INTO {rollup_table} (office_id, {columns}, clients_sum, samples) "
+        f"VALUES (NEW.office_id, {values('NEW')}, NEW.count_clients, 1) "
+        f"ON CONFLICT (office_id, {columns}) DO UPDATE "
+        f"SET clients_sum = clients_sum + excluded.clients_sum, samples = samples + excluded.samples; "
+    )
+    subtract = (
+        f"UPDATE {rollup_table} SET clients_sum = clients_sum - OLD.count_clients, samples = samples - 1 "
+        f"WHERE {matches('OLD')}; "
+    )
+    history_table = OfficeHistory.__tablename__
+    statements = [
+        f"CREATE TRIGGER IF NOT EXISTS {rollup_table}_insert AFTER INSERT ON {history_table} BEGIN {add}END",
+        f"CREATE TRIGGER IF NOT EXISTS {rollup_table}_update AFTER UPDATE OF office_id, dt, count_clients "
+        f"ON {history_table} BEGIN {subtract}{add}END",
+        f"CREATE TRIGGER IF NOT EXISTS {rollup_table}_delete AFTER DELETE ON {history_table} BEGIN {subtract}END",
+    ]
+    for statement in statements:  # после создания всех таблиц: триггер ссылается и на историю, и на агрегат
+        ddl = DDL(statement.replace("%", "%%"))  # DDL подставляет параметры через %
+        event.listen(Base.metadata, "after_create", ddl.execute_if(dialect="sqlite"))
+
+
+_history_hour = "CAST(strftime('%H', {row}.dt) AS INTEGER)"
+_history_weekday = "(CAST(strftime('%w', {row}.dt) AS INTEGER) + 6) % 7"  # в SQLite 0 - воскресенье
+_history_minute = "CAST(strftime('%H', {row}.dt) AS INTEGER) * 60 + CAST(strftime('%M', {row}.dt) AS INTEGER)"
+
+_rollup_office_history(OfficeLoadHourly.__tablename__, {"hour": _history_hour})
+_rollup_office_history(OfficeLoadWeekly.__tablename__, {"weekday": _history_weekday, "hour": _history_hour})
+_rollup_office_history(OfficeLoadSlots.__tablename__, {"weekday": _history_weekday, "minute": _history_minute})
+
+
+def _maintain_capabilities(location_table: str,
+                           services_table: str,
+                           capabilities: tuple[str, ...],
+                           expressions: dict[str, str],
+                           week_column: str | None = None) -> None:
+    """Триггеры, поддерживающие маску возможностей локации (колонка capabilities) при любой записи в локации,
+    их услуги, валюты и рабочие недели
+
+    Фильтры поиска по услугам и валютам проверяют одну колонку, без JOIN к услугам, валютам и неделям
+
+    :param location_table: таблица локаций (atm, office)
+    :param services_table: таблица услуг локаций (atm_service, office_service)
+    :param capabilities: возможности в порядке битов маски
+    :param expressions: SQL выражения возможностей (s - услуги, w - рабочая неделя,
+        c_in / c_out - валюты приема / выдачи)
+    :param week_column: колонка локации со ссылкой на рабочую неделю, если она нужна для маски
+    """
+    bits = " | ".join(f"(CASE WHEN {expressions[capability]} THEN {1 << bit} ELSE 0 END)"
+                      for bit, capability in enumerate(capabilities))
+    week_join = f"JOIN week AS w ON w.id = {location_table}.{week_column} " if week_column else ""
+    mask = (
+        f"SELECT {bits} FROM {services_table} AS s "
+        f"JOIN currency AS c_in ON c_in.id = s.currency_input_id "
+        f"JOIN currency AS c_out ON c_out.id = s.currency_output_id "
+        f"{week_join}WHERE s.id = {location_table}.service_info_id"
+    )
+
+    def refresh(condition: str) -> str:
+        return f"UPDATE {location_table} SET capabilities = COALESCE(({mask}), 0) WHERE {condition}; "
+
+    link_columns = ", ".join(["service_info_id"] + ([week_column] if week_column else []))
+    name = f"{location_table}_capabilities"
+    currency_services = (
+        f"service_info_id IN (SELECT id FROM {services_table} "
+        f"WHERE currency_input_id = NEW.id OR currency_output_id = NEW.id)"
+    )
+    statements = [
+        f"CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {location_table} BEGIN "
+        f"{refresh('id = NEW.id')}END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE OF {link_columns} ON {location_table} BEGIN "
+        f"{refresh('id = NEW.id')}END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_services AFTER UPDATE ON {services_table} BEGIN "
+        f"{refresh('service_info_id = NEW.id')}END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_currency AFTER UPDATE ON currency BEGIN "
+        f"{refresh(currency_services)}END",
+    ]
+    if week_column:
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS {name}_week AFTER UPDATE ON week BEGIN "
+            f"{refresh(f'{week_column} = NEW.id')}END"
+        )
+    for statement in statements:  # после создания всех таблиц: триггеры ссылаются на локации, услуги и валюты
+        event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+
+_currency_capabilities = {
+    **{f"withdraw_{currency}": f"c_out.{currency}" for currency in CURRENCIES},
+    **{f"deposit_{currency}": f"c_in.{currency}" for currency in CURRENCIES},
+}
+
+_maintain_capabilities(ATM.__tablename__, ATMServices.__tablename__, ATM_CAPABILITIES, {
+    "all_day": "w.all_time",
+    "wheelchair": "s.wheelchair",
+    "blind": "s.blind",
+    "nfc_support": "s.nfc",
+    "qr_support": "s.qr_code",
+    **_currency_capabilities,
+}, week_column="week_info_id")
+_maintain_capabilities(Office.__tablename__, OfficeServices.__tablename__, OFFICE_CAPABILITIES, {
+    "with_ramp": "s.with_ramp",
+    "prime": "s.prime",
+    "vip": "s.vip",
+    "rko": "s.rko",
+    "suo": "s.suo",
+    "kep": "s.kep",
+    **_currency_capabilities,
+})
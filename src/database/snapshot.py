@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+import hashlib
+import os
+import re
+from typing import Callable, Iterable, Iterator
+from uuid import uuid4
+
+try:
+    import fcntl
+except ImportError:  # блокировки файлов есть только на Unix, без них БД должен заполнять один процесс
+    fcntl = None
+
+from sqlalchemy import Engine, create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from .base import Base, configure_connections
+
+# Версия логики заполнения БД: увеличить, если меняется заполнение при тех же входных файлах и схеме
+SNAPSHOT_VERSION = 3
+
+_FINGERPRINT_TABLE = "snapshot_info"
+# Суффикс имени файла снапшота после имени БД: <БД>.<uuid>
+_SNAPSHOT_SUFFIX = re.compile(r"[0-9a-f]{32}")
+
+# Хеш снапшота, к которому подключился процесс после старта (None - старт еще не завершен)
+_attached_fingerprint: str | None = None
+
+
+def fingerprint(engine: Engine, *paths: str) -> str:
+    """Хеш входных файлов, DDL схемы БД и версии заполнения
+
+    :param engine: engine БД (для компиляции DDL под ее диалект)
+    :param paths: пути к входным файлам
+    """
+    digest = hashlib.sha256(f"version:{SNAPSHOT_VERSION}\n".encode())
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(hashlib.file_digest(file, "sha256").digest())
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=engine.dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            digest.update(str(CreateIndex(index).compile(dialect=engine.dialect)).encode())
+    return digest.hexdigest()
+
+
+def get_fingerprint(engine: Engine) -> str | None:
+    """Хеш, с которым был построен текущий файл БД (None - БД нет или она построена не снапшотом)"""
+    if not os.path.exists(engine.url.database):
+        return None
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text(f"SELECT fingerprint FROM {_FINGERPRINT_TABLE}")).scalar()
+    except OperationalError:
+        return None
+
+
+@contextmanager
+def build_lock(engine: Engine) -> Iterator[None]:
+    """Межпроцессная блокировка проверки и построения снапшота (файл <БД>.lock)
+
+    Воркеры, стартующие одновременно, проходят блокировку по одному: первый строит снапшот,
+    остальные дожидаются его и находят готовый файл БД с тем же хешем
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{engine.url.database}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def attach(snapshot_fingerprint: str) -> None:
+    """Отметить, что процесс завершил старт на снапшоте с этим хешем"""
+    global _attached_fingerprint
+    _attached_fingerprint = snapshot_fingerprint
+
+
+def is_ready(engine: Engine) -> bool:
+    """Процесс завершил старт, и файл БД - тот снапшот, на котором он стартовал (не заменен другим процессом)"""
+    return _attached_fingerprint is not None and get_fingerprint(engine) == _attached_fingerprint
+
+
+def build_snapshot(engine: Engine,
+                   snapshot_fingerprint: str,
+                   fill: Callable[[Engine], None],
+                   attached: Iterable[Engine] = ()) -> None:
+    """Построить БД в новом файле снапшота и атомарно переключить на него путь БД engine
+
+    Путь БД - символическая ссылка на файл снапшота (<БД>.<uuid>), SQLite открывает файл по ссылке,
+    и журнал WAL (-wal/-shm) у каждого снапшота свой: процессы, еще работающие на старом снапшоте,
+    пишут в его журнал и не портят новый файл. Их соединения переоткрываются при следующей выдаче из пула
+    (см. base.configure_connections). Пока снапшот строится, текущий файл БД остается нетронутым
+
+    :param engine: engine основной БД (SQLite файл)
+    :param snapshot_fingerprint: хеш входных данных снапшота
+    :param fill: заполнение БД (таблицы уже созданы)
+    :param attached: другие engine того же файла (их соединения закрываются перед заменой)
+    """
+    path = engine.url.database
+    snapshot_path = f"{path}.{uuid4().hex}"
+
+    snapshot_engine = create_engine(engine.url.set(database=snapshot_path))
+    configure_connections(snapshot_engine, read_only=False)  # файл сразу создается в режиме журнала из настроек
+    try:
+        Base.metadata.create_all(snapshot_engine)
+        fill(snapshot_engine)
+        with snapshot_engine.begin() as connection:
+            connection.execute(text(f"CREATE TABLE {_FINGERPRINT_TABLE} (fingerprint TEXT NOT NULL)"))
+            connection.execute(text(f"INSERT INTO {_FINGERPRINT_TABLE} VALUES (:fingerprint)"),
+                               {"fingerprint": snapshot_fingerprint})
+    except BaseException:
+        snapshot_engine.dispose()
+        _remove_snapshot(snapshot_path)
+        raise
+    snapshot_engine.dispose()
+
+    previous_path = os.path.realpath(path)
+    link_path = f"{path}.{os.getpid()}.link"
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    os.symlink(os.path.basename(snapshot_path), link_path)
+    os.replace(link_path, path)
+
+    for pool_engine in (engine, *attached):
+        pool_engine.dispose()  # соединения пула держат старый файл
+    _remove_old_snapshots(path, keep=(snapshot_path, previous_path))
+
+
+def _remove_old_snapshots(path: str, keep: Iterable[str]) -> None:
+    """Удалить файлы снапшотов БД, кроме keep
+
+    Предыдущий снапшот остается: его еще могут читать процессы, открывшие его до замены
+    (удаление журнала под открытым соединением - ошибка ввода-вывода у читателя)
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    keep = {os.path.realpath(keep_path) for keep_path in keep}
+    snapshot_names = {file_name.removesuffix("-wal").removesuffix("-shm") for file_name in os.listdir(directory)}
+    for snapshot_name in snapshot_names:
+        snapshot_path = os.path.join(directory, snapshot_name)
+        if snapshot_name.startswith(f"{name}.") and _SNAPSHOT_SUFFIX.fullmatch(snapshot_name[len(name) + 1:]) \
+                and os.path.realpath(snapshot_path) not in keep:
+            _remove_snapshot(snapshot_path)
+
+
+def _remove_snapshot(snapshot_path: str) -> None:
+    """Удалить файл снапшота вместе с журналом WAL (-wal/-shm)"""
+    for file_path in (snapshot_path, f"{snapshot_path}-wal", f"{snapshot_path}-shm"):
+        if os.path.exists(file_path):
+            os.remove(file_path)
@@ -1,5 +1,8 @@
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ...database.base import SessionLocal
+from ...database.base import AsyncSessionLocal, ReadSessionLocal, SessionLocal
 
 
 def get_db() -> Session:
@@ -9,3 +12,18 @@ def get_db() -> Session:
         yield db
     finally:
         db.close()
+
+
+def get_read_db() -> Session:
+    """Открыть соединение с бд только для чтения (не ждет соединения-писателя)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Открыть асинхронное соединение с бд"""
+    async with AsyncSessionLocal() as db:
+        yield db
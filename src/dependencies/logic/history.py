@@ -1,9 +1,20 @@
 from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ...logic.history import HistoryLogic
-from ..database.connection import get_db
+from ...logic.history import AsyncHistoryLogic, HistoryLogic
+from ...settings import ASYNC_READS_ENABLED
+from ..database.connection import get_async_db, get_read_db
 
 
-def get_history_logic(db: Session = Depends(get_db)) -> HistoryLogic:
-    """Инициализация логики для работы с отделениями и банкоматами"""
+async def get_history_logic(db: Session = Depends(get_read_db)) -> HistoryLogic:
+    """Инициализация логики для работы с историей отделений (синхронные соединения только для чтения)"""
     return HistoryLogic(db)
+
+
+async def get_history_logic_async(db: AsyncSession = Depends(get_async_db)) -> AsyncHistoryLogic:
+    """Инициализация асинхронной логики для работы с историей отделений"""
+    return AsyncHistoryLogic(db)
+
+
+# Логика чтения истории для обработчиков: асинхронная (aiosqlite) или синхронная в threadpool (по умолчанию)
+get_history_read_logic = get_history_logic_async if ASYNC_READS_ENABLED else get_history_logic
@@ -1,9 +1,25 @@
 from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ...logic.locations import LocationsLogic
-from ..database.connection import get_db
+from ...logic.locations import AsyncLocationsLogic, LocationsLogic, ReadLocationsLogic
+from ...settings import ASYNC_READS_ENABLED
+from ..database.connection import get_async_db, get_db, get_read_db
 
 
 def get_locations_logic(db: Session = Depends(get_db)) -> LocationsLogic:
     """Инициализация логики для работы с отделениями и банкоматами"""
     return LocationsLogic(db)
+
+
+async def get_read_locations_logic(db: Session = Depends(get_read_db)) -> ReadLocationsLogic:
+    """Инициализация логики поиска отделений и банкоматов (синхронные соединения только для чтения)"""
+    return ReadLocationsLogic(db)
+
+
+async def get_locations_logic_async(db: AsyncSession = Depends(get_async_db)) -> AsyncLocationsLogic:
+    """Инициализация асинхронной логики для работы с отделениями и банкоматами"""
+    return AsyncLocationsLogic(db)
+
+
+# Логика поиска для обработчиков: асинхронная (aiosqlite) или синхронная в threadpool (по умолчанию)
+get_locations_read_logic = get_locations_logic_async if ASYNC_READS_ENABLED else get_read_locations_logic
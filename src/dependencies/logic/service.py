@@ -0,0 +1,6 @@
+from ...logic.service import ServiceLogic
+
+
+def get_service_logic() -> ServiceLogic:
+    """Инициализация логики служебных методов"""
+    return ServiceLogic()
@@ -1,13 +1,41 @@
+from typing import Literal
+
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..database.crud.history import (
+    get_office_history, get_office_history_async, get_office_load_profile, get_office_load_profile_async
+)
 
-from ..database.crud.history import get_office_history
+HistoryGranularity = Literal["raw", "hour", "weekday_hour"]
 
 
 class HistoryLogic:
-    """Логика работы с историей отделений и/или банкоматов"""
+    """Логика работы с историей отделений и/или банкоматов на соединениях только для чтения
+
+    Запрос к БД выполняется одним вызовом в threadpool, как у синхронного обработчика (ASYNC_READS_ENABLED выключен)
+    """
 
     def __init__(self, db: Session):
         self._db = db
 
-    def find_office_history(self, office_id: int):
-        return get_office_history(self._db, office_id)
+    async def find_office_history(self, office_id: int, granularity: HistoryGranularity = "raw"):
+        return await run_in_threadpool(self._find_office_history, office_id, granularity)
+
+    def _find_office_history(self, office_id: int, granularity: HistoryGranularity):
+        if granularity == "raw":
+            return get_office_history(self._db, office_id)
+        return get_office_load_profile(self._db, office_id, granularity)
+
+
+class AsyncHistoryLogic:
+    """Асинхронная логика работы с историей отделений и/или банкоматов"""
+
+    def __init__(self, db: AsyncSession):
+        self._db = db
+
+    async def find_office_history(self, office_id: int, granularity: HistoryGranularity = "raw"):
+        if granularity == "raw":
+            return await get_office_history_async(self._db, office_id)
+        return await get_office_load_profile_async(self._db, office_id, granularity)
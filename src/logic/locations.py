@@ -1,26 +1,421 @@
-from typing import Literal
+import asyncio
+from datetime import datetime
+from functools import partial
+from itertools import islice
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable, Literal, NamedTuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from ..cache.locations import (
+    ATM_CLUSTER_GRID, ATM_JSON_FRAGMENTS, ATM_RANKING_ENGINE, ATM_SPATIAL_INDEX, LOCATIONS_RESULT_CACHE,
+    OFFICE_BATCH_POOL, OFFICE_BATCH_SLOTS, OFFICE_CLUSTER_GRID, OFFICE_JSON_FRAGMENTS, OFFICE_LOAD_FORECAST,
+    OFFICE_OCCUPANCY_BUFFER, OFFICE_OCCUPANCY_HUB, OFFICE_RANKING_ENGINE, OFFICE_SPATIAL_INDEX, TRAVEL_TIMES
+)
+from ..database import models
 from ..database.crud import locations as locations_crud
+from ..database.events import sync_office_queues
+from ..models.batch_origins import BatchRankingError, read_origins
+from ..models.batch_ranking import Origin, OriginRanker, rank_in_worker
+from ..models.clustering import Cluster
+from ..models.cursor import KeysetCursor
+from ..models.occupancy_buffer import OccupancyError
+from ..models.occupancy_hub import Subscription
+from ..models.ranking import RankingEngine
+from ..models.spatial_index import SpatialIndex, haversine
+from ..schemas.locations import ATMModel, OfficeModel
+from ..settings import (
+    BATCH_RANKING_CHUNK_SIZE, BATCH_RANKING_MAX_LINE_BYTES, BATCH_RANKING_MAX_ORIGINS, BATCH_RANKING_WORKERS,
+    CLUSTERING_MAX_ZOOM, LOAD_FORECAST_ENABLED, LOCATIONS_CACHE_ENABLED, LOCATIONS_CACHE_QUANTUM,
+    OCCUPANCY_HEARTBEAT_INTERVAL, OCCUPANCY_PUSH_INTERVAL, RANKING_ENGINE_ENABLED, SPATIAL_INDEX_ENABLED
+)
 
+# Параметры поиска, которые задают положение на карте и страницу выдачи, а не фильтруют локации
+_POSITION_KEYS = ("latitude", "longitude", "initial_latitude", "initial_longitude", "zoom", "limit", "cursor")
+# Параметры поиска, которые меняют только сортировку локаций (входят в ключ кеша, но не фильтруют локации)
+_RANKING_KEYS = ("travel_mode",)
+# Фрагменты JSON по типу локации в ключе кеша результатов поиска
+_JSON_FRAGMENTS = {"atm": ATM_JSON_FRAGMENTS, "office": OFFICE_JSON_FRAGMENTS}
 
-class LocationsLogic:
-    """Логика работы с отделениями и банкоматами"""
+
+class ATMRow(NamedTuple):
+    """Банкомат с вычисленным расстоянием (аналог строки результата get_atms_filtered)"""
+    ATM: models.ATM
+    distance: float
+
+
+class OfficeRow(NamedTuple):
+    """Офис с вычисленными расстоянием и временем ожидания (аналог строки результата get_offices_filtered)"""
+    Office: models.Office
+    distance: float
+    time_wait: int
+
+
+class _BaseLocationsLogic:
+    """Общая часть синхронной и асинхронной логики поиска локаций (без обращений к БД)"""
+    # Поколение фрагментов JSON на момент загрузки найденных локаций (см. JsonFragments.get), задает _cached
+    _generation: int | None = None
+
+    def atms_to_json(self, atms: list[ATMRow]) -> bytes:
+        """Результат find_atms, сериализованный в JSON по схеме FindAtmsResponse
+
+        Статические данные банкоматов берутся из заранее сериализованных фрагментов,
+        при каждом запросе дописывается только distance
+        """
+        return b"[" + b",".join(
+            b'{"distance":%b,%b}' % (
+                json.dumps(row.distance).encode(),
+                ATM_JSON_FRAGMENTS.get(row.ATM.id, lambda atm=row.ATM: self._render_atm(atm), self._generation)
+            )
+            for row in atms
+        ) + b"]"
+
+    def offices_to_json(self, offices: list[OfficeRow]) -> bytes:
+        """Результат find_offices, сериализованный в JSON по схеме FindOfficesResponse
+
+        Статические данные отделений берутся из заранее сериализованных фрагментов,
+        при каждом запросе дописываются только distance, countClientsNow и timeWait
+        """
+        return b"[" + b",".join(
+            b'{"distance":%b,"countClientsNow":%d,"timeWait":%d,%b}' % (
+                json.dumps(row.distance).encode(),
+                self._count_clients_now(row.Office),
+                row.time_wait,
+                OFFICE_JSON_FRAGMENTS.get(row.Office.id, lambda office=row.Office: self._render_office(office),
+                                          self._generation)
+            )
+            for row in offices
+        ) + b"]"
+
+    @staticmethod
+    def post_office_occupancy(events: list[dict[str, Any]]) -> int:
+        """Принять события загруженности офисов от терминалов электронной очереди
+
+        События попадают в буфер и записываются в БД периодически (flush_office_occupancy),
+        поиск учитывает их сразу. Ошибка 404 - неизвестный офис (не принято ни одно событие),
+        503 - буфер переполнен (события до переполнения приняты, повторная отправка безопасна)
+
+        :param events: события: office_id, count_clients, dt (None - время получения)
+        :return: количество принятых событий
+        """
+        unknown = sorted({event["office_id"] for event in events if event["office_id"] not in OFFICE_SPATIAL_INDEX})
+        if unknown:
+            raise OccupancyError(f'Неизвестные отделения: {", ".join(map(str, unknown))}', status_code=404)
+        now = datetime.now()
+        for event in events:
+            office_id, dt = event["office_id"], event["dt"]
+            dt = now if dt is None else dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+            if not OFFICE_OCCUPANCY_BUFFER.put(office_id, event["count_clients"], dt):
+                raise OccupancyError('Слишком много необработанных событий, повторите позже', status_code=503)
+            count_clients_now = OFFICE_OCCUPANCY_BUFFER.current(office_id, event["count_clients"])
+            OFFICE_RANKING_ENGINE.update(office_id, {"count_clients_now": count_clients_now})
+            OFFICE_OCCUPANCY_HUB.publish(office_id, count_clients_now)
+            LOCATIONS_RESULT_CACHE.invalidate(("office", office_id))
+        return len(events)
+
+    @staticmethod
+    def subscribe_office_occupancy(position: dict[str, Any]) -> Subscription:
+        """Подписаться на изменения загруженности офисов в области карты (радиус - как у поиска отделений)
+
+        :param position: latitude, longitude и zoom области карты
+        """
+        radius = locations_crud._zoom_mapper(position["zoom"])
+        subscription = OFFICE_OCCUPANCY_HUB.subscribe(position["latitude"], position["longitude"], radius)
+        if subscription is None:
+            raise OccupancyError('Слишком много подписок, повторите позже', status_code=503)
+        return subscription
+
+    @staticmethod
+    def unsubscribe_office_occupancy(subscription: Subscription) -> None:
+        OFFICE_OCCUPANCY_HUB.unsubscribe(subscription)
+
+    async def office_occupancy_events(self,
+                                      subscription: Subscription,
+                                      position: dict[str, Any]) -> AsyncIterator[bytes]:
+        """Server-Sent Events с загруженностью офисов в области подписки
+
+        Первое событие snapshot - все офисы области, далее delta - только изменившиеся офисы,
+        не чаще раза в OCCUPANCY_PUSH_INTERVAL секунд (изменения за это время объединяются).
+        Без изменений раз в OCCUPANCY_HEARTBEAT_INTERVAL секунд отправляется комментарий,
+        чтобы соединение не закрывалось по таймауту
+
+        :param position: initial_latitude, initial_longitude - базовые координаты для timeWait
+        """
+        snapshot = OFFICE_OCCUPANCY_HUB.snapshot(subscription)
+        yield self._occupancy_event(
+            b"snapshot", ((office_id, state.count_clients_now) for office_id, state in snapshot.items()), position
+        )
+        while True:
+            changes = await subscription.changes(OCCUPANCY_HEARTBEAT_INTERVAL)
+            if not changes:
+                yield b": heartbeat\n\n"
+                continue
+            yield self._occupancy_event(b"delta", changes.items(), position)
+            await asyncio.sleep(OCCUPANCY_PUSH_INTERVAL)
+
+    def _occupancy_event(self, name: bytes, offices: Iterable[tuple[int, int]], position: dict[str, Any]) -> bytes:
+        """Событие SSE: JSON массив id, countClientsNow и timeWait офисов (timeWait - как в find_offices)"""
+        week_minute = self._forecast_week_minute()
+        items = []
+        for office_id, count_clients_now in offices:
+            state = OFFICE_OCCUPANCY_HUB.office(office_id)
+            if state is None:
+                continue
+            distance = haversine(position["initial_latitude"], position["initial_longitude"],
+                                 state.latitude, state.longitude)
+            clients = count_clients_now if week_minute is None else \
+                OFFICE_LOAD_FORECAST.expected_clients(office_id, count_clients_now, distance, week_minute)
+            items.append(b'{"id":%d,"countClientsNow":%d,"timeWait":%d}' % (
+                office_id, count_clients_now, int(distance + state.avg_service_time * clients)
+            ))
+        return b"event: %b\ndata: [%b]\n\n" % (name, b",".join(items))
+
+    @staticmethod
+    def _count_clients_now(office: models.Office) -> int:
+        """Количество клиентов в офисе с учетом еще не записанных в БД событий"""
+        return OFFICE_OCCUPANCY_BUFFER.current(office.id, office.count_clients_now)
+
+    @staticmethod
+    def _render_atm(atm: models.ATM) -> bytes:
+        """JSON фрагмент статических данных банкомата (без distance)"""
+        return ATMModel.model_validate(ATMRow(atm, 0.0), from_attributes=True).model_dump_json(
+            by_alias=True, exclude={"distance"}
+        ).encode()[1:-1]
+
+    @staticmethod
+    def _render_office(office: models.Office) -> bytes:
+        """JSON фрагмент статических данных отделения (без distance, countClientsNow, timeWait)"""
+        return OfficeModel.model_validate(OfficeRow(office, 0.0, 0), from_attributes=True).model_dump_json(
+            by_alias=True, exclude={"distance", "count_clients_now", "time_wait"}
+        ).encode()[1:-1]
+
+    @staticmethod
+    def next_cursor(rows: list, filter_data: locations_crud.BaseFilter) -> str | None:
+        """Курсор следующей страницы (None - если страница неполная, т.е. последняя)
+
+        :param rows: результат find_atms / find_offices
+        :param filter_data: фильтры поиска (limit)
+        """
+        if not filter_data.get("limit") or len(rows) < filter_data["limit"]:
+            return None
+        last = rows[-1]
+        if hasattr(last, "time_wait"):
+            return KeysetCursor(last.time_wait, last.Office.id).encode()
+        return KeysetCursor(last.distance, last.ATM.id).encode()
+
+    def _cached(self, location_type: str, filter_data: locations_crud.BaseFilter) -> tuple[tuple, list | None]:
+        """Ключ кеша результатов поиска и результат из кеша (None - нет в кеше или кеш выключен)
+
+        Запоминает поколение фрагментов JSON до загрузки локаций из БД (для результата из кеша - на момент
+        его загрузки), чтобы строки, прочитанные до изменения локации, не сохранили устаревший фрагмент
+        """
+        cache_key = self._cache_key(location_type, filter_data)
+        self._generation = _JSON_FRAGMENTS[location_type].generation()
+        entry = LOCATIONS_RESULT_CACHE.get(cache_key) if LOCATIONS_CACHE_ENABLED else None
+        if entry is None:
+            return cache_key, None
+        self._generation, rows = entry
+        return cache_key, rows
+
+    def _store(self, cache_key: tuple, location_type: str, rows: list) -> None:
+        """Сохранить результат поиска в кеш вместе с поколением фрагментов (теги - найденные локации)"""
+        if LOCATIONS_CACHE_ENABLED:
+            LOCATIONS_RESULT_CACHE.set(cache_key, (self._generation, rows),
+                                       tags=((location_type, row[0].id) for row in rows))
+
+    @staticmethod
+    def _cache_key(location_type: str, filter_data: locations_crud.BaseFilter) -> tuple:
+        """Ключ кеша результатов поиска: округленные координаты, интервал zoom и заданные фильтры"""
+        filters = tuple(sorted(
+            (key, tuple(value) if isinstance(value, list) else value)
+            for key, value in filter_data.items() if value and key not in _POSITION_KEYS
+        ))
+        return (
+            location_type,
+            *(round(filter_data[key] / LOCATIONS_CACHE_QUANTUM)
+              for key in ("latitude", "longitude", "initial_latitude", "initial_longitude")),
+            int(filter_data["zoom"] * 2),
+            filter_data.get("limit"),
+            filter_data.get("cursor"),
+            filters,
+        )
+
+    @staticmethod
+    def _decode_cursor(filter_data: locations_crud.BaseFilter) -> KeysetCursor | None:
+        return KeysetCursor.decode(filter_data["cursor"]) if filter_data.get("cursor") else None
+
+    def _atm_clusters(self, atms: list[ATMRow] | None, filter_data: locations_crud.FindATMFilter) -> list[dict]:
+        """Кластеры банкоматов: всех (atms is None) или найденных с учетом фильтров"""
+        if atms is None:
+            clusters = ATM_CLUSTER_GRID.clusters(filter_data["zoom"])
+        else:
+            clusters = ATM_CLUSTER_GRID.aggregate(
+                ((row.ATM.latitude, row.ATM.longitude, row.ATM.avg_rating, None) for row in atms),
+                filter_data["zoom"]
+            )
+        return [self._cluster_info(cluster, filter_data) for cluster in clusters]
+
+    def _office_clusters(self,
+                         offices: list[OfficeRow] | None,
+                         filter_data: locations_crud.FindOfficesFilter) -> list[dict]:
+        """Кластеры отделений: всех (offices is None) или найденных с учетом фильтров"""
+        if offices is None:
+            clusters = OFFICE_CLUSTER_GRID.clusters(filter_data["zoom"])
+        else:
+            clusters = OFFICE_CLUSTER_GRID.aggregate(
+                ((row.Office.latitude, row.Office.longitude, row.Office.avg_rating,
+                  row.Office.avg_service_time * self._count_clients_now(row.Office))
+                 for row in offices),
+                filter_data["zoom"]
+            )
+        return [self._cluster_info(cluster, filter_data) for cluster in clusters]
+
+    @staticmethod
+    def _has_filters(filter_data: locations_crud.BaseFilter) -> bool:
+        """Заданы ли фильтры по локациям (кроме положения на карте)"""
+        return any(value for key, value in filter_data.items() if key not in _POSITION_KEYS + _RANKING_KEYS)
+
+    @staticmethod
+    def _cluster_info(cluster: Cluster, filter_data: locations_crud.BaseFilter) -> dict[str, Any]:
+        """Информация о кластере для ответа
+
+        Минимальное время ожидания считается как расстояние от базовых координат до центра кластера
+        плюс минимальная очередь среди его отделений
+        """
+        min_time_wait = None
+        if cluster["min_queue"] is not None:
+            distance = haversine(filter_data["initial_latitude"], filter_data["initial_longitude"],
+                                 cluster["latitude"], cluster["longitude"])
+            min_time_wait = int(distance + cluster["min_queue"])
+        return {
+            "latitude": cluster["latitude"],
+            "longitude": cluster["longitude"],
+            "count": cluster["count"],
+            "best_rating": cluster["best_rating"],
+            "min_time_wait": min_time_wait,
+        }
+
+    @staticmethod
+    def _forecast_week_minute() -> int | None:
+        """Текущее время для прогноза загруженности офисов (None - прогноз выключен или еще не построен)"""
+        if not LOAD_FORECAST_ENABLED or not OFFICE_LOAD_FORECAST.is_built:
+            return None
+        return OFFICE_LOAD_FORECAST.week_minute()
+
+    @staticmethod
+    def _expected_clients(week_minute: int | None) -> Callable | None:
+        """Прогноз количества клиентов для движка ранжирования (None - по текущей загруженности)"""
+        if week_minute is None:
+            return None
+        return partial(OFFICE_LOAD_FORECAST.expected_clients_many, week_minute=week_minute)
+
+    @staticmethod
+    def _travel_minutes(filter_data: locations_crud.FindOfficesFilter) -> Callable | None:
+        """Время в пути по дорогам от начальной точки до всех кандидатов одним проходом по графу
+        для движка ранжирования (None - по расстоянию по прямой)
+        """
+        if not filter_data.get("travel_mode"):
+            return None
+        return partial(TRAVEL_TIMES.minutes_many, filter_data["initial_latitude"],
+                       filter_data["initial_longitude"], mode=filter_data["travel_mode"])
+
+    @staticmethod
+    def _ranking_engine_enabled(engine: RankingEngine) -> bool:
+        """Нужно ли ранжировать через NumPy"""
+        return RANKING_ENGINE_ENABLED and engine.is_available()
+
+    @staticmethod
+    def _find_candidates(spatial_index: SpatialIndex, filter_data: locations_crud.BaseFilter) -> list[int] | None:
+        """Поиск локаций-кандидатов в радиусе поиска по пространственному индексу
+
+        Если индекс выключен или еще не построен - возвращает None (радиус будет проверен в SQL)
+        """
+        if not SPATIAL_INDEX_ENABLED or not spatial_index.is_built:
+            return None
+        radius = locations_crud._zoom_mapper(filter_data["zoom"])
+        return spatial_index.query_radius(filter_data["latitude"], filter_data["longitude"], radius)
+
+    @staticmethod
+    def _batch_slot() -> Callable[[], None]:
+        """Занять место для пакетного запроса (не больше BATCH_RANKING_MAX_REQUESTS одновременно)
+
+        :return: освобождение места (повторные вызовы ничего не делают)
+        """
+        if not OFFICE_BATCH_SLOTS.acquire(blocking=False):
+            raise BatchRankingError('Слишком много пакетных запросов, повторите позже', status_code=503)
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                OFFICE_BATCH_SLOTS.release()
+        return release
+
+    @staticmethod
+    async def _offices_batch(origins: list[Origin],
+                             filter_data: dict[str, Any],
+                             radius: float,
+                             limit: int,
+                             release: Callable[[], None]) -> AsyncIterator[bytes]:
+        """NDJSON с лучшими офисами для точек пачками по мере готовности (порядок точек не сохраняется)
+
+        Точки сортируются по ячейкам карты, поэтому точки пачки рядом и проходы по графу дорог
+        (travel_mode) переиспользуются. Пачки считаются в долгоживущем пуле процессов по копии массивов движка
+        ранжирования (count_clients_now передается с каждой пачкой); в очереди пула не больше двух пачек
+        на процесс, следующие отправляются по мере готовности
+        """
+        try:
+            origins.sort(key=lambda origin: (origin[1] // 0.01, origin[2] // 0.01))
+            chunks = (origins[start:start + BATCH_RANKING_CHUNK_SIZE]
+                      for start in range(0, len(origins), BATCH_RANKING_CHUNK_SIZE))
+            snapshot = OFFICE_RANKING_ENGINE.snapshot()
+            workers = min(BATCH_RANKING_WORKERS, -(-len(origins) // BATCH_RANKING_CHUNK_SIZE))
+            if workers <= 1:
+                ranker = OriginRanker.from_snapshot(snapshot, TRAVEL_TIMES)
+                for chunk in chunks:
+                    yield await asyncio.to_thread(ranker.rank, chunk, filter_data, radius, limit)
+                return
+
+            loop = asyncio.get_running_loop()
+            live_arrays = {name: snapshot["arrays"][name] for name in OFFICE_RANKING_ENGINE.LIVE_ARRAYS}
+            pending = set()
+            with OFFICE_BATCH_POOL.acquire(snapshot) as pool:
+                try:
+                    while True:
+                        for chunk in islice(chunks, 2 * workers - len(pending)):
+                            pending.add(loop.run_in_executor(
+                                pool, rank_in_worker, chunk, filter_data, radius, limit, live_arrays
+                            ))
+                        if not pending:
+                            break
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()
+                finally:
+                    # клиент мог отключиться, не дочитав ответ - оставшиеся пачки не считаются
+                    for future in pending:
+                        future.cancel()
+        finally:
+            release()
+
+
+class LocationsLogic(_BaseLocationsLogic):
+    """Логика записи данных отделений и банкоматов (чтение - ReadLocationsLogic / AsyncLocationsLogic)"""
     def __init__(self, db: Session):
         self._db = db
 
-    def find_atms(self, filter_data: locations_crud.FindATMFilter):
-        return locations_crud.get_atms_filtered(self._db, filter_data)
+    def flush_office_occupancy(self) -> int:
+        """Записать накопленные события загруженности офисов в БД (одной транзакцией)
 
-    def find_offices(self, filter_data: locations_crud.FindOfficesFilter):
-        return locations_crud.get_offices_filtered(self._db, filter_data)
+        :return: количество обновленных офисов
+        """
+        return OFFICE_OCCUPANCY_BUFFER.flush(self._save_office_occupancy)
 
-    def get_location_reviews(self, location_type: Literal['atm', 'office'], location_id: int):
-        location_types_mapping = {
-            'atm': locations_crud.get_atm_reviews,
-            'office': locations_crud.get_office_reviews
-        }
-        get_reviews = location_types_mapping[location_type]
-        return get_reviews(self._db, location_id)
+    def _save_office_occupancy(self, occupancy: dict[int, tuple[int, datetime]]) -> None:
+        locations_crud.save_offices_occupancy(self._db, occupancy)
+        self._db.commit()
+        sync_office_queues(self._db, list(occupancy))
 
     def post_location_review(self,
                              _phone: str,
@@ -31,13 +426,242 @@ class LocationsLogic:
                              ) -> None:
         """Сохранение отзыва об отделении банка или банкомате"""
 
-    def request_office_visit(self, _office_id: int) -> dict[str, bool]:
-        return {'9:00': False, '9:15': True, '9:30': False}
-
     def register_office_visit(self, phone: str, _office_id: int, _selected_time: str) -> dict[str, str]:
+        """Запись в электронную очередь отделения (запись в БД - через соединение-писатель)"""
         return {
             'address': '141506, Московская область, г. Солнечногорск, ул. Красная, д. 60',
             'code': 'ЭО-123',
             'phone': phone,
             'datetime': '10:45'
         }
+
+
+class ReadLocationsLogic(_BaseLocationsLogic):
+    """Логика поиска отделений и банкоматов на синхронных соединениях только для чтения
+
+    Методы асинхронные, как у AsyncLocationsLogic, но весь запрос (ранжирование, запросы к БД, сборка JSON)
+    выполняется одним вызовом в threadpool, как у синхронного обработчика (ASYNC_READS_ENABLED выключен)
+    """
+    def __init__(self, db: Session):
+        self._db = db
+
+    async def find_atms_json(self, filter_data: locations_crud.FindATMFilter) -> tuple[list[ATMRow], bytes]:
+        """Результат find_atms и он же в JSON (atms_to_json)"""
+        return await run_in_threadpool(self._find_atms_json, filter_data)
+
+    async def find_offices_json(self,
+                                filter_data: locations_crud.FindOfficesFilter) -> tuple[list[OfficeRow], bytes]:
+        """Результат find_offices и он же в JSON (offices_to_json)"""
+        return await run_in_threadpool(self._find_offices_json, filter_data)
+
+    async def find_atms_clusters(self, filter_data: locations_crud.FindATMFilter) -> dict[str, list]:
+        """Банкоматы для карты: на отдаленных масштабах - кластеры, при приближении - отдельные банкоматы"""
+        return await run_in_threadpool(self._find_atms_clusters, filter_data)
+
+    async def find_offices_clusters(self, filter_data: locations_crud.FindOfficesFilter) -> dict[str, list]:
+        """Отделения для карты: на отдаленных масштабах - кластеры, при приближении - отдельные отделения"""
+        return await run_in_threadpool(self._find_offices_clusters, filter_data)
+
+    async def get_location_reviews(self, location_type: Literal['atm', 'office'], location_id: int):
+        location_types_mapping = {
+            'atm': locations_crud.get_atm_reviews,
+            'office': locations_crud.get_office_reviews
+        }
+        return await run_in_threadpool(location_types_mapping[location_type], self._db, location_id)
+
+    async def request_office_visit(self, _office_id: int) -> dict[str, bool]:
+        return {'9:00': False, '9:15': True, '9:30': False}
+
+    def _find_atms_json(self, filter_data: locations_crud.FindATMFilter) -> tuple[list[ATMRow], bytes]:
+        atms = self._find_atms_cached(filter_data)
+        return atms, self.atms_to_json(atms)
+
+    def _find_offices_json(self, filter_data: locations_crud.FindOfficesFilter) -> tuple[list[OfficeRow], bytes]:
+        offices = self._find_offices_cached(filter_data)
+        return offices, self.offices_to_json(offices)
+
+    def _find_atms_cached(self, filter_data: locations_crud.FindATMFilter):
+        cache_key, atms = self._cached("atm", filter_data)
+        if atms is None:
+            atms = self._find_atms(filter_data)
+            self._store(cache_key, "atm", atms)
+        return atms
+
+    def _find_offices_cached(self, filter_data: locations_crud.FindOfficesFilter):
+        cache_key, offices = self._cached("office", filter_data)
+        if offices is None:
+            offices = self._find_offices(filter_data)
+            self._store(cache_key, "office", offices)
+        return offices
+
+    def _find_atms(self, filter_data: locations_crud.FindATMFilter):
+        after = self._decode_cursor(filter_data)
+        if self._ranking_engine_ready(ATM_RANKING_ENGINE, locations_crud.get_atms_ranking_data):
+            radius = locations_crud._zoom_mapper(filter_data["zoom"])
+            atm_ids, distances, _ = ATM_RANKING_ENGINE.rank(filter_data, radius, filter_data.get("limit"), after)
+            atms = locations_crud.get_atms_by_ids(self._db, atm_ids)
+            return [ATMRow(atms[atm_id], distance) for atm_id, distance in zip(atm_ids, distances)]
+
+        location_ids = self._find_candidates(ATM_SPATIAL_INDEX, filter_data)
+        return locations_crud.get_atms_filtered(self._db, filter_data, location_ids, after)
+
+    def _find_offices(self, filter_data: locations_crud.FindOfficesFilter):
+        after = self._decode_cursor(filter_data)
+        week_minute = self._forecast_week_minute()
+        if self._ranking_engine_ready(OFFICE_RANKING_ENGINE, locations_crud.get_offices_ranking_data):
+            radius = locations_crud._zoom_mapper(filter_data["zoom"])
+            office_ids, distances, times_wait = OFFICE_RANKING_ENGINE.rank(
+                filter_data, radius, filter_data.get("limit"), after,
+                self._expected_clients(week_minute), self._travel_minutes(filter_data)
+            )
+            offices = locations_crud.get_offices_by_ids(self._db, office_ids)
+            return [OfficeRow(offices[office_id], distance, time_wait)
+                    for office_id, distance, time_wait in zip(office_ids, distances, times_wait)]
+
+        location_ids = self._find_candidates(OFFICE_SPATIAL_INDEX, filter_data)
+        return locations_crud.get_offices_filtered(self._db, filter_data, location_ids, after, week_minute)
+
+    def _find_atms_clusters(self, filter_data: locations_crud.FindATMFilter) -> dict[str, list]:
+        if filter_data["zoom"] >= CLUSTERING_MAX_ZOOM:
+            return {"clusters": [], "atms": self._find_atms_cached(filter_data)}
+        atms = self._find_atms_cached(filter_data) if self._has_filters(filter_data) else None
+        return {"clusters": self._atm_clusters(atms, filter_data), "atms": []}
+
+    def _find_offices_clusters(self, filter_data: locations_crud.FindOfficesFilter) -> dict[str, list]:
+        if filter_data["zoom"] >= CLUSTERING_MAX_ZOOM:
+            return {"clusters": [], "offices": self._find_offices_cached(filter_data)}
+        offices = self._find_offices_cached(filter_data) if self._has_filters(filter_data) else None
+        return {"clusters": self._office_clusters(offices, filter_data), "offices": []}
+
+    def _ranking_engine_ready(self, engine: RankingEngine, get_ranking_data) -> bool:
+        """Проверка, что нужно ранжировать через NumPy (массивы строятся при первом обращении)"""
+        if not self._ranking_engine_enabled(engine):
+            return False
+        if not engine.is_built:
+            engine.build(get_ranking_data(self._db))
+        return True
+
+
+class AsyncLocationsLogic(_BaseLocationsLogic):
+    """Асинхронная логика поиска отделений и банкоматов (запросы к БД не блокируют event loop)
+
+    Работа процессора - ранжирование, проходы по графу дорог и сборка JSON - выполняется в отдельных потоках
+    """
+    def __init__(self, db: AsyncSession):
+        self._db = db
+
+    async def find_atms_json(self, filter_data: locations_crud.FindATMFilter) -> tuple[list[ATMRow], bytes]:
+        """Результат find_atms и он же в JSON (atms_to_json)"""
+        atms = await self.find_atms(filter_data)
+        return atms, await asyncio.to_thread(self.atms_to_json, atms)
+
+    async def find_offices_json(self,
+                                filter_data: locations_crud.FindOfficesFilter) -> tuple[list[OfficeRow], bytes]:
+        """Результат find_offices и он же в JSON (offices_to_json)"""
+        offices = await self.find_offices(filter_data)
+        return offices, await asyncio.to_thread(self.offices_to_json, offices)
+
+    async def find_atms(self, filter_data: locations_crud.FindATMFilter):
+        cache_key, atms = self._cached("atm", filter_data)
+        if atms is None:
+            atms = await self._find_atms(filter_data)
+            self._store(cache_key, "atm", atms)
+        return atms
+
+    async def find_offices(self, filter_data: locations_crud.FindOfficesFilter):
+        cache_key, offices = self._cached("office", filter_data)
+        if offices is None:
+            offices = await self._find_offices(filter_data)
+            self._store(cache_key, "office", offices)
+        return offices
+
+    async def _find_atms(self, filter_data: locations_crud.FindATMFilter):
+        after = self._decode_cursor(filter_data)
+        if await self._ranking_engine_ready(ATM_RANKING_ENGINE, locations_crud.get_atms_ranking_data_async):
+            radius = locations_crud._zoom_mapper(filter_data["zoom"])
+            atm_ids, distances, _ = await asyncio.to_thread(
+                ATM_RANKING_ENGINE.rank, filter_data, radius, filter_data.get("limit"), after
+            )
+            atms = await locations_crud.get_atms_by_ids_async(self._db, atm_ids)
+            return [ATMRow(atms[atm_id], distance) for atm_id, distance in zip(atm_ids, distances)]
+
+        location_ids = self._find_candidates(ATM_SPATIAL_INDEX, filter_data)
+        return await locations_crud.get_atms_filtered_async(self._db, filter_data, location_ids, after)
+
+    async def _find_offices(self, filter_data: locations_crud.FindOfficesFilter):
+        after = self._decode_cursor(filter_data)
+        week_minute = self._forecast_week_minute()
+        if await self._ranking_engine_ready(OFFICE_RANKING_ENGINE, locations_crud.get_offices_ranking_data_async):
+            radius = locations_crud._zoom_mapper(filter_data["zoom"])
+            office_ids, distances, times_wait = await asyncio.to_thread(
+                OFFICE_RANKING_ENGINE.rank, filter_data, radius, filter_data.get("limit"), after,
+                self._expected_clients(week_minute), self._travel_minutes(filter_data)
+            )
+            offices = await locations_crud.get_offices_by_ids_async(self._db, office_ids)
+            return [OfficeRow(offices[office_id], distance, time_wait)
+                    for office_id, distance, time_wait in zip(office_ids, distances, times_wait)]
+
+        location_ids = self._find_candidates(OFFICE_SPATIAL_INDEX, filter_data)
+        return await locations_crud.get_offices_filtered_async(
+            self._db, filter_data, location_ids, after, week_minute
+        )
+
+    async def find_atms_clusters(self, filter_data: locations_crud.FindATMFilter) -> dict[str, list]:
+        """Банкоматы для карты: на отдаленных масштабах - кластеры, при приближении - отдельные банкоматы"""
+        if filter_data["zoom"] >= CLUSTERING_MAX_ZOOM:
+            return {"clusters": [], "atms": await self.find_atms(filter_data)}
+        atms = await self.find_atms(filter_data) if self._has_filters(filter_data) else None
+        return {"clusters": self._atm_clusters(atms, filter_data), "atms": []}
+
+    async def find_offices_clusters(self, filter_data: locations_crud.FindOfficesFilter) -> dict[str, list]:
+        """Отделения для карты: на отдаленных масштабах - кластеры, при приближении - отдельные отделения"""
+        if filter_data["zoom"] >= CLUSTERING_MAX_ZOOM:
+            return {"clusters": [], "offices": await self.find_offices(filter_data)}
+        offices = await self.find_offices(filter_data) if self._has_filters(filter_data) else None
+        return {"clusters": self._office_clusters(offices, filter_data), "offices": []}
+
+    async def _ranking_engine_ready(self, engine: RankingEngine, get_ranking_data) -> bool:
+        """Проверка, что нужно ранжировать через NumPy (массивы строятся при первом обращении)"""
+        if not self._ranking_engine_enabled(engine):
+            return False
+        if not engine.is_built:
+            engine.build(await get_ranking_data(self._db))
+        return True
+
+    async def find_offices_batch(self,
+                                 body: AsyncIterable[bytes],
+                                 filter_data: dict[str, Any]) -> tuple[AsyncIterator[bytes], Callable[[], None]]:
+        """Лучшие офисы для каждой начальной точки из NDJSON (пакетный поиск)
+
+        Точки читаются и проверяются до начала ответа (ошибки возвращаются кодом ответа),
+        результаты отдаются потоком по мере готовности
+
+        :param body: тело запроса - NDJSON с точками (см. read_origins)
+        :param filter_data: FindOfficesBatchRequest - фильтры офисов, радиус поиска и количество офисов на точку
+        :return: NDJSON, строка на точку: {"id": ..., "offices": [{"id", "distance", "timeWait"}, ...]},
+            и освобождение места пакетного запроса - вызвать после ответа, если поток результатов не был прочитан
+        """
+        if not OFFICE_RANKING_ENGINE.is_available():
+            raise BatchRankingError('Пакетный поиск недоступен: не установлен numpy', status_code=503)
+        release = self._batch_slot()
+        try:
+            origins = await read_origins(body, BATCH_RANKING_MAX_ORIGINS, BATCH_RANKING_MAX_LINE_BYTES)
+            if not OFFICE_RANKING_ENGINE.is_built:
+                OFFICE_RANKING_ENGINE.build(await locations_crud.get_offices_ranking_data_async(self._db))
+        except BaseException:
+            release()
+            raise
+        filter_data = dict(filter_data)
+        radius, limit = filter_data.pop("radius"), filter_data.pop("limit")
+        return self._offices_batch(origins, filter_data, radius, limit, release), release
+
+    async def get_location_reviews(self, location_type: Literal['atm', 'office'], location_id: int):
+        location_types_mapping = {
+            'atm': locations_crud.get_atm_reviews_async,
+            'office': locations_crud.get_office_reviews_async
+        }
+        get_reviews = location_types_mapping[location_type]
+        return await get_reviews(self._db, location_id)
+
+    async def request_office_visit(self, _office_id: int) -> dict[str, bool]:
+        return {'9:00': False, '9:15': True, '9:30': False}
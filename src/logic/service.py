@@ -0,0 +1,36 @@
+from ..cache.locations import (
+    ATM_JSON_FRAGMENTS, LOCATIONS_RESULT_CACHE, OFFICE_JSON_FRAGMENTS, OFFICE_LOAD_FORECAST, OFFICE_OCCUPANCY_BUFFER,
+    OFFICE_OCCUPANCY_HUB, ROAD_GRAPH, TRAVEL_TIMES
+)
+from ..cache.security import SIGNED_TOKENS, TOKEN_STORE
+from ..cache.sms import SMS_STORE
+from ..database import snapshot
+from ..database.base import async_engine, engine, pool_stats, read_engine
+
+
+class ServiceLogic:
+    """Логика служебных методов (мониторинг)"""
+
+    @staticmethod
+    def is_ready() -> bool:
+        """Процесс завершил старт и подключен к актуальному снапшоту БД"""
+        return snapshot.is_ready(read_engine)
+
+    @staticmethod
+    def get_metrics() -> dict[str, dict[str, int | float]]:
+        """Счетчики внутренних кешей и хранилищ"""
+        return {
+            "locations_cache": LOCATIONS_RESULT_CACHE.stats(),
+            "atm_json_fragments": ATM_JSON_FRAGMENTS.stats(),
+            "office_json_fragments": OFFICE_JSON_FRAGMENTS.stats(),
+            "office_load_forecast": OFFICE_LOAD_FORECAST.stats(),
+            "office_occupancy": OFFICE_OCCUPANCY_BUFFER.stats(),
+            "office_occupancy_subscriptions": OFFICE_OCCUPANCY_HUB.stats(),
+            "road_graph": ROAD_GRAPH.stats(),
+            "travel_times": TRAVEL_TIMES.stats(),
+            "db_write_pool": pool_stats(engine),
+            "db_read_pool": pool_stats(read_engine),
+            "db_async_read_pool": pool_stats(async_engine),
+            "token_store": TOKEN_STORE.stats() if SIGNED_TOKENS is None else SIGNED_TOKENS.stats(),
+            "sms_store": SMS_STORE.stats(),
+        }
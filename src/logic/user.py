@@ -20,16 +20,17 @@ class UserLogic:
 
     def request_sms(self, phone: str) -> SentSmsInfo:
         """Запросить смс для подтверждения"""
+        self._sms.check_rate_limit(phone)
         code = self._sms.generate_code()
         self._sms.send(phone, code)
         sent_time = datetime.now()
         sms_info = SentSmsInfo(phone=phone, sent_time=sent_time, expiration_time=sent_time + self._sms_lifetime)
-        self._sms.save_sms(code, sms_info)
+        self._sms.save_sms(phone, code, sms_info)
         return sms_info
 
-    def confirm_sms(self, code: str) -> str:
+    def confirm_sms(self, phone: str, code: str) -> str:
         """Подтвердить номер по коду из смс"""
-        sms_info: SentSmsInfo = self._sms.get_sms(code)
+        sms_info: SentSmsInfo = self._sms.get_sms(phone, code)
         if sms_info['expiration_time'] < datetime.now():
             raise SMSError('Код устарел')
         return self._user_token.set_new_token(sms_info['phone'])
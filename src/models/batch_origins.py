@@ -0,0 +1,68 @@
+import json
+from math import isfinite
+from typing import AsyncIterable
+
+from ..app.exceptions import BaseApiException
+from .batch_ranking import Origin
+
+
+class BatchRankingError(BaseApiException):
+    """Ошибка пакетного поиска офисов"""
+
+
+async def read_origins(chunks: AsyncIterable[bytes], max_origins: int, max_line_bytes: int) -> list[Origin]:
+    """Чтение начальных точек из NDJSON: строка на точку {"id": ..., "latitude": ..., "longitude": ...}
+
+    Тело запроса читается кусками, в памяти держатся только разобранные точки и недочитанная строка.
+    id точки (строка или число) возвращается в ответе как есть, без id - номер строки; пустые строки пропускаются
+
+    :param chunks: куски тела запроса
+    :param max_origins: максимальное количество точек
+    :param max_line_bytes: максимальная длина строки в байтах (недочитанная строка длиннее - сразу ошибка)
+    """
+    origins: list[Origin] = []
+    tail = b""
+    line_number = 0
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            line_number += 1
+            _check_line_size(line, line_number, max_line_bytes)
+            _append_origin(origins, line, line_number, max_origins)
+        _check_line_size(tail, line_number + 1, max_line_bytes)
+    if tail:
+        _append_origin(origins, tail, line_number + 1, max_origins)
+    if not origins:
+        raise BatchRankingError("Не передано ни одной точки", status_code=422)
+    return origins
+
+
+def _check_line_size(line: bytes, line_number: int, max_line_bytes: int) -> None:
+    if len(line) > max_line_bytes:
+        raise BatchRankingError(f"Строка {line_number}: больше {max_line_bytes} байт", status_code=413)
+
+
+def _append_origin(origins: list[Origin], line: bytes, line_number: int, max_origins: int) -> None:
+    if not line.strip():
+        return
+    if len(origins) >= max_origins:
+        raise BatchRankingError(f"Больше {max_origins} точек в запросе", status_code=413)
+    try:
+        item = json.loads(line)
+    except ValueError:
+        raise BatchRankingError(f"Строка {line_number}: некорректный JSON", status_code=422) from None
+    if not isinstance(item, dict):
+        raise BatchRankingError(f"Строка {line_number}: ожидается JSON объект", status_code=422)
+    latitude, longitude = item.get("latitude"), item.get("longitude")
+    origin_id = item.get("id", line_number)
+    if not _is_coordinate(latitude, 90) or not _is_coordinate(longitude, 180):
+        raise BatchRankingError(f"Строка {line_number}: некорректные latitude/longitude", status_code=422)
+    if not isinstance(origin_id, (str, int)) or isinstance(origin_id, bool):
+        raise BatchRankingError(f"Строка {line_number}: id должен быть строкой или числом", status_code=422)
+    origins.append((origin_id, float(latitude), float(longitude)))
+
+
+def _is_coordinate(value, limit: float) -> bool:
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and isfinite(value) and -limit <= value <= limit)
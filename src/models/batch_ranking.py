@@ -0,0 +1,177 @@
+# Модуль загружается в процессах пула пакетного поиска офисов (spawn), поэтому не импортирует приложение и БД:
+# процесс получает копию массивов движка ранжирования и сам загружает граф дорог
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+import json
+from math import degrees
+import multiprocessing
+from threading import Lock
+from typing import Any, Hashable, Iterator, Mapping
+
+from .ranking import RankingEngine
+from .road_graph import RoadGraph
+from .spatial_index import SpatialIndex
+from .travel_times import TravelTimes
+
+Origin = tuple[Hashable, float, float]  # (id точки, широта, долгота)
+
+_WORKER_RANKER: "OriginRanker | None" = None
+
+
+class OriginRanker:
+    """Лучшие офисы для каждой начальной точки пачки
+
+    Кандидаты в радиусе берутся из пространственного индекса, расстояние, фильтры и time_wait
+    считаются векторизованно движком ранжирования только по кандидатам
+
+    :param engine: движок ранжирования офисов
+    :param spatial_index: пространственный индекс офисов
+    :param travel_times: время в пути по дорогам (для travel_mode)
+    """
+    def __init__(self, engine: RankingEngine, spatial_index: SpatialIndex, travel_times: TravelTimes):
+        self._engine = engine
+        self._spatial_index = spatial_index
+        self._travel_times = travel_times
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Mapping[str, Any], travel_times: TravelTimes) -> "OriginRanker":
+        """Ранжирование по копии массивов движка (RankingEngine.snapshot), индекс строится по ней же"""
+        engine = RankingEngine.from_snapshot(snapshot)
+        arrays = snapshot["arrays"]
+        spatial_index = SpatialIndex()
+        spatial_index.build(zip(arrays["id"].tolist(),
+                                map(degrees, arrays["latitude"].tolist()),
+                                map(degrees, arrays["longitude"].tolist())))
+        return cls(engine, spatial_index, travel_times)
+
+    def replace_live(self, arrays: Mapping[str, Any]) -> None:
+        """Подставить текущие RankingEngine.LIVE_ARRAYS (count_clients_now) в массивы движка"""
+        self._engine.replace_live(arrays)
+
+    def rank(self, origins: list[Origin], filter_data: Mapping[str, Any], radius: float, limit: int) -> bytes:
+        """Лучшие офисы для точек пачки
+
+        :param origins: начальные точки
+        :param filter_data: фильтры офисов (FindOfficesFilter без положения на карте)
+        :param radius: радиус поиска вокруг каждой точки в км
+        :param limit: сколько лучших офисов вернуть для точки
+        :return: NDJSON, строка на точку: {"id": ..., "offices": [{"id", "distance", "timeWait"}, ...]}
+        """
+        travel_mode = filter_data.get("travel_mode")
+        lines = []
+        for origin_id, latitude, longitude in origins:
+            origin_filter = {**filter_data, "latitude": latitude, "longitude": longitude,
+                             "initial_latitude": latitude, "initial_longitude": longitude}
+            travel_minutes = None
+            if travel_mode:
+                travel_minutes = partial(self._travel_times.minutes_many, latitude, longitude, mode=travel_mode)
+            office_ids, distances, times_wait = self._engine.rank(
+                origin_filter, radius, limit, travel_minutes=travel_minutes,
+                location_ids=self._spatial_index.query_radius(latitude, longitude, radius)
+            )
+            offices = [{"id": office_id, "distance": distance, "timeWait": time_wait}
+                       for office_id, distance, time_wait in zip(office_ids, distances, times_wait)]
+            lines.append(json.dumps({"id": origin_id, "offices": offices}, ensure_ascii=False,
+                                    separators=(",", ":")))
+        return ("\n".join(lines) + "\n").encode()
+
+
+def init_worker(snapshot: Mapping[str, Any],
+                graph_path: str,
+                graph_options: Mapping[str, Any],
+                travel_times_options: Mapping[str, Any]) -> None:
+    """Инициализация процесса пула: копия массивов движка ранжирования и граф дорог
+
+    :param snapshot: RankingEngine.snapshot офисов
+    :param graph_path: файл графа дорог (пустая строка - время в пути оценивается по прямой)
+    :param graph_options: параметры RoadGraph
+    :param travel_times_options: параметры TravelTimes
+    """
+    global _WORKER_RANKER
+    graph = RoadGraph(**graph_options)
+    if graph_path:
+        with open(graph_path, "rb") as file:
+            graph.load(file)
+    _WORKER_RANKER = OriginRanker.from_snapshot(snapshot, TravelTimes(graph, **travel_times_options))
+
+
+def rank_in_worker(origins: list[Origin],
+                   filter_data: Mapping[str, Any],
+                   radius: float,
+                   limit: int,
+                   live_arrays: Mapping[str, Any]) -> bytes:
+    """OriginRanker.rank в процессе пула (после init_worker)
+
+    :param live_arrays: текущие RankingEngine.LIVE_ARRAYS (count_clients_now) той же версии массивов, что у пула
+    """
+    _WORKER_RANKER.replace_live(live_arrays)
+    return _WORKER_RANKER.rank(origins, filter_data, radius, limit)
+
+
+class RankingPool:
+    """Долгоживущий пул процессов пакетного поиска офисов (spawn)
+
+    Процессы получают копию массивов движка ранжирования при старте, поэтому пул пересоздается только
+    при смене версии массивов (RankingEngine.version). Старый пул закрывается, когда его отпустят
+    все запросы, которые им пользуются
+
+    :param workers: количество процессов
+    :param graph_path: файл графа дорог (пустая строка - время в пути оценивается по прямой)
+    :param graph_options: параметры RoadGraph
+    :param travel_times_options: параметры TravelTimes
+    """
+    def __init__(self,
+                 workers: int,
+                 graph_path: str,
+                 graph_options: Mapping[str, Any],
+                 travel_times_options: Mapping[str, Any]):
+        self._workers = workers
+        self._initargs = (graph_path, graph_options, travel_times_options)
+        self._lock = Lock()
+        self._pool: ProcessPoolExecutor | None = None
+        self._version: int | None = None
+        self._users: dict[ProcessPoolExecutor, int] = {}
+        self._stats = {"created": 0}
+
+    @contextmanager
+    def acquire(self, snapshot: Mapping[str, Any]) -> Iterator[ProcessPoolExecutor]:
+        """Пул для массивов snapshot (RankingEngine.snapshot): текущий или новый, если версия массивов сменилась"""
+        with self._lock:
+            if self._pool is None or self._version != snapshot["version"]:
+                self._retire(self._pool)
+                self._pool = ProcessPoolExecutor(
+                    self._workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker,
+                    initargs=(snapshot, *self._initargs)
+                )
+                self._version = snapshot["version"]
+                self._users[self._pool] = 0
+                self._stats["created"] += 1
+            pool = self._pool
+            self._users[pool] += 1
+        try:
+            yield pool
+        finally:
+            with self._lock:
+                self._users[pool] -= 1
+                if pool is not self._pool:
+                    self._retire(pool)
+
+    def shutdown(self) -> None:
+        """Закрыть текущий пул (при остановке приложения)"""
+        with self._lock:
+            pool, self._pool, self._version = self._pool, None, None
+            if pool is None:
+                return
+            if not self._users.get(pool):
+                self._users.pop(pool, None)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            return {**self._stats, "pools": len(self._users)}
+
+    def _retire(self, pool: ProcessPoolExecutor | None) -> None:
+        if pool is not None and not self._users.get(pool):
+            self._users.pop(pool, None)
+            pool.shutdown(wait=False)
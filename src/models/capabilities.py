@@ -0,0 +1,27 @@
+from typing import Any, Mapping
+
+# Валюты, по которым ищутся локации (колонки Currency)
+CURRENCIES = ("rub", "usd", "eur")
+
+# Биты маски возможностей по валютам: выдача (withdraw_<валюта>) и прием (deposit_<валюта>)
+_CURRENCY_CAPABILITIES = tuple(f"withdraw_{currency}" for currency in CURRENCIES) + \
+    tuple(f"deposit_{currency}" for currency in CURRENCIES)
+
+# Возможности локаций в порядке битов маски (колонка capabilities банкоматов и офисов).
+# Названия услуг совпадают с ключами фильтров поиска (FindATMFilter / FindOfficesFilter)
+ATM_CAPABILITIES = ("all_day", "wheelchair", "blind", "nfc_support", "qr_support") + _CURRENCY_CAPABILITIES
+OFFICE_CAPABILITIES = ("with_ramp", "prime", "vip", "rko", "suo", "kep") + _CURRENCY_CAPABILITIES
+
+
+def capabilities_mask(capabilities: tuple[str, ...], filter_data: Mapping[str, Any]) -> int:
+    """Маска возможностей, которые требуются фильтрами поиска (0 - фильтров по возможностям нет)
+
+    Локация подходит, если (capabilities & mask) == mask
+
+    :param capabilities: возможности локаций в порядке битов маски (ATM_CAPABILITIES / OFFICE_CAPABILITIES)
+    :param filter_data: фильтры поиска: флаги услуг и списки валют withdraw_currencies, deposit_currencies
+    """
+    required = {capability for capability in capabilities if filter_data.get(capability)}
+    for operation in ("withdraw", "deposit"):
+        required.update(f"{operation}_{currency}" for currency in filter_data.get(f"{operation}_currencies") or ())
+    return sum(1 << bit for bit, capability in enumerate(capabilities) if capability in required)
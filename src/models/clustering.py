@@ -0,0 +1,118 @@
+from threading import Lock
+from typing import Iterable, TypedDict
+
+
+class Cluster(TypedDict):
+    latitude: float
+    longitude: float
+    count: int
+    best_rating: int | None
+    min_queue: int | None
+
+
+class ClusterGrid:
+    """Иерархическая сетка для кластеризации локаций на отдаленных масштабах карты
+
+    Для каждого уровня приближения (целый zoom) точки раскладываются по ячейкам, размер ячейки
+    уменьшается вдвое на каждом следующем уровне (как тайлы карты), поэтому ячейка уровня z
+    целиком входит в ячейку уровня z - 1. Агрегаты ячеек (центр, количество, лучший рейтинг,
+    минимальная очередь) самого детального уровня считаются по точкам, остальных - по ячейкам уровня ниже.
+    Агрегаты сохраняются и пересчитываются только после изменения точек.
+
+    :param levels: количество уровней (zoom от 0 до levels - 1)
+    :param cells_per_tile: на сколько ячеек делится тайл карты по каждой оси
+    """
+    def __init__(self, levels: int = 10, cells_per_tile: int = 4):
+        self._levels = levels
+        self._cell_size = 360 / (2 ** (levels - 1) * cells_per_tile)  # размер ячейки на самом детальном уровне
+        self._lock = Lock()
+        self._points: dict[int, tuple[float, float, int | None, int | None]] = {}
+        self._cells: list[dict[tuple[int, int], list] | None] = [None] * levels
+
+    def build(self, points: Iterable[tuple[int, float, float, int | None, int | None]]) -> None:
+        """Построить сетку заново
+
+        :param points: итератор (id, широта, долгота, рейтинг, очередь (avg_service_time * count_clients_now))
+        """
+        all_points = {point_id: (latitude, longitude, rating, queue)
+                      for point_id, latitude, longitude, rating, queue in points}
+        with self._lock:
+            self._points = all_points
+            self._cells = [None] * self._levels
+            self._level_cells(0)  # предрасчет агрегатов всех уровней
+
+    def upsert(self, point_id: int, latitude: float, longitude: float, rating: int | None, queue: int | None) -> None:
+        """Добавить или обновить точку (агрегаты будут пересчитаны при следующем запросе)"""
+        with self._lock:
+            self._points[point_id] = (latitude, longitude, rating, queue)
+            self._cells = [None] * self._levels
+
+    def remove(self, point_id: int) -> None:
+        """Удалить точку"""
+        with self._lock:
+            if self._points.pop(point_id, None) is not None:
+                self._cells = [None] * self._levels
+
+    def level(self, zoom: float) -> int:
+        """Уровень сетки для приближения на карте"""
+        return min(max(int(zoom), 0), self._levels - 1)
+
+    def clusters(self, zoom: float) -> list[Cluster]:
+        """Кластеры всех точек для приближения на карте"""
+        with self._lock:
+            cells = self._level_cells(self.level(zoom))
+        return self._to_clusters(cells)
+
+    def aggregate(self, points: Iterable[tuple[float, float, int | None, int | None]], zoom: float) -> list[Cluster]:
+        """Сгруппировать произвольный набор точек (например, отфильтрованных) в ячейки сетки
+
+        :param points: итератор (широта, долгота, рейтинг, очередь)
+        :param zoom: приближение на карте
+        """
+        shift = self._levels - 1 - self.level(zoom)
+        cells: dict[tuple[int, int], list] = {}
+        for latitude, longitude, rating, queue in points:
+            key = (int(latitude // self._cell_size) >> shift, int(longitude // self._cell_size) >> shift)
+            self._merge(cells, key, [1, latitude, longitude, rating, queue])
+        return self._to_clusters(cells)
+
+    def _level_cells(self, level: int) -> dict[tuple[int, int], list]:
+        """Агрегаты ячеек уровня: самый детальный считается по точкам, остальные - по ячейкам уровня ниже"""
+        cells = self._cells[level]
+        if cells is not None:
+            return cells
+
+        cells = {}
+        if level == self._levels - 1:
+            for latitude, longitude, rating, queue in self._points.values():
+                key = (int(latitude // self._cell_size), int(longitude // self._cell_size))
+                self._merge(cells, key, [1, latitude, longitude, rating, queue])
+        else:
+            for (row, col), child in self._level_cells(level + 1).items():
+                self._merge(cells, (row >> 1, col >> 1), child)
+        self._cells[level] = cells
+        return cells
+
+    @staticmethod
+    def _merge(cells: dict[tuple[int, int], list], key: tuple[int, int], values: list) -> None:
+        """Добавить в ячейку агрегат [количество, сумма широт, сумма долгот, лучший рейтинг, минимальная очередь]"""
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = list(values)
+            return
+        count, sum_latitude, sum_longitude, rating, queue = values
+        cell[0] += count
+        cell[1] += sum_latitude
+        cell[2] += sum_longitude
+        if rating is not None and (cell[3] is None or rating > cell[3]):
+            cell[3] = rating
+        if queue is not None and (cell[4] is None or queue < cell[4]):
+            cell[4] = queue
+
+    @staticmethod
+    def _to_clusters(cells: dict[tuple[int, int], list]) -> list[Cluster]:
+        return [
+            Cluster(latitude=sum_latitude / count, longitude=sum_longitude / count, count=count,
+                    best_rating=best_rating, min_queue=min_queue)
+            for count, sum_latitude, sum_longitude, best_rating, min_queue in cells.values()
+        ]
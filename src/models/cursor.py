@@ -0,0 +1,27 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import json
+from typing import NamedTuple
+
+from ..app.exceptions import BaseApiException
+
+
+class CursorError(BaseApiException):
+    """Ошибка курсора постраничной выдачи"""
+
+
+class KeysetCursor(NamedTuple):
+    """Позиция в отсортированной выдаче: значение ключа сортировки и id последней локации на странице"""
+    value: float
+    id: int
+
+    def encode(self) -> str:
+        """Непрозрачный для клиента курсор"""
+        return urlsafe_b64encode(json.dumps([self.value, self.id]).encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> 'KeysetCursor':
+        try:
+            value, location_id = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            return cls(float(value), int(location_id))
+        except (ValueError, TypeError):
+            raise CursorError('Некорректный курсор') from None
@@ -0,0 +1,58 @@
+from threading import Lock
+from typing import Callable
+
+
+class JsonFragments:
+    """Кеш заранее сериализованных JSON фрагментов статических данных локаций
+
+    Фрагмент - содержимое JSON объекта без фигурных скобок (`"address":"...","latitude":...`),
+    к которому при ответе дописываются поля, зависящие от запроса (distance, timeWait, ...)
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._fragments: dict[int, bytes] = {}
+        self._generation = 0  # растет при каждом discard и clear
+        self._discarded: dict[int, int] = {}  # поколение последнего discard локации
+        self._cleared = 0  # поколение последнего clear
+
+    def generation(self) -> int:
+        """Текущее поколение фрагментов: запомнить до загрузки строк локаций из БД и передать в get"""
+        return self._generation
+
+    def get(self, location_id: int, render: Callable[[], bytes], generation: int | None = None) -> bytes:
+        """Получить фрагмент локации, при отсутствии - сериализовать и сохранить
+
+        Фрагмент не сохраняется, если локация изменилась (discard) после generation: строка, загруженная
+        до изменения, сериализуется для этого ответа, но не остается в кеше устаревшей
+
+        :param location_id: id локации
+        :param render: функция сериализации статических данных локации
+        :param generation: поколение на момент загрузки строки локации (None - текущее)
+        """
+        fragment = self._fragments.get(location_id)
+        if fragment is None:
+            if generation is None:
+                generation = self._generation
+            fragment = render()
+            with self._lock:
+                if self._discarded.get(location_id, self._cleared) <= generation:
+                    self._fragments[location_id] = fragment
+        return fragment
+
+    def discard(self, location_id: int) -> None:
+        """Удалить фрагмент (при изменении статических данных локации)"""
+        with self._lock:
+            self._generation += 1
+            self._discarded[location_id] = self._generation
+            self._fragments.pop(location_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cleared = self._generation
+            self._discarded.clear()
+            self._fragments.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"size": len(self._fragments), "bytes": sum(map(len, self._fragments.values()))}
@@ -0,0 +1,51 @@
+import json
+import re
+from typing import Any, Iterator
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Потоковое чтение JSON файла с массивом на верхнем уровне: элементы разбираются по одному
+
+    Файл читается кусками по chunk_size символов, в памяти держится только недочитанный хвост,
+    поэтому потребление памяти не зависит от размера файла (только от размера одного элемента)
+
+    :param path: путь к файлу
+    :param chunk_size: размер читаемого куска
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as file:
+        buffer, position = "", 0
+        started = False
+        eof = False
+        while not eof:
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            while True:
+                position = _WHITESPACE.match(buffer, position).end()
+                if position == len(buffer):
+                    break
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{path}: ожидается JSON массив")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+                if buffer[position] == ",":
+                    position += 1
+                    continue
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    break  # элемент дочитан не полностью
+                if end == len(buffer) and not eof and not isinstance(item, (dict, list, str)):
+                    break  # число/литерал на границе куска может продолжаться в следующем
+                yield item
+                position = end
+    raise ValueError(f"{path}: неожиданный конец JSON массива")
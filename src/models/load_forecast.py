@@ -0,0 +1,103 @@
+from array import array
+from datetime import datetime
+from math import exp, isnan, nan
+from typing import Iterable, Sequence
+
+_MINUTES_PER_DAY = 24 * 60
+_MINUTES_PER_WEEK = 7 * _MINUTES_PER_DAY
+
+
+class LoadForecast:
+    """Прогноз количества клиентов в офисах по дням недели и слотам времени суток
+
+    Для каждого офиса хранится профиль из 7 * (24 * 60 / slot_minutes) ожидаемых количеств клиентов
+    (при слотах по 15 минут - 7 * 96) в одном плоском массиве float32, поэтому прогноз на время прибытия
+    клиента - это одно обращение по индексу. Чем ближе офис, тем больше вес текущей загруженности:
+    вес count_clients_now убывает экспоненциально со временем в пути (live_horizon минут).
+
+    :param slot_minutes: длительность слота в минутах (делитель 60)
+    :param travel_speed: скорость клиента в км/ч для оценки времени прибытия
+    :param live_horizon: за сколько минут в пути вес текущей загруженности убывает в e раз
+    """
+    def __init__(self, slot_minutes: int = 15, travel_speed: float = 5.0, live_horizon: float = 30.0):
+        self._slot_minutes = slot_minutes
+        self._slots_per_hour = 60 // slot_minutes
+        self._slots_per_week = _MINUTES_PER_WEEK // slot_minutes
+        self._minutes_per_km = 60 / travel_speed
+        self._live_horizon = live_horizon
+        self._profiles: tuple[array, dict[int, int]] = (array("f"), {})  # (профили, офис -> смещение профиля)
+        self.is_built = False
+
+    def build(self, rows: Iterable[Sequence]) -> None:
+        """Построить профили по средней загруженности из истории
+
+        Слот без истории берет значение ближайшего более раннего слота того же часа и дня недели,
+        затем - среднее этого слота по остальным дням недели; если истории нет совсем - прогноза нет
+        (используется текущая загруженность)
+
+        :param rows: (office_id, день недели 0-6 с понедельника, слот суток, среднее количество клиентов)
+        """
+        slots_per_day = self._slots_per_week // 7
+        profiles, offsets = array("f"), {}
+        for office_id, weekday, slot, avg_count in rows:
+            offset = offsets.get(office_id)
+            if offset is None:
+                offset = offsets[office_id] = len(profiles)
+                profiles.extend([nan] * self._slots_per_week)
+            profiles[offset + weekday * slots_per_day + slot] = avg_count
+
+        for offset in offsets.values():
+            for index in range(offset, offset + self._slots_per_week):
+                if isnan(profiles[index]) and (index - offset) % self._slots_per_hour:
+                    profiles[index] = profiles[index - 1]
+            for slot in range(slots_per_day):
+                day_values = [profiles[offset + weekday * slots_per_day + slot] for weekday in range(7)]
+                known = [value for value in day_values if not isnan(value)]
+                if known and len(known) < 7:
+                    mean = sum(known) / len(known)
+                    for weekday, value in enumerate(day_values):
+                        if isnan(value):
+                            profiles[offset + weekday * slots_per_day + slot] = mean
+
+        self._profiles = (profiles, offsets)
+        self.is_built = True
+
+    def week_minute(self, moment: datetime | None = None) -> int:
+        """Начало текущего слота в минутах от понедельника 00:00 (одинаково для всех запросов внутри слота)"""
+        moment = moment or datetime.now()
+        minute = moment.weekday() * _MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+        return minute - minute % self._slot_minutes
+
+    def expected_clients(self, office_id: int, count_clients_now: int, distance: float, week_minute: int) -> float:
+        """Ожидаемое количество клиентов в офисе к моменту прибытия клиента
+
+        :param office_id: офис
+        :param count_clients_now: текущее количество клиентов в офисе
+        :param distance: расстояние до офиса в км
+        :param week_minute: текущее время в минутах от понедельника 00:00 (week_minute())
+        """
+        profiles, offsets = self._profiles
+        offset = offsets.get(office_id)
+        if offset is None:
+            return count_clients_now
+        travel_minutes = distance * self._minutes_per_km
+        slot = int((week_minute + travel_minutes) // self._slot_minutes) % self._slots_per_week
+        forecast = profiles[offset + slot]
+        if isnan(forecast):
+            return count_clients_now
+        live_weight = exp(-travel_minutes / self._live_horizon)
+        return live_weight * count_clients_now + (1 - live_weight) * forecast
+
+    def expected_clients_many(self,
+                              office_ids: Iterable[int],
+                              counts_clients_now: Iterable[int],
+                              distances: Iterable[float],
+                              week_minute: int) -> list[float]:
+        """expected_clients для нескольких офисов"""
+        return [self.expected_clients(office_id, count, distance, week_minute)
+                for office_id, count, distance in zip(office_ids, counts_clients_now, distances)]
+
+    def stats(self) -> dict[str, int | float]:
+        """Количество офисов с профилем и размер массива профилей в байтах"""
+        profiles, offsets = self._profiles
+        return {"offices": len(offsets), "bytes": len(profiles) * profiles.itemsize}
@@ -0,0 +1,117 @@
+from datetime import datetime
+from threading import Lock
+from time import monotonic, perf_counter
+from typing import Callable
+
+from ..app.exceptions import BaseApiException
+
+
+class OccupancyError(BaseApiException):
+    """Ошибка приема событий загруженности офисов"""
+
+
+class OccupancyBuffer:
+    """Буфер отложенной записи загруженности офисов (write-behind)
+
+    События терминалов электронной очереди складываются в память: для каждого офиса остается только
+    последнее событие (по времени события), поэтому поток событий превращается в одну запись на офис
+    за период сброса. Сброс записывает накопленное одной транзакцией. Пока событие не записано в БД,
+    поиск берет количество клиентов из буфера (current), а не из БД.
+
+    :param max_pending: сколько офисов может ждать записи; события новых офисов сверх этого отклоняются
+        (БД не успевает за потоком событий)
+    """
+    def __init__(self, max_pending: int = 10_000):
+        self._max_pending = max_pending
+        self._lock = Lock()
+        self._pending: dict[int, tuple[int, datetime]] = {}  # офис -> (количество клиентов, время события)
+        self._latest: dict[int, int] = {}  # офис -> количество клиентов, еще не видимое в БД
+        self._oldest_pending: float | None = None  # когда принято самое старое незаписанное событие
+        self._stats = {
+            "events": 0, "coalesced": 0, "stale": 0, "rejected": 0,
+            "flushes": 0, "flushed": 0, "failed_flushes": 0,
+            "last_flush_ms": 0.0, "max_flush_ms": 0.0, "last_lag_ms": 0.0, "max_lag_ms": 0.0,
+        }
+
+    def put(self, office_id: int, count_clients: int, dt: datetime) -> bool:
+        """Принять событие загруженности офиса
+
+        Событие старше еще не записанного события этого офиса игнорируется (терминал прислал его с опозданием)
+
+        :return: False - буфер переполнен, событие не принято
+        """
+        with self._lock:
+            pending = self._pending.get(office_id)
+            if pending is None and len(self._pending) >= self._max_pending:
+                self._stats["rejected"] += 1
+                return False
+            self._stats["events"] += 1
+            if pending is not None:
+                self._stats["coalesced"] += 1
+                if pending[1] > dt:
+                    self._stats["stale"] += 1
+                    return True
+            elif not self._pending:
+                self._oldest_pending = monotonic()
+            self._pending[office_id] = (count_clients, dt)
+            self._latest[office_id] = count_clients
+            return True
+
+    def current(self, office_id: int, count_clients_now: int) -> int:
+        """Количество клиентов в офисе с учетом еще не записанных событий
+
+        :param count_clients_now: значение из БД
+        """
+        return self._latest.get(office_id, count_clients_now)
+
+    def flush(self, write: Callable[[dict[int, tuple[int, datetime]]], None]) -> int:
+        """Записать накопленные события
+
+        Во время записи новые события продолжают приниматься в пустой буфер.
+        При ошибке записи события возвращаются в буфер (кроме тех, что успели замениться более новыми)
+
+        :param write: запись пачки {офис: (количество клиентов, время события)} в БД одной транзакцией
+        :return: количество записанных офисов
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            oldest_pending, self._oldest_pending = self._oldest_pending, None
+        if not batch:
+            return 0
+
+        start = perf_counter()
+        try:
+            write(batch)
+        except Exception:
+            with self._lock:
+                for office_id, event in batch.items():
+                    self._pending.setdefault(office_id, event)
+                self._oldest_pending = oldest_pending
+                self._stats["failed_flushes"] += 1
+            raise
+        flush_ms = (perf_counter() - start) * 1000
+        lag_ms = (monotonic() - oldest_pending) * 1000
+
+        with self._lock:
+            for office_id, (count_clients, _) in batch.items():
+                # значение уже в БД, если после сброса по офису не было новых событий
+                if office_id not in self._pending and self._latest.get(office_id) == count_clients:
+                    del self._latest[office_id]
+            self._stats["flushes"] += 1
+            self._stats["flushed"] += len(batch)
+            self._stats["last_flush_ms"] = flush_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], flush_ms)
+            self._stats["last_lag_ms"] = lag_ms
+            self._stats["max_lag_ms"] = max(self._stats["max_lag_ms"], lag_ms)
+        return len(batch)
+
+    def stats(self) -> dict[str, int | float]:
+        """Счетчики событий и сбросов, размер буфера, длительность сброса и задержка записи
+        (сколько самое старое событие пачки ждало записи) в мс
+        """
+        with self._lock:
+            return {
+                **self._stats,
+                "pending": len(self._pending),
+                "pending_age_ms": (monotonic() - self._oldest_pending) * 1000 if self._oldest_pending else 0.0,
+            }
@@ -0,0 +1,186 @@
+import asyncio
+from math import pi
+from threading import Lock
+from typing import Iterable, NamedTuple
+
+from .spatial_index import EARTH_RADIUS, bounding_box, haversine
+
+
+class OfficeState(NamedTuple):
+    """Данные офиса, нужные подписчикам для расчета time_wait"""
+    latitude: float
+    longitude: float
+    avg_service_time: int
+    count_clients_now: int
+
+
+class Subscription:
+    """Подписка на изменения загруженности офисов в области карты (круг радиуса radius км)
+
+    Изменения копятся в словаре офис -> количество клиентов, поэтому медленный подписчик получает
+    только последнее значение по каждому офису, а память подписки ограничена количеством офисов в области
+    """
+    def __init__(self, hub: "OccupancyHub", latitude: float, longitude: float, radius: float,
+                 cells: list[tuple[int, int]] | None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius = radius
+        self.cells = cells  # None - область слишком большая, подписка на все офисы
+        self._hub = hub
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._pending: dict[int, int] = {}
+        self._notified = False
+
+    def covers(self, latitude: float, longitude: float) -> bool:
+        return haversine(self.latitude, self.longitude, latitude, longitude) <= self.radius
+
+    async def changes(self, timeout: float) -> dict[int, int]:
+        """Дождаться изменений (не дольше timeout секунд) и забрать их
+
+        :return: {офис: количество клиентов} (пустой - изменений не было)
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        with self._hub._lock:
+            changes, self._pending = self._pending, {}
+            self._notified = False
+            self._changed.clear()
+        return changes
+
+    def _push(self, office_id: int, count_clients_now: int) -> None:
+        """Добавить изменение (вызывается под блокировкой хаба из любого потока)"""
+        self._pending[office_id] = count_clients_now
+        if not self._notified:
+            self._notified = True
+            self._loop.call_soon_threadsafe(self._changed.set)
+
+
+class OccupancyHub:
+    """Рассылка изменений загруженности офисов подписчикам по ячейкам карты (pub/sub внутри процесса)
+
+    Подписка регистрируется во всех ячейках сетки cell_size x cell_size градусов, которые пересекает
+    ее область, поэтому изменение офиса проверяется только у подписчиков его ячейки, без запросов к БД.
+    Подписки на области больше max_cells ячеек получают изменения всех офисов (с проверкой расстояния).
+
+    :param cell_size: размер ячейки сетки в градусах
+    :param max_cells: в скольких ячейках подписка может быть зарегистрирована
+    :param max_subscribers: максимальное количество подписок
+    """
+    def __init__(self, cell_size: float = 0.1, max_cells: int = 1024, max_subscribers: int = 10_000):
+        self._cell_size = cell_size
+        self._max_cells = max_cells
+        self._max_subscribers = max_subscribers
+        self._lock = Lock()
+        self._offices: dict[int, OfficeState] = {}
+        self._cells: dict[tuple[int, int], set[Subscription]] = {}
+        self._everywhere: set[Subscription] = set()
+        self._subscriptions: set[Subscription] = set()
+        self._stats = {"published": 0, "deliveries": 0, "rejected": 0}
+
+    def build(self, offices: Iterable[tuple[int, float, float, int, int]]) -> None:
+        """Загрузить офисы
+
+        :param offices: итератор (id, широта, долгота, avg_service_time, count_clients_now)
+        """
+        all_offices = {office_id: OfficeState(*state) for office_id, *state in offices}
+        with self._lock:
+            self._offices = all_offices
+
+    def upsert(self, office_id: int, latitude: float, longitude: float,
+               avg_service_time: int, count_clients_now: int) -> None:
+        """Добавить или обновить офис (подписчики получат изменение загруженности)"""
+        with self._lock:
+            previous = self._offices.get(office_id)
+            self._offices[office_id] = OfficeState(latitude, longitude, avg_service_time, count_clients_now)
+            if previous is None or previous.count_clients_now != count_clients_now:
+                self._publish(office_id, count_clients_now)
+
+    def remove(self, office_id: int) -> None:
+        with self._lock:
+            self._offices.pop(office_id, None)
+
+    def publish(self, office_id: int, count_clients_now: int) -> None:
+        """Разослать новое количество клиентов в офисе подписчикам, в области которых он находится"""
+        with self._lock:
+            state = self._offices.get(office_id)
+            if state is None or state.count_clients_now == count_clients_now:
+                return
+            self._offices[office_id] = state._replace(count_clients_now=count_clients_now)
+            self._publish(office_id, count_clients_now)
+
+    def office(self, office_id: int) -> OfficeState | None:
+        return self._offices.get(office_id)
+
+    def subscribe(self, latitude: float, longitude: float, radius: float) -> Subscription | None:
+        """Подписаться на изменения в круге (вызывается из event loop, в нем же читаются изменения)
+
+        :return: подписка (None - превышено максимальное количество подписок)
+        """
+        cells = self._covered_cells(latitude, longitude, radius)
+        subscription = Subscription(self, latitude, longitude, radius, cells)
+        with self._lock:
+            if len(self._subscriptions) >= self._max_subscribers:
+                self._stats["rejected"] += 1
+                return None
+            self._subscriptions.add(subscription)
+            if cells is None:
+                self._everywhere.add(subscription)
+            for key in cells or ():
+                self._cells.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Отменить подписку (повторная отмена ничего не делает)"""
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.remove(subscription)
+            self._everywhere.discard(subscription)
+            for key in subscription.cells or ():
+                subscribers = self._cells.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._cells[key]
+
+    def snapshot(self, subscription: Subscription) -> dict[int, OfficeState]:
+        """Текущее состояние всех офисов в области подписки"""
+        with self._lock:
+            offices = list(self._offices.items())
+        return {office_id: state for office_id, state in offices
+                if subscription.covers(state.latitude, state.longitude)}
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            return {
+                **self._stats,
+                "subscribers": len(self._subscriptions),
+                "everywhere_subscribers": len(self._everywhere),
+                "cells": len(self._cells),
+            }
+
+    def _publish(self, office_id: int, count_clients_now: int) -> None:
+        state = self._offices[office_id]
+        self._stats["published"] += 1
+        for subscribers in (self._cells.get(self._cell(state.latitude, state.longitude), ()), self._everywhere):
+            for subscription in subscribers:
+                if subscription.covers(state.latitude, state.longitude):
+                    subscription._push(office_id, count_clients_now)
+                    self._stats["deliveries"] += 1
+
+    def _covered_cells(self, latitude: float, longitude: float, radius: float) -> list[tuple[int, int]] | None:
+        """Ячейки, которые пересекает круг (None - если их больше max_cells)"""
+        if radius >= pi * EARTH_RADIUS:
+            return None
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius)
+        min_row, min_col = self._cell(min_latitude, min_longitude)
+        max_row, max_col = self._cell(max_latitude, max_longitude)
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > self._max_cells:
+            return None
+        return [(row, col) for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)]
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        return int(latitude // self._cell_size), int(longitude // self._cell_size)
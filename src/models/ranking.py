@@ -0,0 +1,202 @@
+from threading import Lock
+from typing import Any, Callable, Iterable, Mapping
+
+try:
+    import numpy as np
+except ImportError:  # движок ранжирования опционален, без numpy используется SQL
+    np = None
+
+from .capabilities import capabilities_mask
+from .spatial_index import EARTH_RADIUS
+
+
+class RankingEngine:
+    """Векторизованное ранжирование локаций (банкоматов/офисов) с помощью NumPy
+
+    Координаты, рейтинг, показатели загруженности и услуги всех локаций хранятся в массивах.
+    Расстояние, time_wait и фильтры считаются за один векторизованный проход,
+    лучшие результаты выбираются через argpartition. Под блокировкой массивов только отбор кандидатов:
+    прогноз загруженности и время в пути по дорогам (медленные) не задерживают update и другие запросы.
+
+    :param flags: возможности локаций в порядке битов маски capabilities (ATM_CAPABILITIES / OFFICE_CAPABILITIES)
+    :param with_queue: учитывать ли очередь (avg_service_time, count_clients_now) - сортировка по time_wait
+    """
+    # Массивы, которые меняются с каждым событием загруженности: их изменение не меняет версию массивов
+    LIVE_ARRAYS = ("count_clients_now",)
+
+    def __init__(self, flags: tuple[str, ...], with_queue: bool = False):
+        self._flags = tuple(flags)
+        self._with_queue = with_queue
+        self._lock = Lock()
+        self._positions: dict[int, int] = {}
+        self._arrays: dict[str, Any] = {}
+        self.is_built = False
+        self.version = 0  # растет при построении и изменении массивов, кроме LIVE_ARRAYS
+
+    @staticmethod
+    def is_available() -> bool:
+        """Установлен ли NumPy"""
+        return np is not None
+
+    def build(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        """Построить массивы по данным локаций
+
+        :param rows: данные локаций: id, latitude, longitude, avg_rating, маска возможностей capabilities
+            и (для офисов) avg_service_time, count_clients_now
+        """
+        rows = list(rows)
+        arrays = {
+            "id": np.array([row["id"] for row in rows], dtype=np.int64),
+            "latitude": np.radians(np.array([row["latitude"] for row in rows], dtype=np.float64)),
+            "longitude": np.radians(np.array([row["longitude"] for row in rows], dtype=np.float64)),
+            "avg_rating": np.array(
+                [-1 if row["avg_rating"] is None else row["avg_rating"] for row in rows], dtype=np.int64
+            ),
+            "flags": np.array([row["capabilities"] for row in rows], dtype=np.int64),
+        }
+        if self._with_queue:
+            arrays["avg_service_time"] = np.array([row["avg_service_time"] for row in rows], dtype=np.int64)
+            arrays["count_clients_now"] = np.array([row["count_clients_now"] for row in rows], dtype=np.int64)
+
+        with self._lock:
+            self._arrays = arrays
+            self._positions = {location_id: position for position, location_id in enumerate(arrays["id"].tolist())}
+            self.is_built = True
+            self.version += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """Копия массивов и настроек движка (передается в другие процессы, см. from_snapshot)"""
+        with self._lock:
+            arrays = {name: values.copy() for name, values in self._arrays.items()}
+            version = self.version
+        return {"flags": self._flags, "with_queue": self._with_queue, "version": version, "arrays": arrays}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Mapping[str, Any]) -> "RankingEngine":
+        """Движок по копии, полученной snapshot"""
+        engine = cls(flags=snapshot["flags"], with_queue=snapshot["with_queue"])
+        engine._arrays = snapshot["arrays"]
+        engine.version = snapshot["version"]
+        engine._positions = {location_id: position
+                             for position, location_id in enumerate(engine._arrays["id"].tolist())}
+        engine.is_built = True
+        return engine
+
+    def update(self, location_id: int, values: Mapping[str, Any]) -> None:
+        """Обновить значения локации (например, count_clients_now) без перестроения массивов"""
+        with self._lock:
+            position = self._positions.get(location_id)
+            if position is None:
+                return
+            for name, value in values.items():
+                if name in ("latitude", "longitude"):
+                    value = np.radians(value)
+                elif name == "avg_rating":
+                    value = -1 if value is None else value
+                elif name not in self._arrays:
+                    continue
+                if name not in self.LIVE_ARRAYS and self._arrays[name][position] != value:
+                    self.version += 1
+                self._arrays[name][position] = value
+
+    def replace_live(self, arrays: Mapping[str, Any]) -> None:
+        """Заменить массивы LIVE_ARRAYS копией из snapshot движка той же версии (в процессах пула)"""
+        with self._lock:
+            self._arrays.update((name, arrays[name]) for name in self.LIVE_ARRAYS if name in self._arrays)
+
+    def invalidate(self) -> None:
+        """Пометить массивы устаревшими (при добавлении/удалении локаций), будут перестроены при запросе"""
+        self.is_built = False
+
+    def rank(self,
+             filter_data: Mapping[str, Any],
+             radius: float,
+             limit: int | None = None,
+             after: tuple[float, int] | None = None,
+             expected_clients: Callable[[Any, Any, Any], Iterable[float]] | None = None,
+             travel_minutes: Callable[[Any, Any], Iterable[float]] | None = None,
+             location_ids: Iterable[int] | None = None,
+             ) -> tuple[list[int], list[float], list[int] | None]:
+        """Отфильтровать и отсортировать локации по (distance или time_wait, id)
+
+        :param filter_data: фильтры поиска (FindATMFilter / FindOfficesFilter)
+        :param radius: радиус поиска в км
+        :param limit: сколько лучших локаций вернуть (None - все)
+        :param after: (значение ключа сортировки, id) последней локации предыдущей страницы
+        :param expected_clients: количество клиентов для time_wait по (id, count_clients_now, distance)
+            кандидатов вместо count_clients_now (прогноз загруженности)
+        :param travel_minutes: время в пути по (широта, долгота) кандидатов в градусах - входит в time_wait
+            вместо расстояния
+        :param location_ids: кандидаты из пространственного индекса (None - проверяются все локации)
+        :return: id локаций, расстояния до них от базовых координат и time_wait (только для офисов)
+        """
+        with self._lock:
+            arrays = self._arrays
+            if location_ids is not None:
+                positions = self._positions
+                selected = np.fromiter((positions[location_id] for location_id in location_ids
+                                        if location_id in positions), dtype=np.int64)
+                arrays = {name: values[selected] for name, values in arrays.items()}
+            latitude, longitude = arrays["latitude"], arrays["longitude"]
+
+            mask = self._distance(latitude, longitude, filter_data["latitude"], filter_data["longitude"]) \
+                <= radius
+            if filter_data["avg_rating"]:
+                mask &= arrays["avg_rating"] >= filter_data["avg_rating"]
+            required_flags = capabilities_mask(self._flags, filter_data)
+            if required_flags:
+                mask &= (arrays["flags"] & required_flags) == required_flags
+            if self._with_queue:
+                if filter_data.get("avg_service_time"):
+                    mask &= arrays["avg_service_time"] <= filter_data["avg_service_time"]
+                if filter_data.get("count_clients_now"):
+                    mask &= arrays["count_clients_now"] <= filter_data["count_clients_now"]
+
+            # копии значений кандидатов: прогноз и время в пути ниже считаются без блокировки
+            candidates = np.flatnonzero(mask)
+            latitude, longitude, ids = latitude[candidates], longitude[candidates], arrays["id"][candidates]
+            if self._with_queue:
+                avg_service_time = arrays["avg_service_time"][candidates]
+                clients = arrays["count_clients_now"][candidates]
+
+        distance = self._distance(latitude, longitude,
+                                  filter_data["initial_latitude"], filter_data["initial_longitude"])
+        time_wait = None
+        if self._with_queue:
+            if expected_clients is not None:
+                clients = np.fromiter(expected_clients(ids.tolist(), clients.tolist(), distance.tolist()),
+                                      dtype=np.float64, count=len(ids))
+            travel = distance
+            if travel_minutes is not None:
+                travel = np.fromiter(travel_minutes(np.degrees(latitude).tolist(), np.degrees(longitude).tolist()),
+                                     dtype=np.float64, count=len(ids))
+            time_wait = (travel + avg_service_time * clients).astype(np.int64)
+
+        sort_key = time_wait if time_wait is not None else distance
+        if after is not None:
+            after_value, after_id = after
+            rest = np.flatnonzero((sort_key > after_value) | ((sort_key == after_value) & (ids > after_id)))
+            ids, distance, sort_key = ids[rest], distance[rest], sort_key[rest]
+            time_wait = time_wait[rest] if time_wait is not None else None
+
+        if limit is not None and limit < len(ids):
+            # все локации со значением ключа не больше k-го, чтобы при равенстве ключей порядок определял id
+            kth_value = sort_key[np.argpartition(sort_key, limit - 1)[limit - 1]]
+            top = np.flatnonzero(sort_key <= kth_value)
+        else:
+            top = np.arange(len(ids))
+        order = top[np.lexsort((ids[top], sort_key[top]))][:limit]
+
+        return (
+            ids[order].tolist(),
+            distance[order].tolist(),
+            time_wait[order].tolist() if time_wait is not None else None
+        )
+
+    @staticmethod
+    def _distance(latitude, longitude, point_latitude: float, point_longitude: float):
+        """Расстояние (haversine) от массивов координат (в радианах) до точки (в градусах), в км"""
+        point_latitude, point_longitude = np.radians(point_latitude), np.radians(point_longitude)
+        a = np.sin((latitude - point_latitude) / 2) ** 2 + \
+            np.cos(latitude) * np.cos(point_latitude) * np.sin((longitude - point_longitude) / 2) ** 2
+        return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
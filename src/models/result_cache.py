@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Hashable, Iterable
+
+
+class ResultCache:
+    """LRU кеш результатов с временем жизни записей и точечной инвалидацией по тегам
+
+    Каждая запись помечается тегами (например, ("office", 12) - в результате есть офис 12),
+    при изменении данных инвалидируются только записи с соответствующим тегом.
+
+    :param max_size: максимальное количество записей (самые давно используемые вытесняются)
+    :param ttl: время жизни записи в секундах
+    """
+    def __init__(self, max_size: int = 1024, ttl: float = 30.0):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = Lock()
+        self._entries: OrderedDict[Hashable, tuple[float, Any, frozenset]] = OrderedDict()
+        self._tags: dict[Hashable, set[Hashable]] = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def get(self, key: Hashable) -> Any | None:
+        """Получить результат из кеша (None - если нет или устарел)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, value, _ = entry
+            if expires_at < monotonic():
+                self._delete(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[Hashable] = ()) -> None:
+        """Сохранить результат в кеш
+
+        :param key: ключ записи
+        :param value: результат
+        :param tags: теги записи для инвалидации
+        """
+        tags = frozenset(tags)
+        with self._lock:
+            if key in self._entries:
+                self._delete(key)
+            self._entries[key] = (monotonic() + self._ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self._max_size:
+                self._delete(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, tag: Hashable) -> None:
+        """Удалить все записи с тегом"""
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._delete(key)
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        """Удалить все записи"""
+        with self._lock:
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """Счетчики попаданий/промахов и размер кеша"""
+        with self._lock:
+            requests = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "hit_ratio": self._stats["hits"] / requests if requests else 0.0,
+            }
+
+    def _delete(self, key: Hashable) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
@@ -0,0 +1,370 @@
+from array import array
+from functools import lru_cache
+from heapq import heappop, heappush
+import json
+from math import cos, hypot, inf, pi, radians
+import sys
+from threading import Lock
+from typing import BinaryIO, Iterable, Literal
+
+from .spatial_index import EARTH_RADIUS, SpatialIndex, haversine
+
+TravelMode = Literal["walk", "drive"]
+
+WALK = 1  # по ребру можно пройти пешком
+DRIVE = 2  # по ребру можно проехать на автомобиле
+
+_MAGIC = b"ROADGRAPH1\n"
+
+# Скорость движения на автомобиле (км/ч) по типам дорог OSM (тег highway), остальные дороги - только пешком
+DRIVE_SPEEDS = {
+    "motorway": 90, "motorway_link": 60, "trunk": 70, "trunk_link": 50, "primary": 50, "primary_link": 40,
+    "secondary": 45, "secondary_link": 35, "tertiary": 40, "tertiary_link": 30, "unclassified": 30,
+    "residential": 25, "living_street": 10, "service": 15,
+}
+# Дороги, по которым нельзя ходить пешком
+_NO_WALK = {"motorway", "motorway_link", "trunk", "trunk_link"}
+
+
+class RoadGraph:
+    """Граф дорог для расчета времени в пути пешком и на автомобиле без обращения к внешним сервисам
+
+    Граф хранится в компактных массивах (CSR): для узла i его исходящие ребра - это
+    targets[offsets[i]:offsets[i + 1]], у каждого ребра длина в метрах, скорость на автомобиле и флаги
+    WALK/DRIVE (односторонние дороги на автомобиле проезжаются только в одну сторону).
+    Файл графа готовится заранее из выгрузки OSM (from_geojson + save) и загружается при старте.
+
+    Маршрут ищется двунаправленным A* с усредненным потенциалом (по расстоянию по прямой
+    при максимальной скорости), поэтому просматривается только окрестность прямой между точками.
+    Время от одного узла до многих считается одним возобновляемым поиском Дейкстры (sweep).
+    Точки на карте привязываются к ближайшему узлу графа (nearest_node).
+
+    :param walk_speed: скорость пешком в км/ч
+    :param snap_distance: на каком максимальном расстоянии (км) от точки искать узел графа
+    """
+    def __init__(self, walk_speed: float = 5.0, snap_distance: float = 0.5):
+        self._walk_speed = walk_speed
+        self._snap_distance = snap_distance
+        self._latitudes = array("d")
+        self._longitudes = array("d")
+        self._offsets = array("I", [0])
+        self._targets = array("I")
+        self._lengths = array("f")  # метры
+        self._speeds = array("B")  # км/ч на автомобиле
+        self._flags = array("B")
+        self._reverse: tuple[array, array, array] = (array("I", [0]), array("I"), array("I"))
+        # способ передвижения -> (минуты по ребрам, они же в порядке обратных ребер, максимальная скорость)
+        self._weights: dict[str, tuple[array, array, float]] = {}
+        self._xs, self._ys = array("d"), array("d")  # проекция узлов на плоскость в км (для оценки A*)
+        self._nodes_index = SpatialIndex(cell_size=0.005)
+        self._snap = lru_cache(maxsize=65536)(self._snap_uncached)
+        self._stats = {"routes": 0, "settled": 0}
+        self.is_built = False
+
+    @classmethod
+    def from_edges(cls,
+                   nodes: Iterable[tuple[float, float]],
+                   edges: Iterable[tuple[int, int, float, int, int]],
+                   **kwargs) -> "RoadGraph":
+        """Построить граф по узлам и ребрам
+
+        :param nodes: координаты узлов (широта, долгота), индекс в последовательности - номер узла
+        :param edges: направленные ребра (из узла, в узел, длина в метрах, скорость на автомобиле в км/ч, флаги)
+        """
+        graph = cls(**kwargs)
+        for latitude, longitude in nodes:
+            graph._latitudes.append(latitude)
+            graph._longitudes.append(longitude)
+        node_edges: list[list[tuple[int, float, int, int]]] = [[] for _ in range(len(graph._latitudes))]
+        for source, target, length, speed, flags in edges:
+            node_edges[source].append((target, length, speed, flags))
+        for outgoing in node_edges:
+            for target, length, speed, flags in outgoing:
+                graph._targets.append(target)
+                graph._lengths.append(length)
+                graph._speeds.append(speed)
+                graph._flags.append(flags)
+            graph._offsets.append(len(graph._targets))
+        graph._prepare()
+        return graph
+
+    @classmethod
+    def from_geojson(cls, features: Iterable[dict], **kwargs) -> "RoadGraph":
+        """Построить граф по линиям дорог GeoJSON (например, `osmium export` выгрузки OSM)
+
+        Учитываются LineString с тегом highway; узлы - точки линий (совпадающие координаты - один узел),
+        тег oneway=yes/-1 ограничивает направление движения на автомобиле
+        """
+        node_ids: dict[tuple[float, float], int] = {}
+        nodes: list[tuple[float, float]] = []
+        edges: list[tuple[int, int, float, int, int]] = []
+
+        def node(longitude: float, latitude: float) -> int:
+            key = (round(latitude, 7), round(longitude, 7))
+            node_id = node_ids.get(key)
+            if node_id is None:
+                node_id = node_ids[key] = len(nodes)
+                nodes.append(key)
+            return node_id
+
+        for feature in features:
+            geometry, properties = feature.get("geometry") or {}, feature.get("properties") or {}
+            highway = properties.get("highway")
+            if geometry.get("type") != "LineString" or not highway:
+                continue
+            speed = DRIVE_SPEEDS.get(highway, 0)
+            forward = (0 if highway in _NO_WALK else WALK) | (DRIVE if speed else 0)
+            oneway = properties.get("oneway")
+            backward = forward & ~DRIVE if oneway in ("yes", "true", "1") else forward
+            if oneway == "-1":
+                forward, backward = forward & ~DRIVE, forward
+            points = [node(*coordinates[:2]) for coordinates in geometry["coordinates"]]
+            for source, target in zip(points, points[1:]):
+                if source == target:
+                    continue
+                length = haversine(*nodes[source], *nodes[target]) * 1000
+                if forward:
+                    edges.append((source, target, length, speed, forward))
+                if backward:
+                    edges.append((target, source, length, speed, backward))
+        return cls.from_edges(nodes, edges, **kwargs)
+
+    def save(self, file: BinaryIO) -> None:
+        """Записать граф в файл (бинарный формат, массивы в порядке байтов little-endian)"""
+        file.write(_MAGIC)
+        for values in (array("I", [len(self._latitudes), len(self._targets)]), *self._arrays()):
+            if sys.byteorder != "little":
+                values = array(values.typecode, values)
+                values.byteswap()
+            values.tofile(file)
+
+    def load(self, file: BinaryIO) -> None:
+        """Загрузить граф из файла, записанного save"""
+        if file.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError("Неизвестный формат файла графа дорог")
+        counts = array("I")
+        counts.fromfile(file, 2)
+        if sys.byteorder != "little":
+            counts.byteswap()
+        node_count, edge_count = counts
+        arrays = []
+        for values, size in zip(self._empty_arrays(), (node_count, node_count, node_count + 1) + (edge_count,) * 4):
+            values.fromfile(file, size)
+            if sys.byteorder != "little":
+                values.byteswap()
+            arrays.append(values)
+        (self._latitudes, self._longitudes, self._offsets, self._targets,
+         self._lengths, self._speeds, self._flags) = arrays
+        self._prepare()
+
+    def route_minutes(self, source: int, target: int, mode: TravelMode) -> float | None:
+        """Время в пути в минутах между узлами графа (None - маршрута нет)
+
+        Двунаправленный Дейкстра по ребрам с приведенными весами w(u, v) - p(u) + p(v),
+        p(v) = (h_t(v) - h_s(v)) / 2 (h - время по прямой при максимальной скорости, оценка снизу).
+        Приведенные веса неотрицательны и одинаковы для прямого и обратного поиска, длина любого пути
+        из source в target меняется на одну и ту же константу p(target) - p(source)
+        """
+        self._stats["routes"] += 1
+        if source == target:
+            return 0.0
+        forward_weights, reverse_weights, max_speed = self._weights[mode]
+        xs, ys = self._xs, self._ys
+        source_x, source_y, target_x, target_y = xs[source], ys[source], xs[target], ys[target]
+        minutes_per_km = 60 / max_speed / 2
+        potentials: dict[int, float] = {}
+
+        def potential(node: int) -> float:
+            value = potentials.get(node)
+            if value is None:
+                x, y = xs[node], ys[node]
+                value = potentials[node] = minutes_per_km * (
+                    hypot(x - target_x, y - target_y) - hypot(x - source_x, y - source_y)
+                )
+            return value
+
+        reverse_offsets, reverse_sources, _ = self._reverse
+        forward = (self._offsets, self._targets, forward_weights, 1.0, {source: 0.0}, [(0.0, source)])
+        reverse = (reverse_offsets, reverse_sources, reverse_weights, -1.0, {target: 0.0}, [(0.0, target)])
+        best = inf
+        settled = 0
+        while forward[5] and reverse[5]:
+            forward_top, reverse_top = forward[5][0][0], reverse[5][0][0]
+            if forward_top + reverse_top >= best:
+                break
+            search, other = (forward, reverse) if forward_top <= reverse_top else (reverse, forward)
+            offsets, neighbours, weights, sign, distances, heap = search
+            other_distances = other[4]
+            distance, node = heappop(heap)
+            if distance > distances[node]:
+                continue
+            settled += 1
+            node_potential = potential(node)
+            for index in range(offsets[node], offsets[node + 1]):
+                weight = weights[index]
+                if weight == inf:
+                    continue
+                neighbour = neighbours[index]
+                # прямой поиск идет по ребру node -> neighbour, обратный - по ребру neighbour -> node
+                new_distance = distance + weight + sign * (potential(neighbour) - node_potential)
+                if new_distance < distances.get(neighbour, inf):
+                    distances[neighbour] = new_distance
+                    heappush(heap, (new_distance, neighbour))
+                    other_distance = other_distances.get(neighbour)
+                    if other_distance is not None and new_distance + other_distance < best:
+                        best = new_distance + other_distance
+        self._stats["settled"] += settled
+        if best == inf:
+            return None
+        return best - (potential(target) - potential(source))
+
+    def sweep(self, source: int, mode: TravelMode) -> "Sweep":
+        """Поиск от узла source до всех узлов графа, который продвигается по мере запросов (Sweep.minutes_to)"""
+        return Sweep(self._offsets, self._targets, self._weights[mode][0], source)
+
+    def nearest_node(self, latitude: float, longitude: float) -> tuple[int, float] | None:
+        """Ближайший узел графа не дальше snap_distance: (узел, расстояние в км)"""
+        return self._snap(latitude, longitude)
+
+    def node_coordinates(self, node: int) -> tuple[float, float]:
+        return self._latitudes[node], self._longitudes[node]
+
+    def stats(self) -> dict[str, int | float]:
+        """Размер графа (узлы, ребра, байты массивов) и счетчики маршрутов"""
+        memory = sum(values.itemsize * len(values) for values in (
+            *self._arrays(), *self._reverse, self._xs, self._ys,
+            *(weights for forward, reverse, _ in self._weights.values() for weights in (forward, reverse))
+        ))
+        return {
+            **self._stats,
+            "nodes": len(self._latitudes),
+            "edges": len(self._targets),
+            "bytes": memory,
+        }
+
+    def _arrays(self) -> tuple[array, ...]:
+        return (self._latitudes, self._longitudes, self._offsets, self._targets,
+                self._lengths, self._speeds, self._flags)
+
+    @staticmethod
+    def _empty_arrays() -> tuple[array, ...]:
+        return array("d"), array("d"), array("I"), array("I"), array("f"), array("B"), array("B")
+
+    def _prepare(self) -> None:
+        """Обратные ребра (для обратного поиска), веса ребер в минутах по способам передвижения и индекс узлов"""
+        node_count, edge_count = len(self._latitudes), len(self._targets)
+        incoming: list[list[tuple[int, int]]] = [[] for _ in range(node_count)]
+        for node in range(node_count):
+            for index in range(self._offsets[node], self._offsets[node + 1]):
+                incoming[self._targets[index]].append((node, index))
+        reverse_offsets, reverse_sources, reverse_edges = array("I", [0]), array("I"), array("I")
+        for edges in incoming:
+            for source, index in edges:
+                reverse_sources.append(source)
+                reverse_edges.append(index)
+            reverse_offsets.append(len(reverse_sources))
+
+        walk_minutes = 60 / 1000 / self._walk_speed
+        walk = array("f", (
+            length * walk_minutes if flags & WALK else inf for length, flags in zip(self._lengths, self._flags)
+        ))
+        drive = array("f", (
+            length * 60 / 1000 / speed if flags & DRIVE and speed else inf
+            for length, speed, flags in zip(self._lengths, self._speeds, self._flags)
+        ))
+        max_drive_speed = max((speed for speed, flags in zip(self._speeds, self._flags) if flags & DRIVE), default=1)
+
+        nodes_index = SpatialIndex(cell_size=0.005)
+        nodes_index.build(zip(range(node_count), self._latitudes, self._longitudes))
+
+        self._reverse = (reverse_offsets, reverse_sources, reverse_edges)
+        self._weights = {
+            mode: (weights, array("f", (weights[index] for index in reverse_edges)), max_speed)
+            for mode, weights, max_speed in (("walk", walk, self._walk_speed), ("drive", drive, max_drive_speed))
+        }
+        # равнопромежуточная проекция: по долготе масштаб самой дальней от экватора широты графа
+        # и небольшой запас, поэтому расстояние на плоскости не больше длины ребра (оценка A* снизу)
+        km_per_degree = pi * EARTH_RADIUS / 180 * 0.995
+        longitude_scale = km_per_degree * cos(radians(max(map(abs, self._latitudes), default=0.0)))
+        self._xs = array("d", (longitude * longitude_scale for longitude in self._longitudes))
+        self._ys = array("d", (latitude * km_per_degree for latitude in self._latitudes))
+        self._nodes_index = nodes_index
+        self._snap.cache_clear()
+        self.is_built = edge_count > 0
+
+    def _snap_uncached(self, latitude: float, longitude: float) -> tuple[int, float] | None:
+        if not self.is_built:
+            return None
+        return self._nodes_index.nearest(latitude, longitude, self._snap_distance)
+
+
+class Sweep:
+    """Возобновляемый поиск Дейкстры от одного узла графа
+
+    Узлы просматриваются в порядке возрастания времени в пути, поиск останавливается, как только
+    просмотрены все запрошенные узлы или время достигло границы запроса, и продолжается с того же места
+    при следующем запросе. Поэтому время до любого количества узлов стоит один проход по окрестности source
+    радиусом до самого дальнего из них, а повторные запросы к уже просмотренным узлам - поиск в словаре.
+    Граница не дает недостижимому узлу (другая компонента графа) запустить просмотр всей компоненты source.
+    """
+    def __init__(self, offsets: array, targets: array, weights: array, source: int):
+        self.source = source
+        self._offsets = offsets
+        self._targets = targets
+        self._weights = weights
+        self._settled: dict[int, float] = {}
+        self._distances: dict[int, float] = {source: 0.0}  # еще не просмотренные узлы
+        self._heap = [(0.0, source)]
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        """Количество просмотренных узлов"""
+        return len(self._settled)
+
+    def minutes_to(self, nodes: list[int], max_minutes: float = inf) -> tuple[list[float | None], int]:
+        """Время в пути в минутах до узлов (None - маршрута нет или он дольше max_minutes)
+
+        :param max_minutes: дальше какого времени в пути узлы не просматриваются
+        :return: (время до узлов, сколько узлов просмотрено за этот запрос)
+        """
+        with self._lock:
+            settled = self._settled
+            pending = {node for node in nodes if node not in settled}
+            count = len(settled)
+            offsets, targets, weights = self._offsets, self._targets, self._weights
+            distances, heap = self._distances, self._heap
+            while pending and heap and heap[0][0] <= max_minutes:
+                distance, node = heappop(heap)
+                if node in settled:
+                    continue
+                settled[node] = distance
+                del distances[node]
+                pending.discard(node)
+                for index in range(offsets[node], offsets[node + 1]):
+                    neighbour = targets[index]
+                    if neighbour in settled:
+                        continue
+                    new_distance = distance + weights[index]
+                    if new_distance < distances.get(neighbour, inf):
+                        distances[neighbour] = new_distance
+                        heappush(heap, (new_distance, neighbour))
+            return [settled.get(node) for node in nodes], len(settled) - count
+
+
+def main() -> None:
+    """Подготовка файла графа из GeoJSON с линиями дорог (например, `osmium export region.osm.pbf -o roads.geojson`):
+
+        python -m src.models.road_graph roads.geojson roads.graph
+    """
+    if len(sys.argv) != 3:
+        raise SystemExit(main.__doc__)
+    with open(sys.argv[1], encoding="utf-8") as file:
+        features = json.load(file)["features"]
+    graph = RoadGraph.from_geojson(features)
+    with open(sys.argv[2], "wb") as file:
+        graph.save(file)
+    print(graph.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from uuid import uuid4
 
-from ..cache.security import TOKEN_CACHE
+from ..cache.security import SIGNED_TOKENS, TOKEN_STORE
 from ..app.exceptions import BaseApiException
 
 
@@ -9,21 +9,26 @@ class UserTokenError(BaseApiException):
 
 
 class UserToken:
-    """Работа с токеном доступа подтвержденного пользователя"""
-    _token_cache = TOKEN_CACHE
+    """Работа с токеном доступа подтвержденного пользователя
+
+    В режиме подписанных токенов (TOKEN_MODE="signed") токены не хранятся: проверяется подпись,
+    а использованный токен запоминается фильтром повторов
+    """
+    _token_store = TOKEN_STORE
+    _signed_tokens = SIGNED_TOKENS
 
     def set_new_token(self, phone: str) -> str:
+        if self._signed_tokens is not None:
+            return self._signed_tokens.issue(phone)
         new_token = self._generate_token()
-
-        duplicates = [c_token for c_token, c_phone in self._token_cache.items() if c_phone == phone]
-        for duplicate in duplicates:
-            del self._token_cache[duplicate]
-
-        self._token_cache[new_token] = phone
+        self._token_store.issue(new_token, phone)
         return new_token
 
     def get_phone_by_token(self, token: str) -> str:
-        phone = self._token_cache.get(token, None)
+        if self._signed_tokens is not None:
+            phone = self._signed_tokens.consume(token)
+        else:
+            phone = self._token_store.get_phone(token)
         if not phone:
             raise UserTokenError('Недействительный токен')
         return phone
@@ -0,0 +1,118 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import binascii
+import hashlib
+import heapq
+import hmac
+import secrets
+from threading import Lock
+from time import time
+
+
+def _b64encode(data: bytes) -> str:
+    return urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class ReplayFilter:
+    """Ограниченное множество использованных nonce, каждый хранится до истечения своего токена
+
+    Если фильтр заполнен действующими nonce, новые токены отклоняются: вытеснение nonce
+    сделало бы его токен снова пригодным до истечения срока
+
+    :param max_size: максимальное количество хранимых nonce
+    """
+    def __init__(self, max_size: int = 100_000):
+        self._max_size = max_size
+        self._lock = Lock()
+        self._expires: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._stats = {"replays": 0, "overflows": 0}
+
+    def add(self, nonce: str, expires_at: float) -> bool:
+        """Отметить nonce использованным
+
+        :return: False - nonce уже был использован (повтор) или фильтр заполнен
+        """
+        with self._lock:
+            self._purge(time())
+            if nonce in self._expires:
+                self._stats["replays"] += 1
+                return False
+            if len(self._expires) >= self._max_size:
+                self._stats["overflows"] += 1
+                return False
+            self._expires[nonce] = expires_at
+            heapq.heappush(self._heap, (expires_at, nonce))
+            return True
+
+    def purge_expired(self) -> int:
+        """Удалить nonce истекших токенов (их токены и так не пройдут проверку)"""
+        with self._lock:
+            return self._purge(time())
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            return {**self._stats, "size": len(self._expires)}
+
+    def _purge(self, now: float) -> int:
+        purged = 0
+        while self._heap and self._heap[0][0] < now:
+            del self._expires[heapq.heappop(self._heap)[1]]
+            purged += 1
+        return purged
+
+
+class SignedTokens:
+    """Одноразовые токены доступа, подписанные HMAC: телефон, срок действия и nonce хранятся в самом токене
+
+    Проверка токена не обращается к общему хранилищу (подпись проверяется ключом), поэтому токен,
+    выданный одним воркером, принимается любым другим с тем же ключом. Одноразовость обеспечивается
+    фильтром повторов процесса: повтор токена в другом воркере фильтром этого воркера не обнаруживается.
+
+    :param secret: ключ подписи (одинаковый у всех воркеров)
+    :param ttl: время жизни токена в секундах
+    :param replay_filter: фильтр использованных nonce
+    """
+    def __init__(self, secret: bytes, ttl: float, replay_filter: ReplayFilter):
+        self._secret = secret
+        self._ttl = ttl
+        self._replay_filter = replay_filter
+        self._stats = {"issued": 0, "rejected": 0}
+
+    def issue(self, phone: str) -> str:
+        """Выдать новый токен телефона"""
+        payload = f"{phone}|{int(time() + self._ttl)}|{secrets.token_urlsafe(12)}".encode()
+        self._stats["issued"] += 1
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(payload))}"
+
+    def consume(self, token: str) -> str | None:
+        """Проверить токен и отметить его использованным
+
+        :return: номер телефона (None - подпись неверна, токен истек, уже использован или фильтр повторов заполнен)
+        """
+        try:
+            encoded_payload, encoded_signature = token.split(".")
+            payload, signature = _b64decode(encoded_payload), _b64decode(encoded_signature)
+            if not hmac.compare_digest(signature, self._sign(payload)):
+                raise ValueError("signature")
+            phone, expires_at, nonce = payload.decode().rsplit("|", 2)
+            expires_at = float(expires_at)
+        except (ValueError, binascii.Error, UnicodeDecodeError):
+            self._stats["rejected"] += 1
+            return None
+        if expires_at < time() or not self._replay_filter.add(nonce, expires_at):
+            self._stats["rejected"] += 1
+            return None
+        return phone
+
+    def purge_expired(self) -> int:
+        return self._replay_filter.purge_expired()
+
+    def stats(self) -> dict[str, int | float]:
+        return {**self._stats, **{f"replay_{key}": value for key, value in self._replay_filter.stats().items()}}
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()
@@ -2,7 +2,7 @@ from typing import Any
 import random
 
 from ..app.exceptions import BaseApiException
-from ..cache.sms import SMS_CACHE
+from ..cache.sms import SMS_STORE
 
 
 class SMSError(BaseApiException):
@@ -10,21 +10,26 @@ class SMSError(BaseApiException):
 
 
 class SMS:
-    _sms_cache = SMS_CACHE
+    _sms_store = SMS_STORE
 
     def send(self, phone: str, text: str) -> None:
         ...
 
+    def check_rate_limit(self, phone: str) -> None:
+        """Учесть отправку смс на телефон (ошибка 429, если смс на этот телефон отправлялись слишком часто)"""
+        if not self._sms_store.allow_send(phone):
+            raise SMSError('Слишком много запросов смс, повторите позже', status_code=429)
+
     @staticmethod
     def generate_code() -> str:
         return str(random.randint(1000, 9999))
 
-    def save_sms(self, code: str, sms_info: dict[str, Any]):
+    def save_sms(self, phone: str, code: str, sms_info: dict[str, Any]):
         code = '7777'   # mock
-        self._sms_cache[code] = sms_info
+        self._sms_store.save(phone, code, sms_info)
 
-    def get_sms(self, code: str):
-        sms_info = self._sms_cache.get(code)
+    def get_sms(self, phone: str, code: str):
+        sms_info = self._sms_store.pop(phone, code)
         if not sms_info:
             raise SMSError('Неверный код')
         return sms_info
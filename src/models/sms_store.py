@@ -0,0 +1,117 @@
+from collections import OrderedDict, deque
+from datetime import datetime
+import sys
+from threading import Lock
+from time import monotonic
+from typing import Any
+
+
+class SmsStore:
+    """Ограниченное хранилище отправленных кодов подтверждения с лимитом отправки смс на телефон
+
+    Ключ записи - (телефон, код), у телефона действует только последний отправленный код.
+    Записи лежат в порядке отправки, а время жизни кода одинаковое, поэтому истекшие записи
+    (по expiration_time) всегда в начале и удаляются очисткой без просмотра действующих.
+    При переполнении вытесняются самые старые записи, поэтому поток запросов смс не увеличивает память
+    больше max_size записей (и max_size телефонов в ограничителе частоты).
+
+    :param max_size: максимальное количество кодов (и телефонов в ограничителе частоты)
+    :param rate_limit: сколько смс можно отправить на телефон за rate_window секунд
+    :param rate_window: окно ограничения частоты в секундах
+    """
+    def __init__(self, max_size: int = 100_000, rate_limit: int = 3, rate_window: float = 600.0):
+        self._max_size = max_size
+        self._rate_limit = rate_limit
+        self._rate_window = rate_window
+        self._lock = Lock()
+        self._entries: OrderedDict[tuple[str, str], dict[str, Any]] = OrderedDict()
+        self._codes: dict[str, str] = {}  # телефон -> последний код
+        self._sends: OrderedDict[str, deque[float]] = OrderedDict()  # телефон -> время последних отправок
+        self._stats = {"expired": 0, "evictions": 0, "rate_limited": 0}
+
+    def allow_send(self, phone: str) -> bool:
+        """Учесть отправку смс на телефон, если лимит частоты не превышен
+
+        :return: False - лимит превышен, смс отправлять нельзя
+        """
+        now = monotonic()
+        with self._lock:
+            sends = self._sends.setdefault(phone, deque())
+            while sends and sends[0] <= now - self._rate_window:
+                sends.popleft()
+            if len(sends) >= self._rate_limit:
+                self._stats["rate_limited"] += 1
+                return False
+            sends.append(now)
+            self._sends.move_to_end(phone)  # телефоны упорядочены по последней отправке
+            while len(self._sends) > self._max_size:
+                self._sends.popitem(last=False)
+            return True
+
+    def save(self, phone: str, code: str, sms_info: dict[str, Any]) -> None:
+        """Сохранить код телефона (прежний код телефона перестает действовать)
+
+        :param sms_info: данные отправки, expiration_time - время истечения кода
+        """
+        with self._lock:
+            previous = self._codes.pop(phone, None)
+            if previous is not None:
+                self._entries.pop((phone, previous), None)
+            self._entries[(phone, code)] = sms_info
+            self._codes[phone] = code
+            while len(self._entries) > self._max_size:
+                self._delete(*next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def pop(self, phone: str, code: str) -> dict[str, Any] | None:
+        """Забрать код телефона (код одноразовый)
+
+        :return: данные отправки (None - кода нет)
+        """
+        with self._lock:
+            sms_info = self._entries.get((phone, code))
+            if sms_info is not None:
+                self._delete(phone, code)
+            return sms_info
+
+    def purge_expired(self) -> int:
+        """Удалить истекшие коды и телефоны, у которых нет отправок в окне ограничения частоты
+
+        :return: количество удаленных кодов
+        """
+        now, rate_window_start = datetime.now(), monotonic() - self._rate_window
+        purged = 0
+        with self._lock:
+            while self._entries:
+                key, sms_info = next(iter(self._entries.items()))
+                if sms_info["expiration_time"] >= now:
+                    break
+                self._delete(*key)
+                purged += 1
+            while self._sends:
+                phone, sends = next(iter(self._sends.items()))
+                if sends and sends[-1] > rate_window_start:
+                    break
+                del self._sends[phone]
+            self._stats["expired"] += purged
+        return purged
+
+    def stats(self) -> dict[str, int | float]:
+        """Размер хранилища, примерный объем памяти в байтах и счетчики"""
+        with self._lock:
+            memory = sum(
+                sys.getsizeof(key) + sum(map(sys.getsizeof, key)) + sys.getsizeof(sms_info)
+                for key, sms_info in self._entries.items()
+            ) + sum(sys.getsizeof(sends) for sends in self._sends.values())
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "tracked_phones": len(self._sends),
+                "bytes": memory + sys.getsizeof(self._entries) + sys.getsizeof(self._codes)
+                + sys.getsizeof(self._sends),
+            }
+
+    def _delete(self, phone: str, code: str) -> None:
+        del self._entries[(phone, code)]
+        if self._codes.get(phone) == code:
+            del self._codes[phone]
@@ -0,0 +1,150 @@
+from math import asin, cos, pi, radians, sin, sqrt
+from threading import Lock
+from typing import Iterable
+
+EARTH_RADIUS = 6371  # примерный радиус Земли в км
+_KM_PER_DEGREE = pi * EARTH_RADIUS / 180  # длина одного градуса широты в км
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между двумя точками на сфере (в км)"""
+    d_lat = radians(lat2 - lat1)
+    d_lon = radians(lon2 - lon1)
+    a = sin(d_lat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS * asin(min(1.0, sqrt(a)))
+
+
+def bounding_box(latitude: float, longitude: float, radius: float) -> tuple[float, float, float, float]:
+    """Прямоугольник (в градусах), описанный вокруг окружности с центром в указанных координатах
+
+    :param latitude: широта центра
+    :param longitude: долгота центра
+    :param radius: радиус окружности в км
+    :return: (min_latitude, max_latitude, min_longitude, max_longitude)
+    """
+    d_lat = radius / _KM_PER_DEGREE
+    cos_lat = cos(radians(latitude))
+    d_lon = 180.0 if cos_lat < 1e-9 else min(180.0, d_lat / cos_lat)
+    return latitude - d_lat, latitude + d_lat, longitude - d_lon, longitude + d_lon
+
+
+class SpatialIndex:
+    """Пространственный индекс точек (банкоматов/офисов) на основе равномерной сетки
+
+    Точки раскладываются по ячейкам размером cell_size x cell_size градусов.
+    Поиск по радиусу просматривает только ячейки, попадающие в bounding box окружности,
+    и точно проверяет расстояние только у точек из этих ячеек.
+
+    :param cell_size: размер ячейки сетки в градусах
+    """
+    def __init__(self, cell_size: float = 0.02):
+        self._cell_size = cell_size
+        self._cells: dict[tuple[int, int], dict[int, tuple[float, float]]] = {}
+        self._points: dict[int, tuple[float, float]] = {}
+        self._lock = Lock()
+        self.is_built = False
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, point_id: int) -> bool:
+        return point_id in self._points
+
+    def build(self, points: Iterable[tuple[int, float, float]]) -> None:
+        """Построить индекс заново
+
+        :param points: итератор (id, широта, долгота)
+        """
+        cells: dict[tuple[int, int], dict[int, tuple[float, float]]] = {}
+        all_points: dict[int, tuple[float, float]] = {}
+        for point_id, latitude, longitude in points:
+            cells.setdefault(self._cell(latitude, longitude), {})[point_id] = (latitude, longitude)
+            all_points[point_id] = (latitude, longitude)
+
+        with self._lock:
+            self._cells = cells
+            self._points = all_points
+            self.is_built = True
+
+    def upsert(self, point_id: int, latitude: float, longitude: float) -> None:
+        """Добавить точку в индекс или обновить ее координаты"""
+        with self._lock:
+            self._remove(point_id)
+            self._cells.setdefault(self._cell(latitude, longitude), {})[point_id] = (latitude, longitude)
+            self._points[point_id] = (latitude, longitude)
+
+    def remove(self, point_id: int) -> None:
+        """Удалить точку из индекса"""
+        with self._lock:
+            self._remove(point_id)
+
+    def query_radius(self, latitude: float, longitude: float, radius: float) -> list[int] | None:
+        """Найти id точек в радиусе от указанных координат
+
+        :param latitude: широта центра поиска
+        :param longitude: долгота центра поиска
+        :param radius: радиус поиска в км
+        :return: список id, либо None - если радиус покрывает весь земной шар (ограничение не нужно)
+        """
+        if radius >= pi * EARTH_RADIUS:
+            return None
+
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius)
+        min_row, min_col = self._cell(min_latitude, min_longitude)
+        max_row, max_col = self._cell(max_latitude, max_longitude)
+
+        found = []
+        with self._lock:
+            if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+                candidates = ((key, cell) for key, cell in self._cells.items()
+                              if min_row <= key[0] <= max_row and min_col <= key[1] <= max_col)
+            else:
+                candidates = (((row, col), self._cells[(row, col)])
+                              for row in range(min_row, max_row + 1)
+                              for col in range(min_col, max_col + 1)
+                              if (row, col) in self._cells)
+            for key, cell in candidates:
+                if len(cell) > 4 and self._cell_inside(key, latitude, longitude, radius):
+                    found.extend(cell)
+                    continue
+                for point_id, (point_lat, point_lon) in cell.items():
+                    if haversine(latitude, longitude, point_lat, point_lon) <= radius:
+                        found.append(point_id)
+        return found
+
+    def nearest(self, latitude: float, longitude: float, max_distance: float) -> tuple[int, float] | None:
+        """Ближайшая точка не дальше max_distance км
+
+        :return: (id точки, расстояние в км), либо None - если в радиусе нет точек
+        """
+        found = self.query_radius(latitude, longitude, max_distance)
+        if not found:
+            return None
+        points = self._points
+        return min(
+            ((point_id, haversine(latitude, longitude, *points[point_id])) for point_id in found),
+            key=lambda item: item[1]
+        )
+
+    def _cell_inside(self, key: tuple[int, int], latitude: float, longitude: float, radius: float) -> bool:
+        """Проверка, что ячейка целиком лежит внутри окружности (точки ячейки можно не проверять)"""
+        row, col = key
+        return all(
+            haversine(latitude, longitude, corner_row * self._cell_size, corner_col * self._cell_size) <= radius
+            for corner_row in (row, row + 1)
+            for corner_col in (col, col + 1)
+        )
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        return int(latitude // self._cell_size), int(longitude // self._cell_size)
+
+    def _remove(self, point_id: int) -> None:
+        coordinates = self._points.pop(point_id, None)
+        if coordinates is None:
+            return
+        key = self._cell(*coordinates)
+        cell = self._cells.get(key)
+        if cell is not None:
+            cell.pop(point_id, None)
+            if not cell:
+                del self._cells[key]
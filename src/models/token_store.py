@@ -0,0 +1,128 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any
+
+
+class TokenStore(ABC):
+    """Хранилище токенов доступа: токен -> номер телефона, у телефона действует только последний токен
+
+    :param ttl: время жизни токена в секундах
+    """
+    def __init__(self, ttl: float):
+        self._ttl = ttl
+
+    @abstractmethod
+    def issue(self, token: str, phone: str) -> None:
+        """Сохранить новый токен телефона (прежний токен телефона перестает действовать)"""
+
+    @abstractmethod
+    def get_phone(self, token: str) -> str | None:
+        """Номер телефона по токену (None - токена нет или он истек)"""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Удалить истекшие токены
+
+        :return: количество удаленных токенов
+        """
+
+    @abstractmethod
+    def stats(self) -> dict[str, int | float]:
+        """Размер хранилища и счетчики"""
+
+
+class MemoryTokenStore(TokenStore):
+    """Хранилище токенов в памяти процесса
+
+    Токены лежат в порядке выдачи, а время жизни у всех одинаковое, поэтому истекшие токены всегда в начале:
+    периодическая очистка удаляет их, не просматривая действующие. Истекший токен, который еще не удален,
+    не принимается при чтении. Обратный индекс телефон -> токен позволяет заменить токен без перебора.
+    """
+    def __init__(self, ttl: float):
+        super().__init__(ttl)
+        self._lock = Lock()
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()  # токен -> (телефон, истекает)
+        self._tokens: dict[str, str] = {}  # телефон -> токен
+        self._expired = 0
+
+    def issue(self, token: str, phone: str) -> None:
+        with self._lock:
+            previous = self._tokens.pop(phone, None)
+            if previous is not None:
+                self._entries.pop(previous, None)
+            self._entries[token] = (phone, monotonic() + self._ttl)
+            self._tokens[phone] = token
+
+    def get_phone(self, token: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            phone, expires_at = entry
+            if expires_at < monotonic():
+                self._delete(token, phone)
+                return None
+            return phone
+
+    def purge_expired(self) -> int:
+        now = monotonic()
+        purged = 0
+        with self._lock:
+            while self._entries:
+                token, (phone, expires_at) = next(iter(self._entries.items()))
+                if expires_at >= now:
+                    break
+                self._delete(token, phone)
+                purged += 1
+        return purged
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            return {"size": len(self._entries), "expired": self._expired}
+
+    def _delete(self, token: str, phone: str) -> None:
+        del self._entries[token]
+        if self._tokens.get(phone) == token:
+            del self._tokens[phone]
+        self._expired += 1
+
+
+class RedisTokenStore(TokenStore):
+    """Хранилище токенов в Redis (общее для всех воркеров и экземпляров API)
+
+    Ключи: {prefix}token:<токен> -> телефон и {prefix}phone:<телефон> -> токен, оба с TTL,
+    истекшие ключи удаляет сам Redis. Нужен Redis 6.2+ (SET ... GET при замене токена телефона)
+
+    :param client: клиент Redis (redis.Redis с decode_responses=True)
+    :param prefix: префикс ключей
+    """
+    def __init__(self, client: Any, ttl: float, prefix: str = "api:"):
+        super().__init__(ttl)
+        self._client = client
+        self._prefix = prefix
+
+    def issue(self, token: str, phone: str) -> None:
+        ttl = max(int(self._ttl), 1)
+        # Сначала новый токен, затем замена в обратном индексе: при одновременной выдаче токенов одному телефону
+        # каждый вытесненный токен удаляет тот, кто его вытеснил, в живых остается только последний
+        self._client.set(self._token_key(token), phone, ex=ttl)
+        previous = self._client.set(self._phone_key(phone), token, ex=ttl, get=True)
+        if previous is not None and previous != token:
+            self._client.delete(self._token_key(previous))
+
+    def get_phone(self, token: str) -> str | None:
+        return self._client.get(self._token_key(token))
+
+    def purge_expired(self) -> int:
+        return 0  # ключи истекают в Redis
+
+    def stats(self) -> dict[str, int | float]:
+        return {}
+
+    def _token_key(self, token: str) -> str:
+        return f"{self._prefix}token:{token}"
+
+    def _phone_key(self, phone: str) -> str:
+        return f"{self._prefix}phone:{phone}"
@@ -0,0 +1,185 @@
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Iterable
+
+try:
+    import numpy as np
+except ImportError:  # без numpy оценка по прямой считается в цикле
+    np = None
+
+from .road_graph import RoadGraph, Sweep, TravelMode
+from .spatial_index import EARTH_RADIUS, haversine
+
+# Доля скорости свободного движения на автомобиле по часам суток (пробки утром и вечером)
+DRIVE_SPEED_PROFILE = (
+    1.2, 1.2, 1.2, 1.2, 1.2, 1.1, 0.9, 0.7, 0.55, 0.6, 0.75, 0.8,
+    0.8, 0.8, 0.8, 0.75, 0.65, 0.55, 0.55, 0.65, 0.8, 0.9, 1.0, 1.1,
+)
+# Запас к расстоянию по прямой для границы прохода (короткие маршруты в обход квартала)
+_SEARCH_SLACK_KM = 0.5
+
+
+class TravelTimes:
+    """Время в пути от одной точки до многих (для ранжирования офисов по времени в пути)
+
+    Время до всех кандидатов считается одним проходом по графу дорог (RoadGraph.sweep) от узла,
+    ближайшего к центру ячейки сетки origin_quantum x origin_quantum градусов, в которой находится точка.
+    Проходы кешируются по (ячейка, способ передвижения) с вытеснением давно неиспользуемых (LRU),
+    поэтому запросы из той же ячейки (листание, сдвиг карты) продолжают уже сделанный проход.
+    Путь от точки до узла графа и от узла до офиса считается пешком по прямой.
+    Проход не идет дальше границы: самое далекое по прямой место назначения, умноженное на detour_factor
+    и max_detour, при самой низкой скорости по часам суток. Узлы дальше границы (другая компонента графа,
+    тупик односторонних улиц) не просматриваются, и время до них оценивается по прямой.
+
+    Если граф не загружен, точку не к чему привязать или маршрута нет - время оценивается по прямой
+    с коэффициентом извилистости дорог и скоростью по часам суток (для автомобиля - DRIVE_SPEED_PROFILE).
+
+    :param graph: граф дорог
+    :param walk_speed: скорость пешком в км/ч
+    :param drive_speed: средняя скорость на автомобиле в км/ч для оценки по прямой
+    :param detour_factor: во сколько раз путь по дорогам длиннее расстояния по прямой (для оценки)
+    :param max_detour: во сколько раз маршрут может быть дольше оценки по прямой (граница прохода)
+    :param origin_quantum: размер ячейки сетки начальных точек в градусах
+    :param max_sweeps: максимальное количество проходов в кеше
+    :param max_nodes: максимальное суммарное количество узлов в проходах кеша
+    """
+    def __init__(self,
+                 graph: RoadGraph,
+                 walk_speed: float = 5.0,
+                 drive_speed: float = 30.0,
+                 detour_factor: float = 1.3,
+                 max_detour: float = 2.0,
+                 origin_quantum: float = 0.002,
+                 max_sweeps: int = 256,
+                 max_nodes: int = 1_000_000):
+        self._graph = graph
+        self._walk_speed = walk_speed
+        self._speed_profiles = {"walk": (walk_speed,) * 24,
+                                "drive": tuple(drive_speed * share for share in DRIVE_SPEED_PROFILE)}
+        self._detour_factor = detour_factor
+        self._max_detour = max_detour
+        self._origin_quantum = origin_quantum
+        self._max_sweeps = max_sweeps
+        self._max_nodes = max_nodes
+        self._lock = Lock()
+        self._sweeps: OrderedDict[tuple[str, int, int], Sweep | None] = OrderedDict()
+        self._nodes = 0  # узлов во всех проходах кеша
+        self._stats = {"requests": 0, "hits": 0, "misses": 0, "evictions": 0, "settled": 0, "estimates": 0}
+
+    def minutes(self, from_latitude: float, from_longitude: float,
+                to_latitude: float, to_longitude: float, mode: TravelMode) -> float:
+        """Время в пути в минутах между двумя точками пешком (walk) или на автомобиле (drive)"""
+        return self.minutes_many(from_latitude, from_longitude, [to_latitude], [to_longitude], mode)[0]
+
+    def minutes_many(self, from_latitude: float, from_longitude: float,
+                     latitudes: Iterable[float], longitudes: Iterable[float], mode: TravelMode) -> list[float]:
+        """Время в пути в минутах от одной точки до нескольких (один проход по графу)"""
+        latitudes, longitudes = list(latitudes), list(longitudes)
+        key, sweep = self._sweep(from_latitude, from_longitude, mode) if self._graph.is_built else (None, None)
+        if sweep is None:
+            return self._estimate(from_latitude, from_longitude, latitudes, longitudes, mode)
+
+        graph = self._graph
+        snaps = [graph.nearest_node(latitude, longitude) for latitude, longitude in zip(latitudes, longitudes)]
+        nodes = [snap[0] for snap in snaps if snap is not None]
+        source_lat, source_lon = graph.node_coordinates(sweep.source)
+        routes, settled = sweep.minutes_to(nodes, self._max_minutes(source_lat, source_lon, nodes, mode))
+        self._settled(key, sweep, settled)
+
+        walk_minutes = 60 / self._walk_speed
+        access = haversine(from_latitude, from_longitude, source_lat, source_lon) * walk_minutes
+        routes = iter(routes)
+        minutes = []
+        missed = []
+        for index, snap in enumerate(snaps):
+            route = next(routes) if snap is not None else None
+            if route is None:
+                missed.append(index)
+                minutes.append(0.0)
+            else:
+                minutes.append(access + route + snap[1] * walk_minutes)
+        if missed:
+            estimates = self._estimate(from_latitude, from_longitude,
+                                       [latitudes[index] for index in missed],
+                                       [longitudes[index] for index in missed], mode)
+            for index, estimate in zip(missed, estimates):
+                minutes[index] = estimate
+        return minutes
+
+    def clear(self) -> None:
+        """Удалить все проходы (после загрузки другого графа)"""
+        with self._lock:
+            self._sweeps.clear()
+            self._nodes = 0
+
+    def stats(self) -> dict[str, int | float]:
+        """Счетчики запросов, попаданий в кеш проходов, просмотренных узлов и оценок по прямой"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "sweeps": len(self._sweeps),
+                "nodes": self._nodes,
+                "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+    def _sweep(self, latitude: float, longitude: float, mode: TravelMode) -> tuple[tuple, Sweep | None]:
+        """Ключ кеша и проход из ячейки точки (None - рядом с ячейкой нет узлов графа)"""
+        row, col = int(latitude // self._origin_quantum), int(longitude // self._origin_quantum)
+        key = (mode, row, col)
+        with self._lock:
+            self._stats["requests"] += 1
+            if key in self._sweeps:
+                self._sweeps.move_to_end(key)
+                self._stats["hits"] += 1
+                return key, self._sweeps[key]
+            self._stats["misses"] += 1
+
+        snap = self._graph.nearest_node((row + 0.5) * self._origin_quantum, (col + 0.5) * self._origin_quantum)
+        sweep = None if snap is None else self._graph.sweep(snap[0], mode)
+        with self._lock:
+            if key in self._sweeps:  # проход уже создан параллельным запросом
+                self._sweeps.move_to_end(key)
+                return key, self._sweeps[key]
+            self._sweeps[key] = sweep
+            self._evict()
+        return key, sweep
+
+    def _settled(self, key: tuple, sweep: Sweep, count: int) -> None:
+        """Учесть узлы, просмотренные проходом за запрос, и вытеснить лишние проходы"""
+        with self._lock:
+            self._stats["settled"] += count
+            if self._sweeps.get(key) is sweep:  # проход мог быть вытеснен, пока шел запрос
+                self._nodes += count
+            self._evict()
+
+    def _evict(self) -> None:
+        """Вытеснить давно неиспользуемые проходы (последний использованный остается всегда)"""
+        while len(self._sweeps) > 1 and (len(self._sweeps) > self._max_sweeps or self._nodes > self._max_nodes):
+            _, sweep = self._sweeps.popitem(last=False)
+            self._nodes -= len(sweep) if sweep is not None else 0
+            self._stats["evictions"] += 1
+
+    def _max_minutes(self, source_lat: float, source_lon: float, nodes: list[int], mode: TravelMode) -> float:
+        """Граница прохода: самый далекий узел по прямой с запасом на извилистость и медленное движение"""
+        distance = max((haversine(source_lat, source_lon, *self._graph.node_coordinates(node)) for node in nodes),
+                       default=0.0)
+        minutes_per_km = self._detour_factor * self._max_detour * 60 / min(self._speed_profiles[mode])
+        return (distance + _SEARCH_SLACK_KM) * minutes_per_km
+
+    def _estimate(self, from_latitude: float, from_longitude: float,
+                  latitudes: list[float], longitudes: list[float], mode: TravelMode) -> list[float]:
+        """Оценка времени в пути по прямой с учетом извилистости дорог и скорости в текущий час"""
+        with self._lock:
+            self._stats["estimates"] += len(latitudes)
+        minutes_per_km = self._detour_factor * 60 / self._speed_profiles[mode][datetime.now().hour]
+        if np is None:
+            return [haversine(from_latitude, from_longitude, latitude, longitude) * minutes_per_km
+                    for latitude, longitude in zip(latitudes, longitudes)]
+        latitude, longitude = np.radians(latitudes), np.radians(longitudes)
+        from_lat, from_lon = np.radians(from_latitude), np.radians(from_longitude)
+        a = (np.sin((latitude - from_lat) / 2) ** 2 +
+             np.cos(from_lat) * np.cos(latitude) * np.sin((longitude - from_lon) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+        return (distance * minutes_per_km).tolist()
@@ -3,8 +3,8 @@ from typing import Any, Annotated
 from fastapi import APIRouter, Depends, Query
 
 from ..schemas.history import OfficeHistoryResponse
-from ..dependencies.logic.history import get_history_logic
-from ..logic.history import HistoryLogic
+from ..dependencies.logic.history import get_history_read_logic
+from ..logic.history import AsyncHistoryLogic, HistoryGranularity, HistoryLogic
 
 history_router = APIRouter(
     prefix="/history",
@@ -13,8 +13,16 @@ history_router = APIRouter(
 
 
 @history_router.get('/office', response_model=OfficeHistoryResponse, summary='Загруженность отделения')
-def find_atms(office_id: Annotated[int, Query(..., alias='id', description="id отделения", examples=[1])],
-              logic: Annotated[HistoryLogic, Depends(get_history_logic)],
-              ) -> list[dict[str, Any]]:
-    """Запрос истории по загруженности отделения банка"""
-    return logic.find_office_history(office_id)
+async def find_atms(office_id: Annotated[int, Query(..., alias='id', description="id отделения", examples=[1])],
+                    logic: Annotated[HistoryLogic | AsyncHistoryLogic, Depends(get_history_read_logic)],
+                    granularity: Annotated[HistoryGranularity, Query(
+                        description="raw - все записи истории, hour - средняя загруженность по часам суток, "
+                                    "weekday_hour - по дням недели и часам"
+                    )] = "raw",
+                    ) -> list[dict[str, Any]]:
+    """Запрос истории по загруженности отделения банка
+
+    Профили загруженности (hour, weekday_hour) берутся из агрегатов, которые обновляются при записи истории,
+    поэтому размер ответа и время запроса не зависят от накопленной истории
+    """
+    return await logic.find_office_history(office_id, granularity)
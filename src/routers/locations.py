@@ -1,50 +1,132 @@
 from typing import Any, Annotated, Literal
 
-from fastapi import APIRouter, Depends, Query, Path
+from fastapi import APIRouter, Body, Depends, Query, Path, Request, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
+from ..app.responses import RawJSONResponse
 from ..schemas.locations import (
+    FindAtmsClustersResponse,
     FindAtmsResponse,
+    FindOfficesClustersResponse,
     FindOfficesResponse,
     FindAtmsRequest,
+    FindOfficesBatchRequest,
     FindOfficesRequest,
     GetReviewsResponse,
+    MapViewport,
+    PostOfficeOccupancyRequest,
+    PostOfficeOccupancyResponse,
     PostReviewRequest,
     PostReviewResponse,
 )
-from ..dependencies.logic.locations import get_locations_logic
+from ..dependencies.logic.locations import get_locations_logic, get_locations_logic_async, get_locations_read_logic
 from ..dependencies.security.user import get_phone_by_token
-from ..logic.locations import LocationsLogic
+from ..logic.locations import AsyncLocationsLogic, LocationsLogic, ReadLocationsLogic
 
 locations_router = APIRouter(
     prefix="/locations",
     tags=['locations']
 )
 
+# Логика поиска: синхронная в threadpool или асинхронная (ASYNC_READS_ENABLED)
+ReadLogic = Annotated[ReadLocationsLogic | AsyncLocationsLogic, Depends(get_locations_read_logic)]
 
-@locations_router.get('/find_atms', response_model=FindAtmsResponse, summary='Поиск банкоматов')
-def find_atms(filter_data: Annotated[FindAtmsRequest, Depends()],
-              logic: Annotated[LocationsLogic, Depends(get_locations_logic)],
-              ) -> list[dict[str, Any]]:
-    """Поиск оптимальных банкоматов с применением фильтров"""
-    return logic.find_atms(filter_data.model_dump())
 
+@locations_router.get('/find_atms', response_model=FindAtmsResponse, response_class=RawJSONResponse,
+                      summary='Поиск банкоматов')
+async def find_atms(filter_data: Annotated[FindAtmsRequest, Depends()],
+                    logic: ReadLogic,
+                    ) -> Response:
+    """Поиск оптимальных банкоматов с применением фильтров
 
-@locations_router.get('/find_offices', response_model=FindOfficesResponse, summary='Поиск отделений')
-def find_offices(filter_data: Annotated[FindOfficesRequest, Depends()],
-                 logic: Annotated[LocationsLogic, Depends(get_locations_logic)],
-                 ) -> list[dict[str, Any]]:
-    """Поиск оптимальных отделений с применением фильтров"""
-    return logic.find_offices(filter_data.model_dump())
+    Если задан limit и есть следующая страница - курсор для нее возвращается в заголовке X-Next-Cursor
+    """
+    filter_dict = filter_data.model_dump()
+    atms, content = await logic.find_atms_json(filter_dict)
+    response = RawJSONResponse(content)
+    next_cursor = logic.next_cursor(atms, filter_dict)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+@locations_router.get('/find_offices', response_model=FindOfficesResponse, response_class=RawJSONResponse,
+                      summary='Поиск отделений')
+async def find_offices(filter_data: Annotated[FindOfficesRequest, Depends()],
+                       logic: ReadLogic,
+                       ) -> Response:
+    """Поиск оптимальных отделений с применением фильтров
+
+    Если задан limit и есть следующая страница - курсор для нее возвращается в заголовке X-Next-Cursor
+    """
+    filter_dict = filter_data.model_dump()
+    offices, content = await logic.find_offices_json(filter_dict)
+    response = RawJSONResponse(content)
+    next_cursor = logic.next_cursor(offices, filter_dict)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+@locations_router.post('/find_offices/batch', response_class=StreamingResponse,
+                       responses={status.HTTP_200_OK: {"content": {"application/x-ndjson": {}}}},
+                       openapi_extra={"requestBody": {"required": True, "content": {
+                           "application/x-ndjson": {"schema": {"type": "string"}, "example":
+                                                    '{"id": "client-1", "latitude": 55.78, "longitude": 37.45}\n'
+                                                    '{"id": "client-2", "latitude": 55.75, "longitude": 37.61}'}
+                       }}},
+                       summary='Пакетный поиск отделений для многих точек')
+async def find_offices_batch(request: Request,
+                             filter_data: Annotated[FindOfficesBatchRequest, Depends()],
+                             logic: Annotated[AsyncLocationsLogic, Depends(get_locations_logic_async)],
+                             ) -> StreamingResponse:
+    """Лучшие отделения для каждой точки (например, адресов клиентов) с одними фильтрами
+
+    Тело запроса - NDJSON, строка на точку: `{"id": "client-1", "latitude": 55.78, "longitude": 37.45}`.
+    Ответ - NDJSON по мере готовности (порядок точек не сохраняется), строка на точку:
+    `{"id": "client-1", "offices": [{"id": 12, "distance": 1.4, "timeWait": 35}, ...]}`.
+    Для каждой точки отделения ищутся в радиусе radius км и сортируются по timeWait, как в find_offices
+    с этой точкой в качестве базовых координат
+    """
+    results, release = await logic.find_offices_batch(request.stream(), filter_data.model_dump())
+    return StreamingResponse(results, media_type='application/x-ndjson', background=BackgroundTask(release))
+
+
+@locations_router.get('/find_atms/clusters', response_model=FindAtmsClustersResponse,
+                      summary='Банкоматы на карте с кластеризацией')
+async def find_atms_clusters(filter_data: Annotated[FindAtmsRequest, Depends()],
+                             logic: ReadLogic,
+                             ) -> dict[str, Any]:
+    """Поиск банкоматов для отображения на карте
+
+    На отдаленных масштабах возвращаются кластеры (центр, количество, лучший рейтинг),
+    при достаточном приближении - отдельные банкоматы, как в /locations/find_atms
+    """
+    return await logic.find_atms_clusters(filter_data.model_dump())
+
+
+@locations_router.get('/find_offices/clusters', response_model=FindOfficesClustersResponse,
+                      summary='Отделения на карте с кластеризацией')
+async def find_offices_clusters(filter_data: Annotated[FindOfficesRequest, Depends()],
+                                logic: ReadLogic,
+                                ) -> dict[str, Any]:
+    """Поиск отделений для отображения на карте
+
+    На отдаленных масштабах возвращаются кластеры (центр, количество, минимальное время ожидания,
+    лучший рейтинг), при достаточном приближении - отдельные отделения, как в /locations/find_offices
+    """
+    return await logic.find_offices_clusters(filter_data.model_dump())
 
 
 @locations_router.get('/reviews/{location_type}/get', response_model=GetReviewsResponse,
                       summary='Отзывы о банкомате или отделении')
-def get_atm_reviews(location_type: Annotated[Literal['atm', 'office'], Path()],
-                    location_id: Annotated[int, Query(alias='id')],
-                    logic: Annotated[LocationsLogic, Depends(get_locations_logic)],
-                    ) -> list[dict[str, Any]]:
+async def get_atm_reviews(location_type: Annotated[Literal['atm', 'office'], Path()],
+                          location_id: Annotated[int, Query(alias='id')],
+                          logic: ReadLogic,
+                          ) -> list[dict[str, Any]]:
     """Получить список отзывов о банкомате или отделении банка"""
-    return logic.get_location_reviews(location_type, location_id)
+    return await logic.get_location_reviews(location_type, location_id)
 
 
 @locations_router.post('/reviews/{location_type}/post',response_model=PostReviewResponse,
@@ -64,15 +146,15 @@ def register_office_visit(data: PostReviewRequest,
 
 
 @locations_router.get('/office_visit/request', summary='Запросить посещение отделения')
-def request_office_visit(office_id: Annotated[int, Query(alias='officeId',
-                                                         description="Идентификатор отделения банка")],
-                         logic: Annotated[LocationsLogic, Depends(get_locations_logic)],
-                         ) -> dict[str, Any]:
+async def request_office_visit(office_id: Annotated[int, Query(alias='officeId',
+                                                               description="Идентификатор отделения банка")],
+                               logic: ReadLogic,
+                               ) -> dict[str, Any]:
     """Получить доступное время для записи в отделение банка
 
     Регистрация доступна только на текущий день
     """
-    return logic.request_office_visit(office_id)
+    return await logic.request_office_visit(office_id)
 
 
 @locations_router.post('/office_visit/register', summary='Записаться на посещение отделения')
@@ -92,3 +174,39 @@ def register_office_visit(logic: Annotated[LocationsLogic, Depends(get_locations
     выбранная дата и время, адрес отделения, номер телефона (на который был оформлен прием)
     """
     return logic.register_office_visit(user_phone, office_id, selected_time)
+
+
+@locations_router.post('/office_occupancy', response_model=PostOfficeOccupancyResponse,
+                       status_code=status.HTTP_202_ACCEPTED, summary='Загруженность отделений от терминалов очереди')
+async def post_office_occupancy(events: Annotated[PostOfficeOccupancyRequest, Body(min_length=1, max_length=1000)],
+                                logic: Annotated[AsyncLocationsLogic, Depends(get_locations_logic_async)],
+                                ) -> dict[str, int]:
+    """Прием событий загруженности (количество клиентов) отделений
+
+    События сразу учитываются в поиске отделений, а в БД (и историю загруженности) записываются
+    периодически пачкой, по одной записи на отделение. Если буфер событий переполнен - ответ 503,
+    отправку стоит повторить позже
+    """
+    return {'accepted': logic.post_office_occupancy([event.model_dump() for event in events])}
+
+
+@locations_router.get('/office_occupancy/subscribe', response_class=StreamingResponse,
+                      responses={status.HTTP_200_OK: {"content": {"text/event-stream": {}}}},
+                      summary='Подписка на загруженность отделений в области карты')
+async def subscribe_office_occupancy(position: Annotated[MapViewport, Depends()],
+                                     logic: Annotated[AsyncLocationsLogic, Depends(get_locations_logic_async)],
+                                     ) -> StreamingResponse:
+    """Поток Server-Sent Events с загруженностью отделений в области карты (вместо повторных find_offices)
+
+    Событие snapshot - все отделения области, delta - только изменившиеся:
+    `[{"id": 12, "countClientsNow": 4, "timeWait": 35}, ...]`. Область и timeWait считаются как в find_offices.
+    При смене области карты нужна новая подписка
+    """
+    position_dict = position.model_dump()
+    subscription = logic.subscribe_office_occupancy(position_dict)
+    return StreamingResponse(
+        logic.office_occupancy_events(subscription, position_dict),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        background=BackgroundTask(logic.unsubscribe_office_occupancy, subscription),
+    )
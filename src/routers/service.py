@@ -1,6 +1,10 @@
-from fastapi import APIRouter
+from typing import Annotated
 
-from ..schemas.service import HealthcheckResponse
+from fastapi import APIRouter, Depends, Response, status
+
+from ..dependencies.logic.service import get_service_logic
+from ..logic.service import ServiceLogic
+from ..schemas.service import HealthcheckResponse, MetricsResponse, ReadinessResponse
 
 service_router = APIRouter(
     prefix="/service",
@@ -12,3 +16,19 @@ service_router = APIRouter(
 async def healthcheck() -> dict[str, str]:
     """Базовая проверка доступности API для мониторинга"""
     return {"status": "ok"}
+
+
+@service_router.get('/readiness', response_model=ReadinessResponse, summary='Готовность API принимать запросы',
+                    responses={status.HTTP_503_SERVICE_UNAVAILABLE: {"model": ReadinessResponse}})
+def readiness(response: Response, logic: Annotated[ServiceLogic, Depends(get_service_logic)]) -> dict[str, str]:
+    """Готовность воркера: старт завершен и БД (снапшот) подключена, иначе 503"""
+    if not logic.is_ready():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "starting"}
+    return {"status": "ready"}
+
+
+@service_router.get('/metrics', response_model=MetricsResponse, summary='Метрики внутренних кешей')
+async def metrics(logic: Annotated[ServiceLogic, Depends(get_service_logic)]) -> dict[str, dict[str, int | float]]:
+    """Счетчики внутренних кешей и хранилищ (попадания/промахи кеша поиска локаций и т.д.)"""
+    return logic.get_metrics()
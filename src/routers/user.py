@@ -25,7 +25,7 @@ def request_sms(data: SendSmsRequest,
 def confirm_sms(data: ConfirmSmsRequest,
                 logic: Annotated[UserLogic, Depends(get_user_logic)],
                 ) -> dict[str, Any]:
-    return {'token': logic.confirm_sms(data.code)}
+    return {'token': logic.confirm_sms(data.phone, data.code)}
 
 
 @user_router.post('/favorites/add', summary='Добавить локацию в избранное')
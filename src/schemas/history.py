@@ -18,4 +18,19 @@ class OfficeHistoryModel(BaseOrmModel):
     ]
 
 
-OfficeHistoryResponse = list[OfficeHistoryModel]
+class OfficeLoadProfileModel(BaseOrmModel):
+    """Средняя загруженность банка в час суток (и день недели)"""
+    weekday: Annotated[
+        int | None,
+        Field(description="День недели (0 - понедельник, 6 - воскресенье), None - профиль по часам суток",
+              examples=[0])
+    ]
+    hour: Annotated[int, Field(description="Час суток (0-23)", examples=[12])]
+    avg_count_clients: Annotated[
+        float,
+        Field(alias="avgCountClients", description="Среднее количество клиентов в офисе в этот час", examples=[4.5])
+    ]
+    samples: Annotated[int, Field(description="Количество записей истории, по которым вычислено среднее")]
+
+
+OfficeHistoryResponse = list[OfficeHistoryModel] | list[OfficeLoadProfileModel]
@@ -1,13 +1,22 @@
-from typing import Annotated, Any
+from datetime import datetime
+from typing import Annotated, Any, Literal
 
 from fastapi import Query
 from pydantic import BaseModel, Field, model_validator, field_serializer
 
-from .base import BaseOrmModel
+from .base import BaseCamelModel, BaseOrmModel
 from ..database.models import Week
+from ..models.capabilities import CURRENCIES
 
+# Список валют через запятую (например "usd, rub")
+_CURRENCIES_PATTERN = r"(?i)^\s*({0})\s*(,\s*({0})\s*)*$".format("|".join(CURRENCIES))
 
-class LocationFilter(BaseModel):
+
+def _split_currencies(currencies: str | None) -> list[str] | None:
+    return [currency.strip().lower() for currency in currencies.split(',')] if currencies else None
+
+
+class MapViewport(BaseModel):
     """Базовая информация по расположению пользователя"""
     latitude: Annotated[
         float,
@@ -31,6 +40,24 @@ class LocationFilter(BaseModel):
     ]
 
 
+class LocationFilter(MapViewport):
+    """Расположение пользователя и страница выдачи"""
+    limit: Annotated[
+        int | None,
+        Field(Query(None, ge=1, description="Максимальное количество локаций в ответе", examples=[20]))
+    ]
+    cursor: Annotated[
+        str | None,
+        Field(
+            Query(
+                None,
+                description="Курсор следующей страницы (из заголовка X-Next-Cursor предыдущего ответа)",
+                examples=["WzEuMjM0LCAxMl0"]
+            )
+        )
+    ]
+
+
 class FindAtmsRequest(LocationFilter):
     """Фильтры для поиска банкоматов"""
     all_day: Annotated[
@@ -77,6 +104,7 @@ class FindAtmsRequest(LocationFilter):
             Query(
                 None,
                 alias='withdrawCurrencies',
+                pattern=_CURRENCIES_PATTERN,
                 description='Доступные валюты для снятия (usd, eur, rub)',
                 examples=['usd, rub']
             )
@@ -88,6 +116,7 @@ class FindAtmsRequest(LocationFilter):
             Query(
                 None,
                 alias='depositCurrencies',
+                pattern=_CURRENCIES_PATTERN,
                 description='Доступные валюты для внесения (usd, eur, rub)',
                 examples=['rub']
             )
@@ -96,15 +125,15 @@ class FindAtmsRequest(LocationFilter):
 
     @field_serializer('withdraw_currencies')
     def serialize_withdraw_currencies(self, withdraw_currencies: str | None, _info):
-        return [currency.strip() for currency in withdraw_currencies.split(',')] if withdraw_currencies else None
+        return _split_currencies(withdraw_currencies)
 
     @field_serializer('deposit_currencies')
     def serialize_deposit_currencies(self, deposit_currencies: str | None, _info):
-        return [currency.strip() for currency in deposit_currencies.split(',')] if deposit_currencies else None
+        return _split_currencies(deposit_currencies)
 
 
-class FindOfficesRequest(LocationFilter):
-    """Фильтры для поиска отделений"""
+class OfficeFilter(BaseModel):
+    """Фильтры отделений"""
     avg_rating: Annotated[
         int | None,
         Field(None, alias="avgRating", description="Средний рейтинг офиса (от 10 до 50)", examples=["44"])
@@ -155,22 +184,66 @@ class FindOfficesRequest(LocationFilter):
         bool | None,
         Field(Query(None, description="Нужен ли КЭП", examples=["true"]))
     ]
+    travel_mode: Annotated[
+        Literal["walk", "drive"] | None,
+        Field(
+            Query(
+                None,
+                alias="travelMode",
+                description="Способ передвижения: timeWait считается по времени в пути (мин) по дорогам "
+                            "пешком (walk) или на автомобиле (drive), по умолчанию - по расстоянию по прямой",
+                examples=["walk"]
+            )
+        )
+    ]
     withdraw_currencies: Annotated[
-        list[str] | None,
-        Field(Query(None, alias="withdrawCurrencies", description="Какую валюту нужно вывести", examples=["rub"]))
+        str | None,
+        Field(
+            Query(
+                None,
+                alias="withdrawCurrencies",
+                pattern=_CURRENCIES_PATTERN,
+                description="Какую валюту нужно снять (usd, eur, rub через запятую)",
+                examples=["rub"]
+            )
+        )
     ]
     deposit_currencies: Annotated[
-        list[str] | None,
-        Field(Query(None, alias="depositCurrencies", description="Какую валюту нужно вывести", examples=["rub, usd"]))
+        str | None,
+        Field(
+            Query(
+                None,
+                alias="depositCurrencies",
+                pattern=_CURRENCIES_PATTERN,
+                description="Какую валюту нужно внести (usd, eur, rub через запятую)",
+                examples=["rub, usd"]
+            )
+        )
     ]
 
     @field_serializer('withdraw_currencies')
     def serialize_withdraw_currencies(self, withdraw_currencies: str | None, _info):
-        return [currency.strip() for currency in withdraw_currencies.split(',')] if withdraw_currencies else None
+        return _split_currencies(withdraw_currencies)
 
     @field_serializer('deposit_currencies')
     def serialize_deposit_currencies(self, deposit_currencies: str | None, _info):
-        return [currency.strip() for currency in deposit_currencies.split(',')] if deposit_currencies else None
+        return _split_currencies(deposit_currencies)
+
+
+class FindOfficesRequest(OfficeFilter, LocationFilter):
+    """Фильтры для поиска отделений"""
+
+
+class FindOfficesBatchRequest(OfficeFilter):
+    """Фильтры пакетного поиска отделений для многих начальных точек"""
+    radius: Annotated[
+        float,
+        Field(Query(5.0, gt=0, le=50, description="Радиус поиска вокруг каждой точки, км", examples=[3]))
+    ]
+    limit: Annotated[
+        int,
+        Field(Query(3, ge=1, le=100, description="Сколько лучших отделений вернуть для каждой точки", examples=[3]))
+    ]
 
 
 class Currencies(BaseModel):
@@ -327,6 +400,38 @@ FindAtmsResponse = list[ATMModel]
 FindOfficesResponse = list[OfficeModel]
 
 
+class ClusterModel(BaseCamelModel):
+    """Кластер локаций (для отдаленных масштабов карты)"""
+    latitude: Annotated[float, Field(description="Широта центра кластера", examples=["55.7512"])]
+    longitude: Annotated[float, Field(description="Долгота центра кластера", examples=["37.6184"])]
+    count: Annotated[int, Field(description="Количество локаций в кластере", examples=["42"])]
+    best_rating: Annotated[
+        int | None,
+        Field(None, alias="bestRating", description="Лучший средний рейтинг среди локаций кластера", examples=["47"])
+    ]
+    min_time_wait: Annotated[
+        int | None,
+        Field(
+            None,
+            alias="minTimeWait",
+            description="Минимальное время до получения услуги среди отделений кластера (только для отделений)",
+            examples=["35"]
+        )
+    ]
+
+
+class FindAtmsClustersResponse(BaseCamelModel):
+    """Банкоматы на карте: кластеры на отдаленных масштабах, отдельные банкоматы - при приближении"""
+    clusters: Annotated[list[ClusterModel], Field(description="Кластеры банкоматов")]
+    atms: Annotated[FindAtmsResponse, Field(description="Отдельные банкоматы")]
+
+
+class FindOfficesClustersResponse(BaseCamelModel):
+    """Отделения на карте: кластеры на отдаленных масштабах, отдельные отделения - при приближении"""
+    clusters: Annotated[list[ClusterModel], Field(description="Кластеры отделений")]
+    offices: Annotated[FindOfficesResponse, Field(description="Отдельные отделения")]
+
+
 class ReviewsModel(BaseOrmModel):
     """Отзыв о банкомате или отделении"""
     rating: Annotated[int, Field(description="Рейтинг отзыва", examples=["35"])]
@@ -345,3 +450,23 @@ class PostReviewRequest(BaseModel):
 
 class PostReviewResponse(BaseModel):
     msg: str = 'Ваш отзыв отправлен на модерацию'
+
+
+class OfficeOccupancyEvent(BaseCamelModel):
+    """Событие загруженности отделения от терминала электронной очереди"""
+    office_id: Annotated[int, Field(alias="officeId", description="Идентификатор отделения", examples=[12])]
+    count_clients: Annotated[
+        int,
+        Field(ge=0, alias="countClients", description="Количество клиентов в отделении", examples=[4])
+    ]
+    dt: Annotated[
+        datetime | None,
+        Field(None, description="Время события (по умолчанию - время получения)", examples=["2023-10-14T12:30:00"])
+    ]
+
+
+PostOfficeOccupancyRequest = list[OfficeOccupancyEvent]
+
+
+class PostOfficeOccupancyResponse(BaseModel):
+    accepted: Annotated[int, Field(description="Количество принятых событий", examples=[1])]
@@ -4,3 +4,11 @@ from pydantic import BaseModel
 class HealthcheckResponse(BaseModel):
     """Схема ответа Healthcheck"""
     status: str = "ok"
+
+
+class ReadinessResponse(BaseModel):
+    """Схема ответа Readiness"""
+    status: str = "ready"
+
+
+MetricsResponse = dict[str, dict[str, int | float]]
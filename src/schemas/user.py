@@ -17,6 +17,7 @@ class SendSmsResponse(BaseCamelModel):
 
 
 class ConfirmSmsRequest(BaseModel):
+    phone: Annotated[str, Field(description="Телефон, на который было отправлено СМС", examples=["+79999999999"])]
     code: Annotated[str, Field(description="Код подтверждения (для авторизации)", examples=["555333"])]
 
 
@@ -0,0 +1,139 @@
+import os
+
+
+def _env_float(name: str, default: float) -> float:
+    """Чтение числа из переменной окружения"""
+    value = os.getenv(name)
+    return default if value is None else float(value)
+
+
+def _env_int(name: str, default: int) -> int:
+    """Чтение целого числа из переменной окружения"""
+    value = os.getenv(name)
+    return default if value is None else int(value)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Чтение логического значения из переменной окружения ("1", "true", "yes" - True)"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Поиск кандидатов в радиусе через in-memory пространственный индекс процесса.
+# Если выключено - радиус проверяется в БД (R*Tree + точная проверка), что нужно при нескольких воркерах
+SPATIAL_INDEX_ENABLED = _env_bool("SPATIAL_INDEX_ENABLED", True)
+
+# Ранжирование локаций векторизованно в NumPy вместо ORDER BY в SQL (требуется установленный numpy)
+RANKING_ENGINE_ENABLED = _env_bool("RANKING_ENGINE_ENABLED", False)
+
+# Приближение на карте, начиная с которого вместо кластеров возвращаются отдельные локации
+CLUSTERING_MAX_ZOOM = _env_float("CLUSTERING_MAX_ZOOM", 10.0)
+
+# Кеш результатов поиска локаций: координаты округляются до LOCATIONS_CACHE_QUANTUM градусов (~100 м),
+# zoom - до 0.5, записи живут LOCATIONS_CACHE_TTL секунд
+LOCATIONS_CACHE_ENABLED = _env_bool("LOCATIONS_CACHE_ENABLED", True)
+LOCATIONS_CACHE_SIZE = _env_int("LOCATIONS_CACHE_SIZE", 1024)
+LOCATIONS_CACHE_TTL = _env_float("LOCATIONS_CACHE_TTL", 30.0)
+LOCATIONS_CACHE_QUANTUM = _env_float("LOCATIONS_CACHE_QUANTUM", 0.001)
+
+# Количество записей (банкоматов/офисов) в одной пачке при заполнении БД из входных файлов
+SEED_BATCH_SIZE = _env_int("SEED_BATCH_SIZE", 1000)
+
+# Поиск локаций и история отделений через асинхронный engine (aiosqlite) в event loop. По умолчанию выключено:
+# запрос целиком выполняется в threadpool на синхронных соединениях только для чтения - под нагрузкой
+# это быстрее (замер: python -m benchmarks.locations_load)
+ASYNC_READS_ENABLED = _env_bool("ASYNC_READS_ENABLED", False)
+# Пул соединений асинхронного engine (aiosqlite): постоянные соединения и дополнительные при пиковой нагрузке
+ASYNC_DB_POOL_SIZE = _env_int("ASYNC_DB_POOL_SIZE", 20)
+ASYNC_DB_MAX_OVERFLOW = _env_int("ASYNC_DB_MAX_OVERFLOW", 20)
+
+# Настройка соединений SQLite: журнал WAL (чтение не блокируется записью), synchronous=NORMAL (в режиме WAL
+# надежно при сбое процесса), отображение файла БД в память (байт) и кеш страниц на соединение (КиБ)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_CACHE_SIZE_KB = _env_int("SQLITE_CACHE_SIZE_KB", 64 * 1024)
+# Сколько секунд соединение ждет снятия блокировки БД другим процессом/соединением
+SQLITE_BUSY_TIMEOUT = _env_float("SQLITE_BUSY_TIMEOUT", 5.0)
+
+# Пул соединений только для чтения (синхронный engine); запись идет через одно соединение-писатель
+SQLITE_READ_POOL_SIZE = _env_int("SQLITE_READ_POOL_SIZE", 8)
+SQLITE_READ_MAX_OVERFLOW = _env_int("SQLITE_READ_MAX_OVERFLOW", 8)
+# Сколько секунд запрос ждет освобождения соединения-писателя
+SQLITE_WRITE_TIMEOUT = _env_float("SQLITE_WRITE_TIMEOUT", 30.0)
+
+# Хранилище токенов доступа пользователей: "memory" (в памяти процесса) или "redis" (общее для воркеров, REDIS_URL,
+# нужен Redis 6.2+ из-за SET ... GET)
+TOKEN_STORE_BACKEND = os.getenv("TOKEN_STORE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Время жизни токена в секундах и период удаления истекших токенов из памяти
+TOKEN_TTL = _env_float("TOKEN_TTL", 7 * 24 * 60 * 60)
+TOKEN_PURGE_INTERVAL = _env_float("TOKEN_PURGE_INTERVAL", 60.0)
+
+# Режим токенов: "store" (токены в TOKEN_STORE_BACKEND) или "signed" (подписанные HMAC токены без общего хранилища).
+# Для нескольких воркеров/экземпляров в режиме "signed" нужен общий TOKEN_SECRET, иначе ключ свой у каждого процесса
+TOKEN_MODE = os.getenv("TOKEN_MODE", "store")
+TOKEN_SECRET = os.getenv("TOKEN_SECRET", "")
+# Сколько использованных подписанных токенов процесс помнит для защиты от повторного использования.
+# Одноразовость соблюдается только в пределах одного процесса (повтор в другом воркере не обнаруживается);
+# пока фильтр заполнен токенами, которые еще не истекли, новые токены отклоняются
+TOKEN_REPLAY_FILTER_SIZE = _env_int("TOKEN_REPLAY_FILTER_SIZE", 100_000)
+
+# Коды подтверждения из смс: максимум хранимых кодов, лимит отправки смс на телефон (SMS_RATE_LIMIT
+# за SMS_RATE_WINDOW секунд) и период удаления истекших кодов
+SMS_STORE_MAX_SIZE = _env_int("SMS_STORE_MAX_SIZE", 100_000)
+SMS_RATE_LIMIT = _env_int("SMS_RATE_LIMIT", 3)
+SMS_RATE_WINDOW = _env_float("SMS_RATE_WINDOW", 600.0)
+SMS_SWEEP_INTERVAL = _env_float("SMS_SWEEP_INTERVAL", 30.0)
+
+# Прогноз загруженности офисов на время прибытия клиента (по истории, слоты по LOAD_FORECAST_SLOT_MINUTES минут):
+# время в пути - по скорости LOAD_FORECAST_TRAVEL_SPEED км/ч, вес текущей загруженности убывает в e раз
+# за LOAD_FORECAST_LIVE_HORIZON минут в пути. Профили перестраиваются раз в LOAD_FORECAST_REFRESH_INTERVAL секунд
+LOAD_FORECAST_ENABLED = _env_bool("LOAD_FORECAST_ENABLED", True)
+LOAD_FORECAST_SLOT_MINUTES = _env_int("LOAD_FORECAST_SLOT_MINUTES", 15)
+if LOAD_FORECAST_SLOT_MINUTES <= 0 or 60 % LOAD_FORECAST_SLOT_MINUTES:  # слоты не должны переходить через час
+    raise ValueError(f"LOAD_FORECAST_SLOT_MINUTES должен быть делителем 60, получено {LOAD_FORECAST_SLOT_MINUTES}")
+LOAD_FORECAST_TRAVEL_SPEED = _env_float("LOAD_FORECAST_TRAVEL_SPEED", 5.0)
+LOAD_FORECAST_LIVE_HORIZON = _env_float("LOAD_FORECAST_LIVE_HORIZON", 30.0)
+LOAD_FORECAST_REFRESH_INTERVAL = _env_float("LOAD_FORECAST_REFRESH_INTERVAL", 3600.0)
+
+# Загруженность офисов от терминалов электронной очереди: события копятся в буфере и записываются в БД
+# раз в OCCUPANCY_FLUSH_INTERVAL секунд; если записи ждут OCCUPANCY_MAX_PENDING офисов - новые события отклоняются
+OCCUPANCY_FLUSH_INTERVAL = _env_float("OCCUPANCY_FLUSH_INTERVAL", 1.0)
+OCCUPANCY_MAX_PENDING = _env_int("OCCUPANCY_MAX_PENDING", 10_000)
+# Подписки на изменения загруженности офисов (SSE): максимум подписок на процесс, как часто (в секундах)
+# подписчику отправляются накопленные изменения и период пустых сообщений для поддержания соединения
+OCCUPANCY_MAX_SUBSCRIBERS = _env_int("OCCUPANCY_MAX_SUBSCRIBERS", 10_000)
+OCCUPANCY_PUSH_INTERVAL = _env_float("OCCUPANCY_PUSH_INTERVAL", 0.5)
+OCCUPANCY_HEARTBEAT_INTERVAL = _env_float("OCCUPANCY_HEARTBEAT_INTERVAL", 15.0)
+
+# Граф дорог для расчета времени в пути (файл готовится из выгрузки OSM: python -m src.models.road_graph),
+# пустое значение - время в пути считается по прямой. Точка привязывается к узлу графа не дальше
+# ROUTING_SNAP_DISTANCE км; если привязать не удалось или маршрута нет - время оценивается по прямой, умноженной
+# на ROUTING_DETOUR_FACTOR, со скоростью ROUTING_WALK_SPEED / ROUTING_DRIVE_SPEED км/ч (на автомобиле - с учетом
+# часа суток). Проход по графу не идет дальше оценки по прямой до самого далекого офиса, умноженной
+# на ROUTING_MAX_DETOUR: офисы дальше (другая компонента графа) тоже оцениваются по прямой
+ROUTING_GRAPH_PATH = os.getenv("ROUTING_GRAPH_PATH", "")
+ROUTING_WALK_SPEED = _env_float("ROUTING_WALK_SPEED", 5.0)
+ROUTING_DRIVE_SPEED = _env_float("ROUTING_DRIVE_SPEED", 30.0)
+ROUTING_SNAP_DISTANCE = _env_float("ROUTING_SNAP_DISTANCE", 0.5)
+ROUTING_DETOUR_FACTOR = _env_float("ROUTING_DETOUR_FACTOR", 1.3)
+ROUTING_MAX_DETOUR = _env_float("ROUTING_MAX_DETOUR", 2.0)
+# Время в пути до всех офисов считается одним проходом по графу из ячейки ROUTING_ORIGIN_QUANTUM градусов
+# (около 200 м) с начальной точкой. В кеше хранится не больше ROUTING_CACHE_SIZE проходов
+# и ROUTING_CACHE_MAX_NODES просмотренных ими узлов графа (около 100 байт на узел)
+ROUTING_ORIGIN_QUANTUM = _env_float("ROUTING_ORIGIN_QUANTUM", 0.002)
+ROUTING_CACHE_SIZE = _env_int("ROUTING_CACHE_SIZE", 256)
+ROUTING_CACHE_MAX_NODES = _env_int("ROUTING_CACHE_MAX_NODES", 1_000_000)
+
+# Пакетный поиск офисов для многих начальных точек (NDJSON): не больше BATCH_RANKING_MAX_ORIGINS точек в запросе
+# и BATCH_RANKING_MAX_LINE_BYTES байт в строке, не больше BATCH_RANKING_MAX_REQUESTS запросов одновременно,
+# точки ранжируются пачками по BATCH_RANKING_CHUNK_SIZE в BATCH_RANKING_WORKERS процессах
+# (0 или 1 - в потоке процесса приложения)
+BATCH_RANKING_MAX_ORIGINS = _env_int("BATCH_RANKING_MAX_ORIGINS", 100_000)
+BATCH_RANKING_MAX_LINE_BYTES = _env_int("BATCH_RANKING_MAX_LINE_BYTES", 1024)
+BATCH_RANKING_MAX_REQUESTS = _env_int("BATCH_RANKING_MAX_REQUESTS", 2)
+BATCH_RANKING_CHUNK_SIZE = _env_int("BATCH_RANKING_CHUNK_SIZE", 500)
+BATCH_RANKING_WORKERS = _env_int("BATCH_RANKING_WORKERS", os.cpu_count() or 1)
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CWD = os.getcwd()
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    """Тесты работают во временной папке: своя database.db, data/ - ссылка на входные файлы проекта
+
+    Путь к БД относительный (sqlite:///database.db) и разрешается при создании engine (импорте src),
+    поэтому папка меняется до сбора тестов
+    """
+    config.workdir = tempfile.mkdtemp(prefix="tests-")
+    os.symlink(os.path.join(_ROOT, "data"), os.path.join(config.workdir, "data"))
+    os.chdir(config.workdir)
+
+
+def pytest_unconfigure(config: pytest.Config) -> None:
+    os.chdir(_CWD)
+    shutil.rmtree(config.workdir, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Клиент приложения (при старте БД строится из data/*.json)"""
+    from fastapi.testclient import TestClient
+    from src.app import ApiApp
+
+    with TestClient(ApiApp()) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def grid_graph():
+    """Синтетический граф дорог 120x120 узлов (tests/road_grid.py)"""
+    from .road_grid import synthetic_grid_graph
+    return synthetic_grid_graph()
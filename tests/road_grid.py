@@ -0,0 +1,60 @@
+"""Синтетический граф дорог для тестов и замеров маршрутизации (benchmarks/road_routing.py)
+
+Сетка улиц вокруг центра Москвы: каждая пятая улица - магистраль (быстрее, часть односторонняя),
+остальные - жилые улицы, часть ребер удалена (дворы, тупики)
+"""
+from heapq import heappop, heappush
+from math import inf
+import random
+
+from src.models.road_graph import DRIVE, WALK, RoadGraph
+from src.models.spatial_index import haversine
+
+_CENTER = (55.755864, 37.617698)
+
+
+def synthetic_grid_graph(rows: int = 120, cols: int = 120, spacing: float = 0.002, seed: int = 7) -> RoadGraph:
+    """Граф-сетка rows x cols узлов с шагом spacing градусов (около 150-220 м)"""
+    rng = random.Random(seed)
+    nodes = [(_CENTER[0] + (row - rows / 2) * spacing, _CENTER[1] + (col - cols / 2) * spacing * 1.7)
+             for row in range(rows) for col in range(cols)]
+    edges = []
+
+    def connect(source: int, target: int, arterial: bool) -> None:
+        if not arterial and rng.random() < 0.08:
+            return
+        length = 1000 * haversine(*nodes[source], *nodes[target])
+        speed = 50 if arterial else 25
+        backward = WALK if arterial and rng.random() < 0.3 else WALK | DRIVE  # односторонняя магистраль
+        edges.append((source, target, length, speed, WALK | DRIVE))
+        edges.append((target, source, length, speed, backward))
+
+    for row in range(rows):
+        for col in range(cols):
+            node = row * cols + col
+            if col + 1 < cols:
+                connect(node, node + 1, row % 5 == 0)
+            if row + 1 < rows:
+                connect(node, node + cols, col % 5 == 0)
+    return RoadGraph.from_edges(nodes, edges)
+
+
+def dijkstra_minutes(graph: RoadGraph, source: int, target: int, mode: str) -> tuple[float | None, int]:
+    """Эталон: обычный алгоритм Дейкстры по тем же весам (время маршрута и количество просмотренных узлов)"""
+    weights, _, _ = graph._weights[mode]
+    distances, heap = {source: 0.0}, [(0.0, source)]
+    settled = 0
+    while heap:
+        distance, node = heappop(heap)
+        if node == target:
+            return distance, settled
+        if distance > distances[node]:
+            continue
+        settled += 1
+        for index in range(graph._offsets[node], graph._offsets[node + 1]):
+            new_distance = distance + weights[index]
+            neighbour = graph._targets[index]
+            if new_distance < distances.get(neighbour, inf):
+                distances[neighbour] = new_distance
+                heappush(heap, (new_distance, neighbour))
+    return None, settled
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.models.batch_ranking import RankingPool
+from src.settings import BATCH_RANKING_MAX_LINE_BYTES, BATCH_RANKING_MAX_REQUESTS
+
+_PATH = "/locations/find_offices/batch"
+_ORIGINS = b'{"id": "a", "latitude": 55.78, "longitude": 37.45}\n{"id": "b", "latitude": 55.75, "longitude": 37.61}\n'
+
+
+@pytest.fixture
+def batch_slots(client):
+    """Места пакетных запросов (кеш импортируется после приложения)"""
+    from src.cache.locations import OFFICE_BATCH_SLOTS
+    return OFFICE_BATCH_SLOTS
+
+
+def test_batch_returns_line_per_origin_and_frees_slot(client, batch_slots):
+    response = client.post(_PATH, content=_ORIGINS, params={"limit": 2})
+    assert response.status_code == 200
+    assert sorted(json.loads(line)["id"] for line in response.text.splitlines()) == ["a", "b"]
+    assert batch_slots._value == BATCH_RANKING_MAX_REQUESTS
+
+
+def test_batch_rejects_long_line(client, batch_slots):
+    line = json.dumps({"id": "x" * BATCH_RANKING_MAX_LINE_BYTES, "latitude": 55.75, "longitude": 37.61}).encode()
+    for body in (line + b"\n", line):  # законченная строка и недочитанная строка без перевода строки
+        assert client.post(_PATH, content=body).status_code == 413
+    assert batch_slots._value == BATCH_RANKING_MAX_REQUESTS
+
+
+def test_batch_requests_are_limited(client, batch_slots):
+    for _ in range(BATCH_RANKING_MAX_REQUESTS):
+        batch_slots.acquire()
+    try:
+        assert client.post(_PATH, content=_ORIGINS).status_code == 503
+    finally:
+        for _ in range(BATCH_RANKING_MAX_REQUESTS):
+            batch_slots.release()
+
+
+def test_pool_is_recreated_only_for_new_snapshot_version():
+    """Пул переиспользуется, пока не сменилась версия массивов; старый закрывается, когда его отпустят"""
+    ranking_pool = RankingPool(2, "", {}, {})
+    with ranking_pool.acquire({"version": 1}) as first:
+        with ranking_pool.acquire({"version": 1}) as same:
+            assert same is first
+        with ranking_pool.acquire({"version": 2}) as second:
+            assert second is not first
+            assert ranking_pool.stats() == {"created": 2, "pools": 2}
+    assert ranking_pool.stats() == {"created": 2, "pools": 1}
+    assert first._shutdown_thread
+    ranking_pool.shutdown()
+    assert ranking_pool.stats()["pools"] == 0
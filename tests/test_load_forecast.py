@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Integer, cast, func, select
+
+_MONDAY = datetime(2023, 10, 2)
+
+
+def test_forecast_slot_matches_history_average(client):
+    """Прогноз слота по 15 минут - среднее записей истории этого слота, а не копия часа"""
+    from src.database.base import SessionLocal
+    from src.database.crud.history import get_office_load_slots
+    from src.database.models import Office, OfficeHistory
+    from src.models.load_forecast import LoadForecast
+
+    with SessionLocal() as db:
+        office_id = db.scalar(select(Office.id).order_by(Office.id))
+        for day, time, count_clients in ((2, "12:15", 7), (2, "12:29", 3), (9, "12:20", 5), (9, "12:30", 40)):
+            dt = datetime.fromisoformat(f"2023-10-{day:02d} {time}")
+            db.add(OfficeHistory(office_id=office_id, dt=dt, count_clients=count_clients))
+        db.flush()
+
+        minute = cast(func.strftime("%H", OfficeHistory.dt), Integer) * 60 \
+            + cast(func.strftime("%M", OfficeHistory.dt), Integer)
+        slot = (minute // 15).label("slot")
+        history = dict(db.execute(
+            select(slot, func.avg(OfficeHistory.count_clients))
+            .where(OfficeHistory.office_id == office_id, func.strftime("%w", OfficeHistory.dt) == "1")
+            .group_by(slot)
+        ).tuples().all())
+
+        forecast = LoadForecast(slot_minutes=15, live_horizon=1e-9)  # без веса текущей загруженности
+        forecast.build(get_office_load_slots(db, 15))
+        db.rollback()
+
+    for slot_start in (12 * 60, 12 * 60 + 15, 12 * 60 + 30):
+        expected = forecast.expected_clients(office_id, 0, 0.0001, forecast.week_minute(_MONDAY) + slot_start)
+        assert expected == pytest.approx(history[slot_start // 15], rel=1e-6)
+    assert history[12 * 60 // 15] != history[(12 * 60 + 15) // 15]
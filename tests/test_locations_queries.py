@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+import sqlite3
+
+import pytest
+from sqlalchemy import event, select
+
+_POSITION = {"latitude": 55.755864, "longitude": 37.617698,
+             "initialLatitude": 55.755864, "initialLongitude": 37.617698}
+
+
+@contextmanager
+def _count_statements():
+    """Счетчик SQL запросов ко всем engine приложения"""
+    from src.database.base import async_engine, engine, read_engine
+
+    statements = []
+
+    def count(_connection, _cursor, statement, *_):
+        statements.append(statement)
+
+    engines = (engine, read_engine, async_engine.sync_engine)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", count)
+
+
+@pytest.mark.parametrize("path", ["/locations/find_atms", "/locations/find_offices"])
+def test_query_count_does_not_depend_on_result_size(client, path):
+    sizes, counts = [], []
+    for zoom in (9, 12, 15):
+        with _count_statements() as statements:
+            response = client.get(path, params={**_POSITION, "zoom": zoom})
+        assert response.status_code == 200
+        sizes.append(len(response.json()))
+        counts.append(len(statements))
+
+    assert sizes[0] > sizes[1] > sizes[2] > 0
+    assert counts[0] == counts[1] == counts[2] >= 1
+
+
+def test_many_candidates_are_passed_as_one_parameter(client):
+    """Список кандидатов длиннее лимита переменных SQLite не ломает запрос и дает те же локации"""
+    from src.database import models
+    from src.database.base import ReadSessionLocal
+    from src.database.crud.locations import _filter_by_radius
+
+    with ReadSessionLocal() as db:
+        atm_ids = db.scalars(select(models.ATM.id).order_by(models.ATM.id)).all()
+        variables_limit = db.connection().connection.dbapi_connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        missing_ids = list(range(atm_ids[-1] + 1, atm_ids[-1] + 1 + variables_limit))
+        results = []
+        for location_ids in (atm_ids[:10], atm_ids[:10] + missing_ids):
+            stmt = _filter_by_radius(select(models.ATM.id), models.ATM, models.atm_rtree, {}, location_ids)
+            results.append(db.scalars(stmt.order_by(models.ATM.id)).all())
+
+    assert results[0] == results[1] == atm_ids[:10]
@@ -0,0 +1,71 @@
+from sqlalchemy import select
+
+from src.models.fragments import JsonFragments
+
+_SEARCH = {"latitude": 55.755864, "longitude": 37.617698, "initialLatitude": 55.755864,
+           "initialLongitude": 37.617698, "zoom": 16}
+
+
+def _nearest_atm(client) -> dict:
+    response = client.get("/locations/find_atms", params={**_SEARCH, "limit": 1})
+    assert response.status_code == 200
+    return response.json()[0]
+
+
+def test_week_change_refreshes_atm_fragment(client):
+    """Изменение рабочей недели банкомата видно в том же поиске (кеш результатов и фрагмент JSON обновляются)"""
+    from src.database import models
+    from src.database.base import SessionLocal
+
+    atm = _nearest_atm(client)
+    assert _nearest_atm(client) == atm  # ответ из кеша результатов поиска
+    with SessionLocal() as session:
+        week = session.execute(
+            select(models.Week).join(models.ATM, models.ATM.week_info_id == models.Week.id)
+            .where(models.ATM.id == atm["id"])
+        ).scalar_one()
+        monday = week.monday
+        week.monday = "00:01-00:02"
+        session.commit()
+        try:
+            assert _nearest_atm(client)["weekInfo"]["days"][0] == "00:01-00:02"
+        finally:
+            week.monday = monday
+            session.commit()
+    assert _nearest_atm(client) == atm
+
+
+def test_service_change_refreshes_capabilities_filter(client):
+    """Изменение услуг банкомата (маска capabilities пересчитывается триггером) видно в том же поиске с фильтром"""
+    from src.database import models
+    from src.database.base import SessionLocal
+
+    def nfc_atm_ids() -> list[int]:
+        response = client.get("/locations/find_atms", params={**_SEARCH, "nfcSupport": True, "limit": 20})
+        assert response.status_code == 200
+        return [atm["id"] for atm in response.json()]
+
+    atm_id = nfc_atm_ids()[0]
+    with SessionLocal() as session:
+        services = session.execute(
+            select(models.ATMServices).join(models.ATM, models.ATM.service_info_id == models.ATMServices.id)
+            .where(models.ATM.id == atm_id)
+        ).scalar_one()
+        services.nfc = False
+        session.commit()
+        try:
+            assert atm_id not in nfc_atm_ids()
+        finally:
+            services.nfc = True
+            session.commit()
+    assert atm_id in nfc_atm_ids()
+
+
+def test_fragment_of_row_loaded_before_discard_is_not_stored():
+    """Строка, загруженная до изменения локации, сериализуется для ответа, но фрагмент не остается в кеше"""
+    fragments = JsonFragments()
+    generation = fragments.generation()  # строка локации загружена из БД
+    fragments.discard(1)  # изменение локации зафиксировано
+    assert fragments.get(1, lambda: b"old", generation) == b"old"
+    assert fragments.get(1, lambda: b"new") == b"new"
+    assert fragments.get(1, lambda: b"newer") == b"new"
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.models.ranking import RankingEngine
+
+_FILTER = {"latitude": 55.75, "longitude": 37.61, "initial_latitude": 55.75, "initial_longitude": 37.61,
+           "avg_rating": None}
+
+
+def test_slow_ranking_inputs_run_without_engine_lock():
+    """Прогноз и время в пути считаются вне блокировки массивов: update не ждет проход по графу"""
+    engine = RankingEngine(flags=(), with_queue=True)
+    engine.build({"id": office_id, "latitude": 55.75 + office_id / 1000, "longitude": 37.61, "avg_rating": None,
+                  "capabilities": 0, "avg_service_time": 10, "count_clients_now": office_id}
+                 for office_id in range(1, 4))
+
+    def travel_minutes(latitudes, longitudes):
+        assert not engine._lock.locked()
+        engine.update(1, {"count_clients_now": 100})
+        return [10.0] * len(latitudes)
+
+    def expected_clients(ids, clients, distances):
+        assert not engine._lock.locked()
+        return clients
+
+    ids, _, times_wait = engine.rank(_FILTER, 10.0, expected_clients=expected_clients, travel_minutes=travel_minutes)
+
+    assert ids == [1, 2, 3]
+    assert times_wait == [20, 30, 40]  # значения кандидатов скопированы до вызова travel_minutes
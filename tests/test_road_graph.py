@@ -0,0 +1,51 @@
+from io import BytesIO
+import random
+
+import pytest
+
+from src.models.road_graph import DRIVE, WALK, RoadGraph
+from src.models.spatial_index import haversine
+from src.models.travel_times import TravelTimes
+from .road_grid import dijkstra_minutes
+
+_ROUTES = 50
+
+
+@pytest.mark.parametrize("mode", ["walk", "drive"])
+def test_bidirectional_astar_matches_dijkstra(grid_graph, mode):
+    """Время маршрутов двунаправленного A* совпадает с обычным Дейкстрой, в том числе после save/load"""
+    file = BytesIO()
+    grid_graph.save(file)
+    file.seek(0)
+    graph = RoadGraph()
+    graph.load(file)
+
+    rng = random.Random(1)
+    node_count = graph.stats()["nodes"]
+    for _ in range(_ROUTES):
+        source, target = rng.randrange(node_count), rng.randrange(node_count)
+        expected, _ = dijkstra_minutes(graph, source, target, mode)
+        route = graph.route_minutes(source, target, mode)
+        if expected is None:
+            assert route is None
+        else:
+            assert route == pytest.approx(expected, abs=1e-3)
+
+
+def test_sweep_stops_at_bound_for_unreachable_office():
+    """Недостижимый узел (остров рядом с началом) не заставляет проход просмотреть всю компоненту графа"""
+    line = [(55.75, 37.60 + index * 0.002) for index in range(500)]
+    island = [(55.752, 37.60), (55.752, 37.602)]
+    length = 1000 * haversine(*line[0], *line[1])
+    edges = [edge for index in range(len(line) - 1)
+             for edge in ((index, index + 1, length, 25, WALK | DRIVE), (index + 1, index, length, 25, WALK | DRIVE))]
+    edges += [(500, 501, length, 25, WALK | DRIVE), (501, 500, length, 25, WALK | DRIVE)]
+    travel_times = TravelTimes(RoadGraph.from_edges(line + island, edges))
+
+    near, unreachable = travel_times.minutes_many(*line[0], [line[5][0], island[1][0]], [line[5][1], island[1][1]],
+                                                  "walk")
+
+    assert near == pytest.approx(5 * length * 60 / 1000 / 5.0, rel=0.05)
+    assert unreachable > 0
+    assert travel_times.stats()["estimates"] == 1
+    assert travel_times.stats()["settled"] < 50
@@ -0,0 +1,23 @@
+from src.models.signed_token import ReplayFilter, SignedTokens
+
+
+def _tokens(max_size: int) -> SignedTokens:
+    return SignedTokens(secret=b"secret", ttl=60, replay_filter=ReplayFilter(max_size=max_size))
+
+
+def test_token_is_accepted_once():
+    tokens = _tokens(max_size=10)
+    token = tokens.issue("79990000001")
+    assert tokens.consume(token) == "79990000001"
+    assert tokens.consume(token) is None
+
+
+def test_full_filter_rejects_new_tokens_and_keeps_spent_ones():
+    """Переполненный фильтр не вытесняет использованные nonce (иначе их токены можно повторить)"""
+    tokens = _tokens(max_size=2)
+    spent = [tokens.issue(f"7999000000{number}") for number in range(2)]
+    assert all(tokens.consume(token) for token in spent)
+
+    assert tokens.consume(tokens.issue("79990000009")) is None
+    assert not any(tokens.consume(token) for token in spent)
+    assert tokens.stats()["replay_overflows"] == 1
@@ -0,0 +1,150 @@
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+from time import perf_counter, sleep
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, text
+
+from src.database import base, snapshot
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_WORKERS = 4
+_STARTUP_TIMEOUT = 300
+
+# Второй процесс: открывает БД, ждет команды и записывает в уже открытое соединение
+_STALE_WRITER = """
+import sqlite3, sys
+connection = sqlite3.connect(sys.argv[1], isolation_level=None)
+print(connection.execute("SELECT fingerprint FROM snapshot_info").fetchone()[0], flush=True)
+sys.stdin.readline()
+try:
+    connection.execute("UPDATE snapshot_info SET fingerprint = 'stale'")
+    print(connection.execute("SELECT fingerprint FROM snapshot_info").fetchone()[0], flush=True)
+except sqlite3.OperationalError:
+    print("readonly", flush=True)
+"""
+
+_BUILT = "Построен снапшот БД"
+_REUSED = "Используется существующий снапшот БД"
+
+# Логи приложения (src.*) уровня INFO в stderr, логи uvicorn - только предупреждения
+_LOG_CONFIG = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"default": {"format": "%(process)d %(name)s %(message)s"}},
+    "handlers": {"stderr": {"class": "logging.StreamHandler", "formatter": "default", "stream": "ext://sys.stderr"}},
+    "loggers": {
+        "src": {"handlers": ["stderr"], "level": "INFO"},
+        "uvicorn": {"handlers": ["stderr"], "level": "WARNING"},
+    },
+}
+
+
+@pytest.fixture
+def snapshot_engine(tmp_path):
+    """Engine отдельного файла БД с настройками соединений приложения"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'snapshot.db'}")
+    base.configure_connections(engine, read_only=False)
+    yield engine
+    engine.dispose()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_rebuild_keeps_old_snapshot_of_attached_reader(snapshot_engine):
+    """Замена снапшота переключает ссылку: читатель старого файла дочитывает его, соединения пула переоткрываются"""
+    path = snapshot_engine.url.database
+    snapshot.build_snapshot(snapshot_engine, "old", lambda _: None)
+    other_engine = create_engine(f"sqlite:///{path}")
+    base.configure_connections(other_engine, read_only=True)
+    assert snapshot.get_fingerprint(other_engine) == "old"  # соединение остается в пуле other_engine
+    with snapshot_engine.begin() as connection:
+        connection.execute(text("UPDATE snapshot_info SET fingerprint = 'changed'"))  # запись в журнал WAL
+    reader = sqlite3.connect(path)
+    assert reader.execute("SELECT fingerprint FROM snapshot_info").fetchone() == ("changed",)
+    first_path = os.path.realpath(path)
+
+    snapshot.build_snapshot(snapshot_engine, "new", lambda _: None)
+
+    assert snapshot.get_fingerprint(snapshot_engine) == "new"
+    assert snapshot.get_fingerprint(other_engine) == "new"
+    assert reader.execute("SELECT fingerprint FROM snapshot_info").fetchone() == ("changed",)
+    reader.close()
+    other_engine.dispose()
+
+    second_path = os.path.realpath(path)
+    snapshot.build_snapshot(snapshot_engine, "newest", lambda _: None)  # кроме текущего остается только предыдущий
+    assert os.path.exists(second_path)
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.startswith(os.path.basename(first_path))]
+
+
+def test_process_on_old_snapshot_does_not_write_into_new(snapshot_engine):
+    """Процесс, открывший старый снапшот, пишет в него после замены: новый файл БД не меняется и не портится"""
+    path = snapshot_engine.url.database
+    snapshot.build_snapshot(snapshot_engine, "old", lambda _: None)
+    writer = subprocess.Popen(
+        [sys.executable, "-c", _STALE_WRITER, path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert writer.stdout.readline().strip() == "old"
+
+        snapshot.build_snapshot(snapshot_engine, "new", lambda _: None)
+        writer.stdin.write("write\n")
+        writer.stdin.flush()
+        assert writer.stdout.readline().strip() in ("stale", "readonly")
+    finally:
+        writer.stdin.close()
+        writer.wait()
+
+    snapshot_engine.dispose()
+    assert snapshot.get_fingerprint(snapshot_engine) == "new"
+    with snapshot_engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA integrity_check").scalar() == "ok"
+
+
+def test_workers_build_snapshot_once(tmp_path):
+    """Одновременный старт нескольких воркеров uvicorn на пустой БД: снапшот строится ровно один раз"""
+    os.symlink(os.path.join(_ROOT, "data"), tmp_path / "data")
+    log_config, log_path = tmp_path / "log.json", tmp_path / "server.log"
+    log_config.write_text(json.dumps(_LOG_CONFIG))
+    port = _free_port()
+
+    started = perf_counter()
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.main:api_app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(_WORKERS), "--log-config", str(log_config)],
+            cwd=tmp_path, env={**os.environ, "PYTHONPATH": _ROOT}, stderr=log
+        )
+    try:
+        while True:
+            lines = log_path.read_text().splitlines()
+            built, reused = sum(_BUILT in line for line in lines), sum(_REUSED in line for line in lines)
+            if built + reused >= _WORKERS:
+                break
+            assert server.poll() is None, "\n".join(lines)
+            assert perf_counter() - started < _STARTUP_TIMEOUT, "\n".join(lines)
+            sleep(0.1)
+        for _ in range(100):  # воркеры, записавшие лог, заканчивают построение индексов
+            try:
+                readiness = httpx.get(f"http://127.0.0.1:{port}/service/readiness")
+            except httpx.HTTPError:
+                readiness = None
+            if readiness is not None and readiness.status_code == 200:
+                break
+            sleep(0.1)
+    finally:
+        server.terminate()
+        server.wait()
+
+    assert (built, reused) == (1, _WORKERS - 1)
+    assert readiness is not None and readiness.status_code == 200
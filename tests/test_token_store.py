@@ -0,0 +1,88 @@
+import pytest
+
+from src.models import token_store
+from src.models.token_store import MemoryTokenStore, RedisTokenStore
+
+_TTL = 60
+
+
+class Clock:
+    """Управляемое время для истечения токенов"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """Минимальная замена redis.Redis(decode_responses=True) для команд RedisTokenStore: GET, SET (EX, GET), DEL"""
+    def __init__(self, clock: Clock):
+        self._clock = clock
+        self._data: dict[str, tuple[str, float | None]] = {}
+
+    def get(self, name: str) -> str | None:
+        entry = self._data.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self._clock():
+            del self._data[name]
+            return None
+        return value
+
+    def set(self, name: str, value: str, ex: int | None = None, get: bool = False) -> str | bool | None:
+        previous = self.get(name)
+        self._data[name] = (value, None if ex is None else self._clock() + ex)
+        return previous if get else True
+
+    def delete(self, *names: str) -> int:
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(token_store, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request, clock):
+    """Оба хранилища токенов проверяются одними и теми же тестами (контракт TokenStore)"""
+    if request.param == "redis":
+        return RedisTokenStore(FakeRedis(clock), ttl=_TTL)
+    return MemoryTokenStore(ttl=_TTL)
+
+
+def test_issued_token_resolves_to_phone(store):
+    store.issue("token-1", "79990000001")
+    assert store.get_phone("token-1") == "79990000001"
+    assert store.get_phone("unknown") is None
+
+
+def test_new_token_revokes_previous_token_of_phone(store):
+    store.issue("token-1", "79990000001")
+    store.issue("token-2", "79990000001")
+    store.issue("token-3", "79990000002")
+    assert store.get_phone("token-1") is None
+    assert store.get_phone("token-2") == "79990000001"
+    assert store.get_phone("token-3") == "79990000002"
+
+
+def test_reissuing_same_token_keeps_it(store):
+    store.issue("token-1", "79990000001")
+    store.issue("token-1", "79990000001")
+    assert store.get_phone("token-1") == "79990000001"
+
+
+def test_token_expires_after_ttl(store, clock):
+    store.issue("token-1", "79990000001")
+    clock.now += _TTL - 1
+    store.issue("token-2", "79990000002")
+    assert store.get_phone("token-1") == "79990000001"
+
+    clock.now += 2
+    store.purge_expired()
+    assert store.get_phone("token-1") is None
+    assert store.get_phone("token-2") == "79990000002"